@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+pytta.functions benchmarks
+===========================
+
+        $ asv run --bench bench_functions
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pytta
+from .common import fftDegrees, numChannels, random_signal, samplingRate
+
+
+class Merge:
+    params = (fftDegrees, [2, 8])
+    param_names = ['fftDegree', 'numSignals']
+
+    def setup(self, fftDegree, numSignals):
+        self.signals = [random_signal(fftDegree, 1, seed)
+                        for seed in range(numSignals)]
+
+    def time_merge(self, fftDegree, numSignals):
+        pytta.merge(*self.signals)
+
+    def peakmem_merge(self, fftDegree, numSignals):
+        pytta.merge(*self.signals)
+
+
+class Convolution:
+    params = [fftDegrees]
+    param_names = ['fftDegree']
+
+    def setup(self, fftDegree):
+        self.signal = random_signal(fftDegree, 1, seed=1)
+        self.impulseResponse = random_signal(14, 1, seed=2)
+        self.reference = random_signal(fftDegree, 1, seed=3)
+        self.delayed = pytta.SignalObj(np.roll(self.reference.timeSignal,
+                                               100), 'time', samplingRate)
+
+    def time_fft_convolve(self, fftDegree):
+        pytta.fft_convolve(self.signal, self.impulseResponse)
+
+    def peakmem_fft_convolve(self, fftDegree):
+        pytta.fft_convolve(self.signal, self.impulseResponse)
+
+    def time_find_delay(self, fftDegree):
+        pytta.find_delay(self.delayed, self.reference)
+
+
+class Resample:
+    params = [fftDegrees]
+    param_names = ['fftDegree']
+
+    def setup(self, fftDegree):
+        self.signal = random_signal(fftDegree, 1)
+
+    def time_resample(self, fftDegree):
+        pytta.resample(self.signal, 44100)
+
+    def peakmem_resample(self, fftDegree):
+        pytta.resample(self.signal, 44100)
+
+
+class WaveFiles:
+    params = (fftDegrees, numChannels)
+    param_names = ['fftDegree', 'numChannels']
+
+    def setup(self, fftDegree, channels):
+        self.tempDir = tempfile.mkdtemp()
+        self.fileName = os.path.join(self.tempDir, 'signal.wav')
+        self.signal = random_signal(fftDegree, channels)
+        pytta.write_wav(self.fileName, self.signal)
+
+    def teardown(self, fftDegree, channels):
+        shutil.rmtree(self.tempDir)
+
+    def time_write_wav(self, fftDegree, channels):
+        pytta.write_wav(self.fileName, self.signal)
+
+    def time_read_wav(self, fftDegree, channels):
+        pytta.read_wav(self.fileName)
+
+    def peakmem_read_wav(self, fftDegree, channels):
+        pytta.read_wav(self.fileName)
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+Signal generation benchmarks
+=============================
+
+        $ asv run --bench bench_generate
+"""
+
+import pytta
+from .common import samplingRate
+
+
+class Generate:
+    params = [[16, 18, 20, 22]]
+    param_names = ['fftDegree']
+
+    def time_sweep(self, fftDegree):
+        pytta.generate.sweep(samplingRate=samplingRate, fftDegree=fftDegree)
+
+    def peakmem_sweep(self, fftDegree):
+        pytta.generate.sweep(samplingRate=samplingRate, fftDegree=fftDegree)
+
+    def time_noise(self, fftDegree):
+        pytta.generate.noise(samplingRate=samplingRate, fftDegree=fftDegree)
+
+    def peakmem_noise(self, fftDegree):
+        pytta.generate.noise(samplingRate=samplingRate, fftDegree=fftDegree)
+
+    def time_impulse(self, fftDegree):
+        pytta.generate.impulse(samplingRate=samplingRate,
+                               fftDegree=fftDegree)
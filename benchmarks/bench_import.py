@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Import benchmarks
+==================
+
+    "import pytta" must stay fast and must not load plotting, audio I/O or
+    the heavier scipy submodules, which are imported on first use.
+
+        $ asv run --bench bench_import
+"""
+
+import subprocess
+import sys
+
+
+_heavyModules = ['matplotlib.pyplot',
+                 'sounddevice',
+                 'scipy.signal',
+                 'scipy.fftpack',
+                 'scipy.io']
+
+
+def timeraw_import_pytta():
+    """ Fresh interpreter "import pytta" time """
+    return "import pytta"
+
+
+def track_heavy_modules_on_import():
+    """ Number of lazily loaded modules that "import pytta" pulled in """
+    code = "import sys, pytta; print(sum(name in sys.modules for name in " \
+           + repr(_heavyModules) + "))"
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return int(output)
+
+track_heavy_modules_on_import.unit = 'modules'
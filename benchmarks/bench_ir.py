@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+pytta.ir benchmarks
+====================
+
+    Impulse response truncation of synthetic multichannel decays, broadband
+    and per band.
+
+        $ asv run --bench bench_ir
+"""
+
+import pytta
+from .common import decay_signal
+
+
+class Truncation:
+    params = ([None, 'octave', 'third'], [1, 4])
+    param_names = ['bands', 'numChannels']
+
+    def setup(self, bands, channels):
+        self.impulseResponse = decay_signal(channels)
+
+    def time_truncate(self, bands, channels):
+        pytta.ir.truncate(self.impulseResponse, bands=bands)
+
+    def track_truncated_length(self, bands, channels):
+        truncated = pytta.ir.truncate(self.impulseResponse, bands=bands)
+        return truncated.numSamples
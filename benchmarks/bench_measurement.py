@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Measurement benchmarks
+=======================
+
+    FRFMeasure.run() with a simulated loopback audio device, so the
+    processing cost of a measurement is tracked without audio hardware.
+
+        $ asv run --bench bench_measurement
+"""
+
+import pytta
+from .common import LoopbackDevice, samplingRate
+
+
+class SimulatedFRFMeasure:
+    params = ([16, 18, 20], [1, 4])
+    param_names = ['fftDegree', 'numInputs']
+
+    def setup(self, fftDegree, numInputs):
+        self.playrec = pytta.audio.playrec
+        pytta.audio.playrec = LoopbackDevice().playrec
+        excitation = pytta.generate.sweep(samplingRate=samplingRate,
+                                          fftDegree=fftDegree)
+        self.measurement = pytta.FRFMeasure(
+            excitation=excitation,
+            device=0,
+            inChannel=list(range(1, numInputs + 1)),
+            outChannel=[1])
+
+    def teardown(self, fftDegree, numInputs):
+        pytta.audio.playrec = self.playrec
+
+    def time_run(self, fftDegree, numInputs):
+        self.measurement.run()
+
+    def peakmem_run(self, fftDegree, numInputs):
+        self.measurement.run()
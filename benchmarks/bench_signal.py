@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+SignalObj benchmarks
+=====================
+
+    Construction (both domains, which calculates the FFT and the time and
+    frequency vectors) and the arithmetic operators, at several sizes and
+    channel counts.
+
+        $ asv run --bench bench_signal
+"""
+
+import pytta
+from .common import fftDegrees, numChannels, random_signal, samplingRate
+
+
+class SignalConstruction:
+    params = (fftDegrees, numChannels)
+    param_names = ['fftDegree', 'numChannels']
+
+    def setup(self, fftDegree, channels):
+        signalObj = random_signal(fftDegree, channels)
+        self.timeSignal = signalObj.timeSignal
+        self.freqSignal = signalObj.freqSignal
+
+    def time_from_time(self, fftDegree, channels):
+        pytta.SignalObj(self.timeSignal, 'time', samplingRate)
+
+    def time_from_freq(self, fftDegree, channels):
+        pytta.SignalObj(self.freqSignal, 'freq', samplingRate)
+
+    def peakmem_from_time(self, fftDegree, channels):
+        pytta.SignalObj(self.timeSignal, 'time', samplingRate)
+
+
+class SignalArithmetic:
+    params = (fftDegrees, numChannels)
+    param_names = ['fftDegree', 'numChannels']
+
+    def setup(self, fftDegree, channels):
+        # multichannel against single channel, broadcast column by column
+        self.signal1 = random_signal(fftDegree, channels, seed=1)
+        self.signal2 = random_signal(fftDegree, 1, seed=2)
+        # no zeros in the divisor spectrum
+        self.signal2 = pytta.SignalObj(self.signal2.freqSignal + 1, 'freq',
+                                       samplingRate)
+
+    def time_add(self, fftDegree, channels):
+        self.signal1 + self.signal2
+
+    def time_sub(self, fftDegree, channels):
+        self.signal1 - self.signal2
+
+    def time_truediv(self, fftDegree, channels):
+        self.signal1 / self.signal2
+
+    def peakmem_truediv(self, fftDegree, channels):
+        self.signal1 / self.signal2
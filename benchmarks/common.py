@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers of the benchmark suite
+"""
+
+import numpy as np
+import pytta
+
+
+samplingRate = 48000
+
+fftDegrees = [16, 18, 20]
+""" Signal sizes benchmarked, numSamples = 2**fftDegree """
+
+numChannels = [1, 8]
+""" Channel counts benchmarked """
+
+
+def random_signal(fftDegree, channels, seed=0):
+    """ Reproducible white noise SignalObj """
+    shape = (2**fftDegree,) if channels == 1 else (2**fftDegree, channels)
+    samples = np.random.RandomState(seed).randn(*shape)
+    return pytta.SignalObj(samples, 'time', samplingRate)
+
+
+class LoopbackDevice(object):
+    """
+    Stands in for pytta.audio in the measurement benchmarks: playrec()
+    returns the excitation through a short decaying impulse response plus
+    background noise, for every input channel, without any audio hardware.
+    """
+
+    def __init__(self, irLength=4800, noiseLevel=1e-3, seed=0):
+        randomState = np.random.RandomState(seed)
+        decay = np.exp(-np.arange(irLength) / (irLength/6))
+        self.impulseResponse = randomState.randn(irLength) * decay
+        self.noiseLevel = noiseLevel
+        self.randomState = randomState
+
+    def playrec(self, data, samplingRate=None, inChannel=None,
+                outChannel=None, **kwargs):
+        data = np.asarray(data)
+        if data.ndim > 1:
+            data = data[:, 0]
+        numInputs = 1 if inChannel is None else np.size(inChannel)
+        response = pytta.fft_convolve(
+            pytta.SignalObj(data, 'time', samplingRate),
+            pytta.SignalObj(self.impulseResponse, 'time', samplingRate)
+            ).timeSignal[:data.shape[0]]
+        recording = response[:, np.newaxis] \
+            + self.noiseLevel*self.randomState.randn(data.shape[0],
+                                                     numInputs)
+        return recording.astype('float32'), pytta.audio.StreamHealth()
+
+
+def decay_signal(channels, seconds=2, seed=0):
+    """
+    Reproducible synthetic impulse responses: exponentially decaying noise,
+    with a different onset and reverberation time per channel, over a
+    -80 dB background noise.
+    """
+    randomState = np.random.RandomState(seed)
+    numSamples = int(seconds*samplingRate)
+    samples = 1e-4*randomState.randn(numSamples, channels)
+    for channel in range(channels):
+        onset = 100 + 400*channel
+        reverberationTime = 0.3 + 0.2*channel
+        time = np.arange(numSamples - onset) / samplingRate
+        samples[onset:, channel] += randomState.randn(time.size) \
+            * 10**(-3*time/reverberationTime)
+    return pytta.SignalObj(samples, 'time', samplingRate)
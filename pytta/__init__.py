@@ -25,6 +25,10 @@ PyTTa:
     We also recommend using the Anaconda Python distribution, it's not a
     mandatory issue, but you should.
     
+    Matplotlib, Sounddevice (PortAudio) and the heavier Scipy submodules are
+    only imported the first time they are used, so PyTTa can be imported for
+    offline processing even where there is no audio library available.
+    
     
 	To begin, try:
 		 
@@ -37,6 +41,19 @@ PyTTa:
         >>> pytta.classes
         >>> pytta.generate
         >>> pytta.functions
+        >>> pytta.spectral
+        >>> pytta.levels
+        >>> pytta.filters
+        >>> pytta.storage
+        >>> pytta.batch
+        >>> pytta.fft
+        >>> pytta.axes
+        >>> pytta.ir
+        >>> pytta.phase
+        >>> pytta.plotting
+        >>> pytta.profiling
+        >>> pytta.audio
+        >>> pytta.scheduler
         >>> pytta.properties
 
 For further information, check the specific module, class, method or function documentation.    
@@ -47,10 +64,25 @@ from . import properties
 
 # Instantiate the Default parameters to be loaded by other methods and function calls
 default = properties.Default()
+from .properties import defaults
 
-from .classes import SignalObj, RecMeasure, PlayRecMeasure, FRFMeasure
-from .functions import read_wav, write_wav, merge, list_devices, fft_convolve, find_delay, corr_coef, resample
+from .classes import SignalObj, SignalSet, RecMeasure, PlayRecMeasure, FRFMeasure, MIMOMeasure, SteppedSineMeasure
+from .functions import read_wav, read_wav_blocks, write_wav, merge, list_devices, fft_convolve, find_delay, corr_coef, similarity_matrix, band_masks, resample
 from . import generate
+from . import spectral
+from . import filters
+from . import levels
+from . import storage
+from . import batch
+from . import fft
+from . import axes
+from . import ir
+from . import phase
+from . import plotting
+from . import profiling
+from . import audio
+from . import scheduler
+from .storage import save, load
 
 #Default = properties.Default
 
@@ -59,23 +91,45 @@ __version__ = '0.0.0a2' # package version
 # package submodules and scripts to be called as pytta.something
 __all__ = [# Submodules
            'generate',
+           'spectral',
+           'levels',
+           'filters',
+           'storage',
+           'batch',
+           'fft',
+           'axes',
+           'ir',
+           'phase',
+           'plotting',
+           'profiling',
+           'audio',
+           'scheduler',
            
            # Functions
            'merge',
            'fft_convolve',
            'read_wav',
+           'read_wav_blocks',
            'write_wav',
            'list_devices',
            'find_delay',
            'resample',
            'corr_coef',
+           'similarity_matrix',
+           'band_masks',
+           'save',
+           'load',
            
            # Classes
            'RecMeasure',
            'PlayRecMeasure',
            'FRFMeasure',
+           'MIMOMeasure',
+           'SteppedSineMeasure',
            'SignalObj',
+           'SignalSet',
            
            # Objects
            'default',
+           'defaults',
            ] 
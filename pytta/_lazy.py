@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy module loading
+====================
+
+    Plotting, audio I/O and the heavier scipy submodules are only imported
+    the first time one of their attributes is used, so "import pytta" stays
+    fast and does not initialise PortAudio, which also allows using PyTTa
+    for offline processing on machines without an audio library.
+
+        >>> sd = LazyModule('sounddevice')
+        >>> sd.query_devices()  # sounddevice is imported here
+
+"""
+
+import importlib
+import types
+
+
+class LazyModule(types.ModuleType):
+    """
+    Module placeholder that imports the named module on the first attribute
+    access. After that, the module's namespace is copied into the placeholder,
+    so further attribute lookups cost the same as on the module itself.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__.update({key: value for key, value
+                                  in vars(module).items()
+                                  if not key.startswith('__')})
+            self._module = module
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return "<lazy module '" + self.__name__ + "' (" + state + ")>"
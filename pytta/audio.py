@@ -0,0 +1,505 @@
+# -*- coding: utf-8 -*-
+"""
+Audio
+======
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule does the audio I/O of the measurements through callback
+    streams, instead of sounddevice's blocking rec() and playrec(), so the
+    stream status of every audio block can be checked. Each run returns the
+    recording and a StreamHealth object, with the input and output
+    under/overflows (xruns), the latency reported by the audio interface and
+    the callback timing statistics:
+
+        >>> recording, health = pytta.audio.playrec(excitation.timeSignal,
+        >>>                                         samplingRate=44100)
+        >>> health.ok
+        >>> health.summary()
+
+    The measurement classes attach it to the recordings, as
+    recording.streamHealth, and can warn, raise an XrunError or repeat the
+    run when xruns happen (see the Measurement onXrun property).
+
+    The round trip latency of the interface, from the output to the input
+    samples, is measured with a short noise probe, ideally through a
+    loopback cable, and cached for each device, sampling rate, block size
+    and latency setting, so it is measured only once per session:
+
+        >>> samples = pytta.audio.round_trip_latency(44100,
+        >>>                                          loopbackChannels=(2, 2))
+
+    Long runs, e.g. stepped sines, can be generated and processed block by
+    block with stream_playrec(), so the excitation and the recording are
+    never fully in memory.
+
+    PlayRecMeasure(compensateLatency=True) uses it to remove the latency
+    from its recordings, so the stopMargin does not have to account for it.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.audio.rec( numSamples, samplingRate, inChannel )
+        >>> pytta.audio.playrec( data, samplingRate, inChannel, outChannel )
+        >>> pytta.audio.stream_playrec( source, sink, numSamples, samplingRate )
+        >>> pytta.audio.measure_latency( samplingRate, inChannel, outChannel )
+        >>> pytta.audio.round_trip_latency( samplingRate, loopbackChannels )
+        >>> pytta.audio.clear_latency_cache()
+        >>> pytta.audio.executor()
+
+    For further information, check the function specific documentation.
+"""
+
+import concurrent.futures as futures
+import queue
+import threading
+import time
+import numpy as np
+from pytta import default
+from pytta import fft
+from pytta import profiling
+from pytta._lazy import LazyModule
+
+sd = LazyModule('sounddevice') # loaded on first use
+
+_latencyCache = {}
+""" Round trip latencies [samples], by (device, samplingRate, blockSize, latency) """
+
+_probeLength = 4096
+""" [samples] length of the latency probe noise burst """
+
+_executor = None
+""" Audio thread of the asynchronous measurements, created on first use """
+
+
+def executor():
+    """
+    Single thread executor where the asynchronous measurements are run, so
+    only one of them uses the audio interface at a time, in the order they
+    were submitted.
+    """
+    global _executor
+    if _executor is None:
+        _executor = futures.ThreadPoolExecutor(max_workers=1,
+                                               thread_name_prefix='pytta-audio')
+    return _executor
+
+
+class XrunError(RuntimeError):
+    """
+    Raised when the audio stream reported input or output under/overflows.
+    The StreamHealth of the failed run is in the health attribute.
+    """
+
+    def __init__(self, message, health=None):
+        super().__init__(message)
+        self.health = health
+
+
+class StreamHealth(object):
+    """
+    Status of an audio stream run.
+
+    Properties(self):       (default),      meaning
+        - inputOverflows:   (0),            number of blocks with input samples discarded;
+        - inputUnderflows:  (0),            number of blocks with input samples filled with zeros;
+        - outputOverflows:  (0),            number of blocks with output samples discarded;
+        - outputUnderflows: (0),            number of blocks with output gaps (dropouts);
+        - xruns:            (0),            total of the above;
+        - ok:               (True),         True if there were no xruns;
+        - latency:          (None),         [s] (input, output) latency reported by the stream;
+        - measuredLatency:  (None),         [s] mean (input, output) buffer latency seen by the callbacks;
+        - blockSize:        (None),         [samples] size of the first callback block;
+        - numCallbacks:     (0),            number of callbacks;
+        - callbackPeriod:   (None),         [s] (mean, max) time between callbacks;
+        - callbackDuration: (None),         [s] (mean, max) time spent inside the callbacks;
+        - cpuLoad:          (None),         stream CPU load at the end of the run.
+
+    Methods:                meaning
+        - summary():        all of the above as a dict.
+    """
+
+    def __init__(self):
+        self.inputOverflows = 0
+        self.inputUnderflows = 0
+        self.outputOverflows = 0
+        self.outputUnderflows = 0
+        self.latency = None
+        self.blockSize = None
+        self.cpuLoad = None
+        self._callbackStarts = []
+        self._callbackDurations = []
+        self._inputLatencies = []
+        self._outputLatencies = []
+
+    @property
+    def xruns(self):
+        return self.inputOverflows + self.inputUnderflows \
+            + self.outputOverflows + self.outputUnderflows
+
+    @property
+    def ok(self):
+        return self.xruns == 0
+
+    @property
+    def numCallbacks(self):
+        return len(self._callbackStarts)
+
+    @property
+    def callbackPeriod(self):
+        if self.numCallbacks < 2:
+            return None
+        periods = np.diff(self._callbackStarts)
+        return (float(np.mean(periods)), float(np.max(periods)))
+
+    @property
+    def callbackDuration(self):
+        if not self._callbackDurations:
+            return None
+        return (float(np.mean(self._callbackDurations)),
+                float(np.max(self._callbackDurations)))
+
+    @property
+    def measuredLatency(self):
+        inLatency = float(np.mean(self._inputLatencies)) \
+            if self._inputLatencies else None
+        outLatency = float(np.mean(self._outputLatencies)) \
+            if self._outputLatencies else None
+        if inLatency is None and outLatency is None:
+            return None
+        return (inLatency, outLatency)
+
+    def _callback_start(self, frames, timeInfo, status):
+        self._callbackStarts.append(time.perf_counter())
+        if self.blockSize is None:
+            self.blockSize = frames
+        if status:
+            self.inputOverflows += bool(status.input_overflow)
+            self.inputUnderflows += bool(status.input_underflow)
+            self.outputOverflows += bool(status.output_overflow)
+            self.outputUnderflows += bool(status.output_underflow)
+        if timeInfo is not None:
+            currentTime = timeInfo.currentTime
+            if currentTime:
+                if timeInfo.inputBufferAdcTime:
+                    self._inputLatencies.append(
+                        currentTime - timeInfo.inputBufferAdcTime)
+                if timeInfo.outputBufferDacTime:
+                    self._outputLatencies.append(
+                        timeInfo.outputBufferDacTime - currentTime)
+
+    def _callback_end(self):
+        self._callbackDurations.append(time.perf_counter()
+                                       - self._callbackStarts[-1])
+
+    def summary(self):
+        return {'ok': self.ok,
+                'xruns': self.xruns,
+                'inputOverflows': self.inputOverflows,
+                'inputUnderflows': self.inputUnderflows,
+                'outputOverflows': self.outputOverflows,
+                'outputUnderflows': self.outputUnderflows,
+                'latency': self.latency,
+                'measuredLatency': self.measuredLatency,
+                'blockSize': self.blockSize,
+                'numCallbacks': self.numCallbacks,
+                'callbackPeriod': self.callbackPeriod,
+                'callbackDuration': self.callbackDuration,
+                'cpuLoad': self.cpuLoad}
+
+    def __repr__(self):
+        return 'StreamHealth(' + ', '.join(key + '=' + repr(value)
+                                           for key, value
+                                           in self.summary().items()) + ')'
+
+
+def _channels(mapping):
+    """ 1-based channel list into 0-based column indexes """
+    if mapping is None:
+        mapping = [1]
+    return np.atleast_1d(np.asarray(mapping, dtype=int)) - 1
+
+
+def _run_stream(stream, health, done, timeout):
+    with stream:
+        finished = done.wait(timeout)
+        try:
+            health.cpuLoad = stream.cpu_load
+        except Exception:
+            pass
+    if not finished:
+        raise RuntimeError("Audio stream did not finish in time")
+
+
+@profiling.instrument('audio.playrec')
+def playrec(data, samplingRate=None, inChannel=None, outChannel=None,
+            device=None, latency='low', blockSize=0, dtype='float32'):
+    """
+    Plays data through the outChannel list and records inChannel at the
+    same time, with as many samples as data. Channels are numbered from 1.
+
+    >>> recording, health = pytta.audio.playrec(excitation.timeSignal)
+
+    Returns the (samples x inChannels) recording and its StreamHealth.
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    if device is None:
+        device = default.device
+    data = np.asarray(data, dtype=dtype)
+    if data.ndim == 1:
+        data = data[:, np.newaxis]
+    inColumns = _channels(inChannel)
+    outColumns = _channels(outChannel)
+    if data.shape[1] not in (1, outColumns.size):
+        raise ValueError("data has " + str(data.shape[1]) + " channels for "
+                         + str(outColumns.size) + " output channels")
+    numSamples = data.shape[0]
+    recording = np.zeros((numSamples, inColumns.size), dtype=dtype)
+    health = StreamHealth()
+    done = threading.Event()
+    position = [0]
+
+    def callback(indata, outdata, frames, timeInfo, status):
+        health._callback_start(frames, timeInfo, status)
+        start = position[0]
+        count = max(0, min(frames, numSamples - start))
+        recording[start:start + count] = indata[:count, inColumns]
+        outdata.fill(0)
+        outdata[:count, outColumns] = data[start:start + count]
+        position[0] = start + count
+        health._callback_end()
+        if position[0] >= numSamples:
+            raise sd.CallbackStop
+
+    stream = sd.Stream(samplerate=samplingRate, blocksize=blockSize,
+                       device=device, dtype=dtype, latency=latency,
+                       channels=(int(inColumns.max()) + 1,
+                                 int(outColumns.max()) + 1),
+                       callback=callback, finished_callback=done.set)
+    health.latency = tuple(stream.latency)
+    _run_stream(stream, health, done, 10 + 2*numSamples/samplingRate)
+    return recording, health
+
+
+@profiling.instrument('audio.rec')
+def rec(numSamples, samplingRate=None, inChannel=None, device=None,
+        latency='low', blockSize=0, dtype='float32'):
+    """
+    Records numSamples from the inChannel list, numbered from 1.
+
+    >>> recording, health = pytta.audio.rec(2**18, 44100, [1, 2])
+
+    Returns the (samples x inChannels) recording and its StreamHealth.
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    if device is None:
+        device = default.device
+    if isinstance(device, (list, tuple)):
+        device = device[0]
+    numSamples = int(numSamples)
+    inColumns = _channels(inChannel)
+    recording = np.zeros((numSamples, inColumns.size), dtype=dtype)
+    health = StreamHealth()
+    done = threading.Event()
+    position = [0]
+
+    def callback(indata, frames, timeInfo, status):
+        health._callback_start(frames, timeInfo, status)
+        start = position[0]
+        count = max(0, min(frames, numSamples - start))
+        recording[start:start + count] = indata[:count, inColumns]
+        position[0] = start + count
+        health._callback_end()
+        if position[0] >= numSamples:
+            raise sd.CallbackStop
+
+    stream = sd.InputStream(samplerate=samplingRate, blocksize=blockSize,
+                            device=device, dtype=dtype, latency=latency,
+                            channels=int(inColumns.max()) + 1,
+                            callback=callback, finished_callback=done.set)
+    health.latency = (stream.latency, None)
+    _run_stream(stream, health, done, 10 + 2*numSamples/samplingRate)
+    return recording, health
+
+
+@profiling.instrument('audio.stream_playrec')
+def stream_playrec(source, sink, numSamples, samplingRate=None,
+                   inChannel=None, outChannel=None, device=None,
+                   latency='low', blockSize=0, dtype='float32'):
+    """
+    Plays numSamples generated block by block while recording, handing each
+    recorded block to sink as soon as it arrives, instead of keeping the
+    whole excitation and recording. Channels are numbered from 1.
+
+    >>> health = pytta.audio.stream_playrec(tone, detector.update, 10*44100)
+
+    Parameters:
+    -----------
+
+        - source: source(start, frames) returns the next (frames) or
+                    (frames x outChannels) output samples, from sample
+                    start. It is called inside the audio callback, so it
+                    must be fast, e.g. no file or lock waits;
+        - sink: sink(start, block) receives each (frames x inChannels)
+                    recorded block, from sample start. It is called in the
+                    calling thread, in order, while the stream runs, so it
+                    may do the heavier processing.
+
+    Returns the StreamHealth of the run.
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    if device is None:
+        device = default.device
+    numSamples = int(numSamples)
+    inColumns = _channels(inChannel)
+    outColumns = _channels(outChannel)
+    health = StreamHealth()
+    blocks = queue.Queue()
+    position = [0]
+
+    def callback(indata, outdata, frames, timeInfo, status):
+        health._callback_start(frames, timeInfo, status)
+        start = position[0]
+        count = max(0, min(frames, numSamples - start))
+        outdata.fill(0)
+        if count:
+            samples = np.asarray(source(start, count), dtype=dtype)
+            if samples.ndim == 1:
+                samples = samples[:, np.newaxis]
+            outdata[:count, outColumns] = samples
+            blocks.put((start, indata[:count, inColumns].copy()))
+        position[0] = start + count
+        health._callback_end()
+        if position[0] >= numSamples:
+            raise sd.CallbackStop
+
+    stream = sd.Stream(samplerate=samplingRate, blocksize=blockSize,
+                       device=device, dtype=dtype, latency=latency,
+                       channels=(int(inColumns.max()) + 1,
+                                 int(outColumns.max()) + 1),
+                       callback=callback,
+                       finished_callback=lambda: blocks.put(None))
+    health.latency = tuple(stream.latency)
+    deadline = time.monotonic() + 10 + 2*numSamples/samplingRate
+    with stream:
+        while True:
+            try:
+                item = blocks.get(timeout=max(deadline - time.monotonic(),
+                                              0))
+            except queue.Empty:
+                raise RuntimeError("Audio stream did not finish in time")
+            if item is None:
+                break
+            sink(*item)
+        try:
+            health.cpuLoad = stream.cpu_load
+        except Exception:
+            pass
+    return health
+
+
+#%% Round trip latency
+
+def _latency_probe(seed=0):
+    """ Hann windowed white noise burst, the same on every call """
+    probe = np.random.RandomState(seed).randn(_probeLength)
+    probe *= np.hanning(_probeLength)
+    return 0.5 * probe / np.max(np.abs(probe))
+
+
+def _find_probe(recording, probe, maxLatency):
+    """
+    Delay [samples] of the probe in each recording channel, by the peak of
+    their cross correlation, or None where the peak does not stand out of
+    the correlation noise.
+    """
+    nfft = fft.next_fast_len(recording.shape[0] + probe.shape[0])
+    correlation = fft.irfft(fft.rfft(recording, nfft, axis=0)
+                            * np.conj(fft.rfft(probe, nfft))[:, np.newaxis],
+                            nfft, axis=0)[:maxLatency + 1]
+    correlation = np.abs(correlation)
+    delays = np.argmax(correlation, axis=0)
+    peaks = np.max(correlation, axis=0)
+    noise = np.median(correlation, axis=0)
+    return [int(delay) if peak > 10*level else None
+            for delay, peak, level in zip(delays, peaks, noise)]
+
+
+@profiling.instrument('audio.measure_latency')
+def measure_latency(samplingRate=None, inChannel=None, outChannel=None,
+                    device=None, latency='low', blockSize=0, maxLatency=0.5,
+                    repetitions=3):
+    """
+    Measures the round trip latency from outChannel to inChannel, playing a
+    short noise burst, repetitions times. Channels are numbered from 1, and
+    the connection between them should be a loopback cable, as any
+    acoustic path delay is measured as well.
+
+    >>> samples = pytta.audio.measure_latency(44100, [2], [2])
+
+    Parameters:
+    -----------
+
+        - maxLatency: [s] longest latency searched for;
+        - repetitions: number of probes, the median delay is returned.
+
+    Returns the latency in samples. Raises a RuntimeError if the probe is
+    not found in the recording, e.g. if the channels are not connected.
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    probe = _latency_probe()
+    maxLatency = int(round(maxLatency*samplingRate))
+    data = np.concatenate((probe, np.zeros(maxLatency)))
+    delays = []
+    for repetition in range(repetitions):
+        recording, health = playrec(data, samplingRate, inChannel,
+                                    outChannel, device=device,
+                                    latency=latency, blockSize=blockSize)
+        delays.extend(delay for delay in _find_probe(recording, probe,
+                                                     maxLatency)
+                      if delay is not None)
+    if not delays:
+        raise RuntimeError("The latency probe was not found in the "
+                           + "recording, check the loopback connection "
+                           + "between the input and output channels")
+    return int(np.median(delays))
+
+
+def round_trip_latency(samplingRate=None, loopbackChannels=None,
+                       device=None, latency='low', blockSize=0, **kwargs):
+    """
+    Cached version of measure_latency(), measured only on the first call
+    for each (device, samplingRate, blockSize, latency) combination.
+    loopbackChannels is the (inChannel, outChannel) pair connected by the
+    loopback, defaulting to (1, 1).
+
+    >>> samples = pytta.audio.round_trip_latency(44100, (2, 2))
+
+    Further keyword arguments are passed to measure_latency().
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    if device is None:
+        device = default.device
+    if isinstance(device, list):
+        device = tuple(device)
+    key = (device, samplingRate, blockSize, latency)
+    if key not in _latencyCache:
+        inChannel, outChannel = loopbackChannels or (1, 1)
+        _latencyCache[key] = measure_latency(samplingRate, [inChannel],
+                                             [outChannel], device, latency,
+                                             blockSize, **kwargs)
+    return _latencyCache[key]
+
+
+def clear_latency_cache():
+    """
+    Forgets the measured latencies, e.g. after changing the interface
+    buffer settings outside PyTTa.
+    """
+    _latencyCache.clear()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Axes
+=====
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule provides the time and frequency vectors of the signals as
+    shared, immutable Axis objects. An Axis is defined only by its number
+    of samples and step, so every signal with the same number of samples
+    and sampling rate uses the same object, and its values are only
+    calculated the first time they are needed:
+
+        >>> axis = pytta.axes.freq_axis(2**18, 44100)
+        >>> axis is signalObj.freqVector  # any 2**18 samples, 44.1 kHz signal
+        True
+        >>> axis.index(1000)              # bin closest to 1 kHz
+        >>> axis.band(100, 5000)          # slice of the bins within the band
+
+    An Axis can be used as a read-only numpy array: indexed, compared,
+    operated, plotted or converted with np.asarray().
+
+    Available functions:
+    --------------------
+
+        >>> pytta.axes.time_axis( numSamples, samplingRate )
+        >>> pytta.axes.freq_axis( numSamples, samplingRate, sided )
+
+    For further information, check the function specific documentation.
+"""
+
+import threading
+import weakref
+import numpy as np
+
+
+_axes = weakref.WeakValueDictionary()
+""" Interned axes, kept while any signal uses them """
+
+_lock = threading.Lock()
+
+
+class Axis(object):
+    """
+    Evenly spaced, read-only vector: values[k] = k*step, k < size.
+
+    Properties(self):       (default),      meaning
+        - kind:             ('time'),       'time' or 'freq';
+        - size:             (0),            number of values;
+        - step:             (1),            spacing between values, 1/samplingRate or samplingRate/numSamples;
+        - values:           (ndarray),      read-only array, calculated when first used.
+
+    Methods:                meaning
+        - index(value):     index of the value closest to value, or to each of an array of values;
+        - band(low, high):  slice of the indexes with values within [low, high].
+
+    The lookups are calculated from the step, without scanning the values.
+    """
+
+    __slots__ = ('_kind', '_size', '_step', '_values', '__weakref__')
+
+    def __init__(self, kind, size, step):
+        self._kind = kind
+        self._size = int(size)
+        self._step = float(step)
+        self._values = None
+
+    @property
+    def kind(self):
+        return self._kind
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def step(self):
+        return self._step
+
+    @property
+    def shape(self):
+        return (self._size,)
+
+    @property
+    def ndim(self):
+        return 1
+
+    @property
+    def dtype(self):
+        return np.dtype('float64')
+
+    @property
+    def values(self):
+        if self._values is None:
+            values = np.arange(self._size) * self._step
+            values.setflags(write=False)
+            self._values = values
+        return self._values
+
+    def index(self, value):
+        """
+        Index of the closest value, clipped to the axis limits. Accepts
+        scalars or arrays.
+        """
+        indexes = np.clip(np.rint(np.asarray(value) / self._step),
+                          0, max(self._size - 1, 0)).astype(int)
+        return int(indexes) if indexes.ndim == 0 else indexes
+
+    def band(self, low=None, high=None):
+        """
+        Slice of the indexes whose values are within [low, high].
+
+        >>> signalObj.freqSignal[signalObj.freqVector.band(100, 5000)]
+        """
+        start = 0 if low is None else int(np.ceil(low / self._step - 1e-9))
+        stop = self._size if high is None \
+            else int(np.floor(high / self._step + 1e-9)) + 1
+        return slice(max(start, 0), min(max(stop, 0), self._size))
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            if idx < 0:
+                idx += self._size
+            if not 0 <= idx < self._size:
+                raise IndexError("Axis index out of range")
+            return idx * self._step
+        return self.values[idx]
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __array__(self, dtype=None):
+        if dtype is None:
+            return self.values
+        return self.values.astype(dtype)
+
+    def __getattr__(self, name):
+        # remaining ndarray methods, e.g. max(), min(), copy()
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.values, name)
+
+    def __repr__(self):
+        return 'Axis(kind=' + repr(self._kind) + ', size=' \
+            + str(self._size) + ', step=' + repr(self._step) + ')'
+
+    def __reduce__(self):
+        return (_interned, (self._kind, self._size, self._step))
+
+
+def _delegate(name):
+    def operator(self, *args):
+        return getattr(self.values, name)(*args)
+    operator.__name__ = name
+    return operator
+
+
+for _name in ('__add__', '__radd__', '__sub__', '__rsub__', '__mul__',
+              '__rmul__', '__truediv__', '__rtruediv__', '__pow__',
+              '__neg__', '__abs__', '__lt__', '__le__', '__gt__', '__ge__',
+              '__eq__', '__ne__'):
+    setattr(Axis, _name, _delegate(_name))
+
+Axis.__hash__ = object.__hash__
+
+
+def _interned(kind, size, step):
+    key = (kind, int(size), float(step))
+    with _lock:
+        axis = _axes.get(key)
+        if axis is None:
+            axis = Axis(kind, size, step)
+            _axes[key] = axis
+    return axis
+
+
+def time_axis(numSamples, samplingRate):
+    """
+    Shared time vector of numSamples at samplingRate [s]:
+    0, 1/samplingRate, ..., (numSamples - 1)/samplingRate.
+    """
+    return _interned('time', numSamples, 1 / samplingRate)
+
+
+def freq_axis(numSamples, samplingRate, sided='two'):
+    """
+    Shared frequency vector of a numSamples FFT at samplingRate [Hz], with
+    step samplingRate/numSamples. 'two' sided has numSamples bins, as
+    SignalObj.freqVector; 'one' sided has numSamples//2 + 1 bins, as the
+    numpy.fft.rfftfreq() of the spectral estimators.
+    """
+    if sided == 'two':
+        size = numSamples
+    elif sided == 'one':
+        size = numSamples//2 + 1
+    else:
+        raise ValueError("Unknown sided " + repr(sided)
+                         + ", use 'one' or 'two'")
+    step = samplingRate / numSamples if numSamples else samplingRate
+    return _interned('freq', size, step)
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+"""
+Batch
+======
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule runs a chain of PyTTa operations over a list of recording
+    files, in parallel, with a pool of processes.
+
+        >>> def transfer(signalObj):
+        >>>     return signalObj / pytta.batch.shared['sweep']
+        >>>
+        >>> def analysis(transferfunction):
+        >>>     return pytta.ir.truncate(transferfunction)
+        >>>
+        >>> results = pytta.batch.run_batch(fileNames,
+        >>>                                 [transfer, analysis],
+        >>>                                 sharedSignals={'sweep': sweepObj})
+        >>> report, numFailed = pytta.batch.timing_report(results)
+
+    Each file is read in the worker process (pytta.read_wav() by default),
+    and goes through every stage, each receiving the previous stage's output.
+    The stages must be module level functions (or functools.partial of
+    them), so they can be sent to the workers.
+
+    Signals shared by all files, like the excitation, are placed once in
+    shared memory and are available in every worker through the
+    pytta.batch.shared dict. SignalObjs and large arrays returned by the
+    stages also come back through shared memory, instead of being pickled.
+    The number of files being processed at once is bounded, so results can
+    be consumed with iter_batch() without holding all of them in memory.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.batch.run_batch( fileNames, stages )
+        >>> pytta.batch.iter_batch( fileNames, stages )
+        >>> pytta.batch.timing_report( results )
+
+    For further information, check the function specific documentation.
+"""
+
+import collections
+import concurrent.futures as futures
+import os
+import time
+import traceback
+import numpy as np
+from multiprocessing import shared_memory
+from pytta import classes
+from pytta import default
+
+
+shared = {}
+""" SignalObjs shared by all files, available to the stages in each worker """
+
+BatchResult = collections.namedtuple('BatchResult', ['fileName', 'result',
+                                                     'timings', 'error'])
+BatchResult.__doc__ = """
+    Outcome of a file: last stage's result, time spent on each stage [s] and
+    the formatted traceback if any stage raised an exception (else None).
+    """
+
+_minSharedBytes = 2**16
+""" Arrays smaller than this are pickled, as shared memory is not worth it """
+
+
+#%% Shared memory transport
+
+def _to_shared(array):
+    array = np.ascontiguousarray(array)
+    block = shared_memory.SharedMemory(create=True,
+                                       size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+    return block
+
+
+def _from_shared(descriptor, unlink):
+    name, shape, dtype = descriptor
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        array = np.array(np.ndarray(shape, dtype, buffer=block.buf))
+    finally:
+        block.close()
+        if unlink:
+            block.unlink()
+    return array
+
+
+def _signal_meta(signalObj):
+    return {'domain': signalObj.domain,
+            'samplingRate': signalObj.samplingRate,
+            'freqMin': signalObj.freqMin,
+            'freqMax': signalObj.freqMax,
+            'comment': signalObj.comment,
+            'calibration': signalObj._calibration,
+            'unit': signalObj.unit}
+
+
+def _build_signal(array, meta):
+    signalObj = classes.SignalObj(array, meta['domain'], meta['samplingRate'],
+                                  freqMin=meta['freqMin'],
+                                  freqMax=meta['freqMax'],
+                                  comment=meta['comment'])
+    signalObj.calibration = meta['calibration']
+    signalObj.unit = meta['unit']
+    return signalObj
+
+
+def _pack(value, blocks):
+    """
+    Replaces SignalObjs and large arrays by shared memory descriptors. The
+    created blocks are appended to blocks, so the caller can close them.
+    """
+    if isinstance(value, classes.SignalObj):
+        array = value.freqSignal if value.domain == 'freq' \
+            else value.timeSignal
+        block = _to_shared(array)
+        blocks.append(block)
+        return ('__signal__', (block.name, array.shape, array.dtype.str),
+                _signal_meta(value))
+    if isinstance(value, np.ndarray) and value.nbytes >= _minSharedBytes:
+        block = _to_shared(value)
+        blocks.append(block)
+        return ('__array__', (block.name, value.shape, value.dtype.str))
+    if isinstance(value, tuple) and not hasattr(value, '_fields'):
+        return ('__tuple__', [_pack(item, blocks) for item in value])
+    if isinstance(value, list):
+        return ('__list__', [_pack(item, blocks) for item in value])
+    if isinstance(value, dict):
+        return ('__dict__', {key: _pack(item, blocks)
+                             for key, item in value.items()})
+    return ('__value__', value)
+
+
+def _unpack(packed, unlink=True):
+    kind = packed[0]
+    if kind == '__signal__':
+        return _build_signal(_from_shared(packed[1], unlink), packed[2])
+    if kind == '__array__':
+        return _from_shared(packed[1], unlink)
+    if kind == '__tuple__':
+        return tuple(_unpack(item, unlink) for item in packed[1])
+    if kind == '__list__':
+        return [_unpack(item, unlink) for item in packed[1]]
+    if kind == '__dict__':
+        return {key: _unpack(item, unlink) for key, item in packed[1].items()}
+    return packed[1]
+
+
+#%% Worker side
+
+def _stage_name(stage):
+    if isinstance(stage, tuple):
+        return stage[0]
+    return getattr(stage, '__name__', None) \
+        or getattr(getattr(stage, 'func', None), '__name__', repr(stage))
+
+
+def _init_worker(sharedPacked, settings):
+    # the parent's pytta.default values, including its defaults() scope
+    default.set_defaults(**settings)
+    shared.clear()
+    shared.update({name: _unpack(packed, unlink=False)
+                   for name, packed in sharedPacked.items()})
+
+
+def _worker_settings():
+    """ Default values in use, but the audio device, for the workers """
+    settings = dict(default.snapshot())
+    settings.pop('device')
+    return settings
+
+
+def _process_file(fileName, stages, reader):
+    timings = collections.OrderedDict()
+    try:
+        start = time.perf_counter()
+        data = reader(fileName)
+        timings['read'] = time.perf_counter() - start
+        for stage in stages:
+            function = stage[1] if isinstance(stage, tuple) else stage
+            start = time.perf_counter()
+            data = function(data)
+            timings[_stage_name(stage)] = time.perf_counter() - start
+        return data, timings, None
+    except Exception:
+        return None, timings, traceback.format_exc()
+
+
+def _worker_task(fileName, stages, reader):
+    result, timings, error = _process_file(fileName, stages, reader)
+    blocks = []
+    packed = _pack(result, blocks)
+    for block in blocks:
+        # the parent process unlinks the block after copying the result.
+        # The resource tracker is shared by the pool, so the block is only
+        # cleaned up by it if the parent dies before that
+        block.close()
+    return packed, timings, error
+
+
+#%% Batch functions
+
+def _run(fileNames, stages, processes, maxInFlight, reader, sharedSignals):
+    """
+    Yields (index, BatchResult) pairs as the files are finished.
+    """
+    from pytta.functions import read_wav
+    if reader is None:
+        reader = read_wav
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if maxInFlight is None:
+        maxInFlight = 2*processes
+    sharedSignals = {} if sharedSignals is None else dict(sharedSignals)
+    stages = list(stages)
+    if processes <= 1:
+        # serial run, in this process, mostly for debugging the stages
+        previous = dict(shared)
+        shared.clear()
+        shared.update(sharedSignals)
+        try:
+            for idx, fileName in enumerate(fileNames):
+                yield idx, BatchResult(fileName,
+                                       *_process_file(fileName, stages,
+                                                      reader))
+        finally:
+            shared.clear()
+            shared.update(previous)
+        return
+    sharedBlocks = []
+    sharedPacked = {name: _pack(value, sharedBlocks)
+                    for name, value in sharedSignals.items()}
+    try:
+        with futures.ProcessPoolExecutor(max_workers=processes,
+                                         initializer=_init_worker,
+                                         initargs=(sharedPacked,
+                                                   _worker_settings())) \
+                as pool:
+            pending = {}
+            fileIter = enumerate(fileNames)
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < maxInFlight:
+                    try:
+                        idx, fileName = next(fileIter)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    task = pool.submit(_worker_task, fileName, stages, reader)
+                    pending[task] = (idx, fileName)
+                if not pending:
+                    break
+                done, _ = futures.wait(pending,
+                                       return_when=futures.FIRST_COMPLETED)
+                for task in done:
+                    idx, fileName = pending.pop(task)
+                    packed, timings, error = task.result()
+                    yield idx, BatchResult(fileName, _unpack(packed),
+                                           timings, error)
+    finally:
+        for block in sharedBlocks:
+            block.close()
+            block.unlink()
+
+
+def iter_batch(fileNames, stages, processes=None, maxInFlight=None,
+               reader=None, sharedSignals=None):
+    """
+    Generator version of run_batch(), yielding BatchResults as the files are
+    finished, not necessarily in the fileNames order. At most maxInFlight
+    files are being processed, or waiting to be consumed, at any time.
+    """
+    for idx, result in _run(fileNames, stages, processes, maxInFlight,
+                            reader, sharedSignals):
+        yield result
+
+
+def run_batch(fileNames, stages, processes=None, maxInFlight=None,
+              reader=None, sharedSignals=None):
+    """
+    Reads every file and passes it through the chain of stages, using a pool
+    of processes.
+
+    >>> results = pytta.batch.run_batch(fileNames, [stage1, stage2],
+    >>>                                 processes=8)
+
+    Parameters:
+    -----------
+
+        - stages: list of functions, or (name, function) pairs, each one
+                    receiving the previous one's output;
+        - processes: number of worker processes, defaults to the number of
+                    CPUs. 1 runs everything in the calling process;
+        - maxInFlight: maximum number of files being processed at once,
+                    defaults to 2*processes;
+        - reader: function that reads a file name into the first stage's
+                    input, defaults to pytta.read_wav;
+        - sharedSignals: dict of SignalObjs (or arrays) placed once in
+                    shared memory and available to the stages through
+                    pytta.batch.shared.
+
+    Returns the list of BatchResults, in the fileNames order.
+    """
+    fileNames = list(fileNames)
+    results = [None]*len(fileNames)
+    for idx, result in _run(fileNames, stages, processes, maxInFlight,
+                            reader, sharedSignals):
+        results[idx] = result
+    return results
+
+
+def timing_report(results):
+    """
+    Per stage timing statistics of a batch: number of files, total, mean and
+    maximum time [s].
+
+    >>> report, numFailed = pytta.batch.timing_report(results)
+    >>> report['read']['mean']
+
+    Returns the statistics, keyed by stage name, and the number of failed
+    files, apart, so every item of the report is a stage.
+    """
+    timings = collections.OrderedDict()
+    for result in results:
+        for stage, elapsed in result.timings.items():
+            timings.setdefault(stage, []).append(elapsed)
+    report = collections.OrderedDict()
+    for stage, values in timings.items():
+        report[stage] = {'count': len(values),
+                         'total': float(np.sum(values)),
+                         'mean': float(np.mean(values)),
+                         'max': float(np.max(values))}
+    numFailed = sum(result.error is not None for result in results)
+    return report, numFailed
@@ -22,19 +22,33 @@ This way, the default settings will be loaded into any object instantiated.
 User intended classes:
     
     >>> pytta.SignalObj()
+    >>> pytta.SignalSet()
     >>> pytta.RecMeasure()
     >>> pytta.PlayRecMeasure()
     >>> pytta.FRFMeasure()
+    >>> pytta.MIMOMeasure()
+    >>> pytta.SteppedSineMeasure()
     
 For further information see the specific class, or method, documentation
 """
 #%% Importing modules
 #import pytta as pa
+import collections
+import warnings
 import numpy as np
-import matplotlib.pyplot as plot
-import scipy.signal as signal
-import sounddevice as sd
+from pytta._lazy import LazyModule
 from pytta import default
+from pytta import spectral
+from pytta import fft
+from pytta import profiling
+from pytta import audio
+from pytta import axes
+from pytta import phase
+from pytta import plotting
+from pytta.properties import levelReference, run_in_context
+
+# loaded on first use, keeping "import pytta" fast and free of audio I/O
+sd = LazyModule('sounddevice')
 
 
 class PyTTaObj(object):
@@ -97,6 +111,13 @@ class PyTTaObj(object):
 
 #%% PyTTaObj Methods
 
+    def save(self,fileName,**kwargs):
+        """
+        Saves the object and its metadata, see pytta.save()
+        """
+        from pytta import storage
+        return storage.save(fileName,self,**kwargs)
+
     def __call__(self):
         for name, value in vars(self).items():
             if len(name)<=8:
@@ -113,11 +134,15 @@ class SignalObj(PyTTaObj):
     
     Properties(self): 	   	(default),   	meaning  
         - timeSignal:   	(ndarray),   	signal at time domain;
-        - timeVector:   	(ndarray),   	time reference vector for timeSignal;
+        - timeVector:   	(Axis),   	time reference vector for timeSignal, shared, see pytta.axes;
         - freqSignal:   	(ndarray),   	signal at frequency domain;
-        - freqVector:   	(ndarray),   	frequency reference vector for freqSignal;
+        - freqVector:   	(Axis),   	frequency reference vector for freqSignal, shared, see pytta.axes;
         - numSamples:	(samples),   	signal's number of samples;
         - timeLength:  	(seconds),   	signal's duration;
+        - calibration:  	(ones),   	per channel factors from full scale to unit [unit/FS];
+        - unit:  	 	('FS'),   	per channel physical unit, e.g. 'Pa', 'V', 'm/s2';
+        - reference:  	(1),   	 	per channel level reference value of the unit;
+        - streamHealth:  	(None),   	audio.StreamHealth of the run, for measurement recordings;
         
     Properties(inherited):  (default),          meaning
         - samplingRate:     (44100),            signal's sampling rate;
@@ -129,6 +154,14 @@ class SignalObj(PyTTaObj):
         - play():  	 	reproduce the timeSignal with default output device;
         - plot_time():  	generates the signal's historic graphic;
         - plot_freq():  	generates the signal's spectre graphic;
+        - calibrate(calibrator):  sets calibration factors from a calibrator recording;
+        - level():  	 	RMS level of each channel [dB re reference];
+        - psd():  	 	Welch averaged power spectral density;
+        - csd(other):  	Welch averaged cross spectral density with other;
+        - coherence(other):  magnitude squared coherence with other;
+        - stft():  	 	short-time Fourier transform;
+        - group_delay():  	group delay of each channel;
+        - minimum_phase():  	minimum phase version, same magnitude response;
     
     """
     
@@ -136,6 +169,8 @@ class SignalObj(PyTTaObj):
                      signalArray=np.array([0]),
                      domain='time',
                      *args,
+                     calibration=None,
+                     unit='FS',
                      **kwargs):
         if self.size_check(signalArray)>2:
             message = "No 'pyttaObj' is able handle arrays with more \
@@ -153,12 +188,56 @@ class SignalObj(PyTTaObj):
             self.timeSignal = signalArray
             print('Taking the input as a time domain signal')
             self.domain = 'time'
+        self.calibration = calibration
+        self.unit = unit
+        self.streamHealth = None # audio.StreamHealth, for recordings
 
 #%% Signal Properties
            
     @property
     def domain(self):
         return self._domain
+
+    @property
+    def calibration(self):
+        """
+        Per channel factors that convert the samples, kept as they were
+        recorded, into the physical unit. They are applied only to the
+        results of level and spectral calculations, the signal samples are
+        never rescaled.
+        """
+        if self._calibration is None:
+            return np.ones(self.num_channels())
+        return self._calibration
+    @calibration.setter
+    def calibration(self,newCalibration):
+        if newCalibration is None:
+            self._calibration = None
+            return
+        newCalibration = np.array(newCalibration,dtype='float64') \
+                            * np.ones(self.num_channels())
+        if newCalibration.shape != (self.num_channels(),):
+            raise ValueError("There must be one calibration factor per channel")
+        self._calibration = newCalibration
+
+    @property
+    def isCalibrated(self):
+        return self._calibration is not None
+
+    @property
+    def unit(self):
+        return self._unit
+    @unit.setter
+    def unit(self,newUnit):
+        if isinstance(newUnit,str):
+            newUnit = [newUnit]*self.num_channels()
+        if len(newUnit) != self.num_channels():
+            raise ValueError("There must be one unit per channel")
+        self._unit = list(newUnit)
+
+    @property
+    def reference(self):
+        return np.array([levelReference.get(unit,1) for unit in self.unit])
     
     @property 
     def timeVector(self):
@@ -172,156 +251,124 @@ class SignalObj(PyTTaObj):
     def timeSignal(self):
         return self._timeSignal
     @timeSignal.setter
+    @profiling.instrument('SignalObj.timeSignal')
     def timeSignal(self,newSignal): # when timeSignal have new ndarray value,
                                     # calculate other properties
+        numChannels = self._current_channels()
         self._timeSignal = np.array(newSignal)
+        self._check_channels(numChannels)
         self._numSamples = len(self.timeSignal) # [-] number of samples
         self._fftDegree = np.log2(self.numSamples) # [-] size parameter
         
         # [s] signal time lenght
         self._timeLength = self.numSamples / self.samplingRate
         
-        # [s] time vector (x axis)
-        self._timeVector = np.linspace( 0, \
-                                      self.timeLength \
-                                          - (1/self.samplingRate), \
-                                      self.numSamples ) 
+        # [s] time vector (x axis), shared by signals of the same size
+        self._timeVector = axes.time_axis(self.numSamples, self.samplingRate)
         
-        # [Hz] frequency vector (x axis)
-        self._freqVector = np.linspace( 0, \
-                                      (self.numSamples - 1) \
-                                          * self.samplingRate \
-                                          / self.numSamples, \
-                                      self.numSamples )
+        # [Hz] frequency vector (x axis), shared by signals of the same size
+        self._freqVector = axes.freq_axis(self.numSamples, self.samplingRate)
         
         # [-] signal in frequency domain
-        self._freqSignal = np.transpose( np.fft.fft( \
-                                      self.timeSignal.transpose() ) )
+        self._freqSignal = fft.fft( self.timeSignal, axis=0 )
 
 
     @property
     def freqSignal(self): 
         return self._freqSignal
     @freqSignal.setter
+    @profiling.instrument('SignalObj.freqSignal')
     def freqSignal(self,newSignal):
+        numChannels = self._current_channels()
         self._freqSignal = np.array(newSignal)
-        self._timeSignal = np.transpose( \
-                                        np.real( \
-                                        np.fft.ifft( \
-                                        self.freqSignal.transpose()
-                                        ) ) )
+        self._timeSignal = np.real( fft.ifft( self.freqSignal, axis=0 ) )
+        self._check_channels(numChannels)
         self._numSamples = len(self.timeSignal) # [-] number of samples
         self._fftDegree = np.log2(self.numSamples) # [-] size parameter
         
         # [s] signal time lenght
         self._timeLength = self.numSamples/self.samplingRate 
         
-        # [s] time vector
-        self._timeVector = np.arange(0, self.timeLength, 1/self.samplingRate)
+        # [s] time vector, shared by signals of the same size
+        self._timeVector = axes.time_axis(self.numSamples, self.samplingRate)
         
-        # [Hz] frequency vector
-        self._freqVector = np.linspace(0, (self.numSamples-1) \
-                                       * self.samplingRate \
-                                       / self.numSamples, \
-                                       self.numSamples)
+        # [Hz] frequency vector, shared by signals of the same size
+        self._freqVector = axes.freq_axis(self.numSamples, self.samplingRate)
+
+
+    def _current_channels(self):
+        return self.num_channels() if hasattr(self,'_timeSignal') else None
+
+    def _check_channels(self,oldChannels):
+        # per channel calibration and units do not apply to a signal with
+        # another number of channels
+        if oldChannels is not None and oldChannels != self.num_channels():
+            self._calibration = None
+            self._unit = ['FS']*self.num_channels()
 
         
 #%% Signal Methods
         
-    def __truediv__(self, other):
+    def _broadcast(self, other, domain):
         """
-        Frequency domain division method
+        Both signals in the given domain, a single channel against a
+        multichannel one as a column, so every channel operates at once
         """
         if type(other) != type(self):
             raise TypeError("A SignalObj can only operate with other alike")
 
+        first = getattr(self, domain+'Signal')
+        second = getattr(other, domain+'Signal')
+        if first.ndim != second.ndim:
+            # single channel against multichannel: broadcast as a column
+            if first.ndim == 1: first = first[:,np.newaxis]
+            if second.ndim == 1: second = second[:,np.newaxis]
+        elif first.ndim > 1 and \
+                1 not in (first.shape[1], second.shape[1]) and \
+                first.shape[1] != second.shape[1]:
+            raise ValueError("Both signals must have the same number of "
+                             + "channels, or one of them a single channel")
+        return first, second
+
+    @profiling.instrument('SignalObj.__truediv__')
+    def __truediv__(self, other):
+        """
+        Frequency domain division method
+        """
+        numerator, denominator = self._broadcast(other, 'freq')
         result = SignalObj(samplingRate=self.samplingRate)
         result._domain = 'freq'
-        if self.size_check() > 1:
-            if other.size_check() > 1:
-                i = 0
-                for channelA in range(self.num_channels()):
-                    for channelB in range(other.num_channels()):
-                        result.freqSignal[:,i + channelB] = \
-                                self.freqSignal[:,channelA] \
-                                /other.freqSignal[:,channelB]
-                    i = channelB
-            else:
-                for channel in range(self.num_channels()):
-                    result.freqSignal = self.freqSignal[:,channel] \
-                                        /other.freqSignal
-                                        
-        elif other.size_check() > 1:
-            for channel in range(self.num_channels()):
-                result.freqSignal = self.freqSignal \
-                                /other.freqSignal[:,channel]
-                                
-        else: result.freqSignal = self.freqSignal / other.freqSignal
+        # every channel divided at once, column by column
+        result.freqSignal = numerator / denominator
 
         return result
     
     
+    @profiling.instrument('SignalObj.__add__')
     def __add__(self, other):
         """
         Time domain addition method
         """
-        if type(other) != type(self):
-            raise TypeError("A SignalObj can only operate with other alike")
-
+        first, second = self._broadcast(other, 'time')
         result = SignalObj(samplingRate=self.samplingRate)
-        result.domain = 'time'
-        if self.size_check() > 1:
-            if other.size_check() > 1:
-                i = 0
-                for channelA in range(self.num_channels()):
-                    for channelB in range(other.timeSignal.shape):
-                        result.timeSignal[:,i + channelB] = \
-                                self.timeSignal[:,channelA] \
-                                +other.timeSignal[:,channelB]
-                    i = channelB
-            else:
-                for channel in range(self.num_channels()):
-                    result.freqSignal = self.timeSignal[:,channel] \
-                                        +other.timeSignal
-                                        
-        elif other.size_check() > 1:
-            for channel in range(self.num_channels()):
-                result.timeSignal = self.timeSignal \
-                                +other.timeSignal[:,channel]
-                                
-        else: result.timeSignal = self.timeSignal + other.timeSignal
+        result._domain = 'time'
+        # every channel added at once, column by column
+        result.timeSignal = first + second
+
         return result
 
 
+    @profiling.instrument('SignalObj.__sub__')
     def __sub__(self, other):
         """
         Time domain subtraction method
         """
-        if type(other) != type(self):
-            raise TypeError("A SignalObj can only operate with other alike")
-
+        first, second = self._broadcast(other, 'time')
         result = SignalObj(samplingRate=self.samplingRate)
-        result.domain = 'time'
-        if self.size_check() > 1:
-            if other.size_check() > 1:
-                i = 0
-                for channelA in range(self.num_channels()):
-                    for channelB in range(other.num_channels):
-                        result.timeSignal[:,i + channelB] \
-                                =self.timeSignal[:,channelA] \
-                                -other.timeSignal[:,channelB]
-                    i = channelB
-            else:
-                for channel in range(self.num_channels()):
-                    result.freqSignal = self.timeSignal[:,channel] \
-                                        -other.timeSignal
-                                        
-        elif other.size_check() > 1:
-            for channel in range(self.num_channels()):
-                result.timeSignal = self.timeSignal \
-                                -other.timeSignal[:,channel]
-                                
-        else: result.timeSignal = self.timeSignal - other.timeSignal
+        result._domain = 'time'
+        # every channel subtracted at once, column by column
+        result.timeSignal = first - second
+
         return result
     
 
@@ -340,6 +387,106 @@ class SignalObj(PyTTaObj):
         return np.size( inputArray.shape )
 
 
+    def calibrate(self,calibrator,channel=None,referenceLevel=94,unit='Pa'):
+        """
+        Sets the calibration factor of the channels from a calibrator
+        recording, e.g. a 94 dB SPL tone recorded with the same input chain.
+        
+        >>> signalObj.calibrate(calibratorRecording, channel=0)
+        
+        If channel is None, the calibrator SignalObj must have one channel
+        for each channel of self, recorded with its respective calibrator.
+        Otherwise only the given channel (0 based) is calibrated, using the
+        first channel of the calibrator recording.
+        """
+        calibratorSignal = np.asarray(calibrator.timeSignal,dtype='float64')
+        if calibratorSignal.ndim == 1:
+            calibratorSignal = calibratorSignal[:,np.newaxis]
+        rms = np.sqrt(np.mean(calibratorSignal**2,axis=0))
+        factor = levelReference.get(unit,1)*10**(referenceLevel/20)/rms
+        calibration = self.calibration.copy()
+        units = list(self.unit)
+        if channel is None:
+            if factor.size != self.num_channels():
+                raise ValueError("The calibrator must have one channel for "
+                                 + "each channel of the signal")
+            calibration[:] = factor
+            units = [unit]*self.num_channels()
+        else:
+            calibration[channel] = factor[0]
+            units[channel] = unit
+        self.calibration = calibration
+        self.unit = units
+        return self.calibration
+
+    def level(self):
+        """
+        RMS level of each channel, in dB re the unit's reference value,
+        e.g. dB SPL for calibrated signals in Pa, dBFS for uncalibrated ones.
+        """
+        timeSignal = self.timeSignal
+        if timeSignal.ndim == 1:
+            timeSignal = timeSignal[:,np.newaxis]
+        meanSquared = np.mean(np.abs(timeSignal)**2,axis=0)
+        with np.errstate(divide='ignore'):
+            return 10*np.log10(meanSquared*(self.calibration
+                                            /self.reference)**2)
+
+    def psd(self,**kwargs):
+        """
+        Welch averaged power spectral density of all channels.
+        Same arguments as pytta.spectral.psd()
+        
+        >>> freq, Pxx = signalObj.psd(nperseg=8192)
+        """
+        return spectral.psd(self,**kwargs)
+    
+    def csd(self,other,**kwargs):
+        """
+        Welch averaged cross spectral density between all channels of self
+        and all channels of other. Same arguments as pytta.spectral.csd()
+        
+        >>> freq, Pxy = excitation.csd(recording)
+        """
+        return spectral.csd(self,other,**kwargs)
+    
+    def coherence(self,other,**kwargs):
+        """
+        Magnitude squared coherence between all channels of self and all
+        channels of other. Same arguments as pytta.spectral.coherence()
+        
+        >>> freq, Cxy = excitation.coherence(recording)
+        """
+        return spectral.coherence(self,other,**kwargs)
+    
+    def stft(self,**kwargs):
+        """
+        Short-time Fourier transform of all channels.
+        Same arguments as pytta.spectral.stft()
+        
+        >>> freq, time, S = signalObj.stft(nperseg=4096, hop=1024)
+        """
+        return spectral.stft(self,**kwargs)
+    
+    def group_delay(self,**kwargs):
+        """
+        Group delay [s] of all channels.
+        Same arguments as pytta.phase.group_delay()
+        
+        >>> freq, tau = signalObj.group_delay()
+        """
+        return phase.group_delay(self,**kwargs)
+    
+    def minimum_phase(self,**kwargs):
+        """
+        Minimum phase version of all channels, as a new SignalObj.
+        Same arguments as pytta.phase.minimum_phase()
+        
+        >>> hmin = signalObj.minimum_phase()
+        """
+        return phase.minimum_phase(self,**kwargs)
+
+
     def play(self,outChannel=None,latency='low',**kwargs):
         """
         Play method
@@ -355,37 +502,343 @@ class SignalObj(PyTTaObj):
 #   def plot(self): # TODO
 #        ...
 
-    def plot_time(self):
+    def plot_time(self,decimate=True,zoom=True):
         """
-        Time domain plotting method
+        Time domain plotting method. With decimate, only the min/max
+        envelope of the samples under each pixel is plotted, recalculated
+        on zoom. See pytta.plotting.plot_time()
         """
-        plot.figure( figsize=(10,5) )
-        plot.plot( self.timeVector, self.timeSignal )
-        plot.axis( [ self.timeVector[0] - 10/self.samplingRate, \
-                    self.timeVector[-1] + 10/self.samplingRate, \
-                    1.05*np.min( self.timeSignal ), \
-                   1.05*np.max( self.timeSignal ) ] )
-        plot.xlabel(r'$Time$ [s]')
-        plot.ylabel(r'$Amplitude$ [-]')
+        plotting.plot_time(self,decimate,zoom)
         
-    def plot_freq(self,smooth=True):
+    def plot_freq(self,smooth=True,decimate=True,zoom=True):
         """
-        Frequency domain plotting method
+        Frequency domain plotting method. With decimate, the power is
+        averaged within logarithmic bands one pixel wide, recalculated on
+        zoom. See pytta.plotting.plot_freq()
         """
-        plot.figure( figsize=(10,5) )
-        if not smooth:
-            dBSignal = 20 * np.log10( np.abs( \
-                            (2 / self.numSamples ) * self.freqSignal ) )
-            plot.semilogx( self.freqVector, dBSignal )
+        plotting.plot_freq(self,smooth,decimate,zoom)
+
+    def _unit_label(self):
+        return ', '.join(sorted(set(self.unit)))
+
+    def _reference_label(self):
+        return ', '.join(sorted(set([str(levelReference.get(unit,1)) + ' '
+                                     + unit for unit in self.unit])))
+
+
+
+class SignalSet(PyTTaObj):
+    """
+    Set of equal length, same sampling rate signals, e.g. the recordings of
+    a measurement campaign, kept in a single contiguous
+    (measurements x samples x channels) array, with one time and frequency
+    vector for all of them.
+
+    Properties(self): 	   	(default),   	meaning
+        - timeSignal:   	(ndarray),   	(measurements x samples x channels) signals in time domain;
+        - freqSignal:   	(ndarray),   	(measurements x samples x channels) spectra, calculated by a single FFT call when first used;
+        - timeVector:   	(Axis),   	time vector shared by all signals;
+        - freqVector:   	(Axis),   	frequency vector shared by all signals;
+        - numMeasurements:	(0),   	 	number of signals;
+        - numSamples:	(samples),   	signals' number of samples;
+        - calibration:  	(ones),   	per channel factors from full scale to unit [unit/FS];
+        - unit:  	 	('FS'),   	per channel physical unit;
+
+    Properties(inherited):  (default),          meaning
+        - samplingRate:     (44100),            signals' sampling rate;
+        - freqMin:	   (20),               minimum frequency bandwidth limit;
+        - freqMax:	   (20000),            maximum frequency bandwidth limit;
+        - comment: 	   ('No comments.')    some commentary about the set;
+
+    Methods: 	 	 	meaning
+        - from_signals(signals):  builds a set from a list of SignalObjs;
+        - mean():  	 	synchronous (time domain) average, as a SignalObj;
+        - level():  	 	(measurements x channels) RMS levels [dB re reference];
+        - psd():  	 	(measurements x freq x channels) Welch power spectral densities;
+
+    The +, - (time domain) and / (frequency domain) operators work
+    element-wise between sets of the same shape, or between a set and a
+    SignalObj, which is then applied to every measurement:
+
+        >>> recordings = pytta.SignalSet.from_signals(recordingList)
+        >>> transferfunctions = recordings / excitation
+
+    Indexing with an integer, or iterating, gives SignalObj views of the
+    measurements, sharing the set's samples, spectra and vectors, so no FFT
+    is calculated per signal. Indexing with a slice gives a SignalSet.
+    """
+
+    def __init__(self,
+                 signalArray=None,
+                 domain='time',
+                 *args,
+                 calibration=None,
+                 unit='FS',
+                 **kwargs):
+        super().__init__(*args,**kwargs)
+        if self._samplingRate is None:
+            self._samplingRate = default.samplingRate
+        if signalArray is None:
+            signalArray = np.zeros((0,1,1))
+        signalArray = np.asarray(signalArray)
+        if signalArray.ndim == 2:
+            signalArray = signalArray[:,:,np.newaxis]
+        if signalArray.ndim != 3:
+            raise ValueError("A SignalSet holds (measurements x samples x "
+                             + "channels) or (measurements x samples) arrays")
+        self._domain = domain
+        if domain == 'freq':
+            self.freqSignal = signalArray
         else:
-            signalSmooth = signal.savgol_filter( np.abs( \
-                                    self.freqSignal.transpose() ), 31, 3 )
-            dBSignal = 20 * np.log10( np.abs( signalSmooth ) )
-            plot.semilogx( self.freqVector, dBSignal.transpose() )
-        plot.axis( ( 15, 22050, 
-                   np.min( dBSignal )/1.05, 1.05*np.max( dBSignal ) ) )
-        plot.xlabel(r'$Frequency$ [Hz]')
-        plot.ylabel(r'$Magnitude$ [dBFS]')
+            self.timeSignal = signalArray
+        self.calibration = calibration
+        self.unit = unit
+
+    @classmethod
+    def from_signals(cls,signals,**kwargs):
+        """
+        Stacks a list of SignalObjs, with the same sampling rate, number of
+        samples and channels, into a SignalSet. Calibration, unit and
+        frequency limits are taken from the first signal.
+        """
+        signals = list(signals)
+        if not signals:
+            raise ValueError("At least one SignalObj is needed")
+        first = signals[0]
+        for signalObj in signals[1:]:
+            if signalObj.samplingRate != first.samplingRate \
+                    or np.shape(signalObj.timeSignal) \
+                        != np.shape(first.timeSignal):
+                raise ValueError("All signals must have the same sampling "
+                                 + "rate, number of samples and channels")
+        kwargs.setdefault('freqMin',first.freqMin)
+        kwargs.setdefault('freqMax',first.freqMax)
+        kwargs.setdefault('calibration',first._calibration)
+        kwargs.setdefault('unit',first.unit)
+        timeSignal = np.stack([signalObj.timeSignal for signalObj in signals])
+        return cls(timeSignal,'time',first.samplingRate,**kwargs)
+
+#%% SignalSet Properties
+
+    @property
+    def domain(self):
+        return self._domain
+
+    @property
+    def timeSignal(self):
+        if self._timeSignal is None:
+            self._timeSignal = np.real(fft.ifft(self._freqSignal,axis=1))
+        return self._timeSignal
+    @timeSignal.setter
+    @profiling.instrument('SignalSet.timeSignal')
+    def timeSignal(self,newSignal):
+        self._timeSignal = np.ascontiguousarray(newSignal)
+        self._freqSignal = None # calculated when first used
+        self._set_length(self._timeSignal.shape[1])
+
+    @property
+    def freqSignal(self):
+        if self._freqSignal is None:
+            self._freqSignal = fft.fft(self._timeSignal,axis=1)
+        return self._freqSignal
+    @freqSignal.setter
+    @profiling.instrument('SignalSet.freqSignal')
+    def freqSignal(self,newSignal):
+        self._freqSignal = np.ascontiguousarray(newSignal)
+        self._timeSignal = None # calculated when first used
+        self._set_length(self._freqSignal.shape[1])
+
+    def _set_length(self,numSamples):
+        if numSamples != self._numSamples:
+            self._numSamples = numSamples
+            self._fftDegree = np.log2(numSamples) if numSamples else 0
+            self._timeLength = numSamples / self.samplingRate
+
+    @property
+    def timeVector(self):
+        return axes.time_axis(self.numSamples, self.samplingRate)
+
+    @property
+    def freqVector(self):
+        return axes.freq_axis(self.numSamples, self.samplingRate)
+
+    @property
+    def numMeasurements(self):
+        array = self._timeSignal if self._timeSignal is not None \
+                    else self._freqSignal
+        return array.shape[0]
+
+    @property
+    def calibration(self):
+        if self._calibration is None:
+            return np.ones(self.num_channels())
+        return self._calibration
+    @calibration.setter
+    def calibration(self,newCalibration):
+        if newCalibration is None:
+            self._calibration = None
+            return
+        newCalibration = np.array(newCalibration,dtype='float64') \
+                            * np.ones(self.num_channels())
+        if newCalibration.shape != (self.num_channels(),):
+            raise ValueError("There must be one calibration factor per channel")
+        self._calibration = newCalibration
+
+    @property
+    def isCalibrated(self):
+        return self._calibration is not None
+
+    @property
+    def unit(self):
+        return self._unit
+    @unit.setter
+    def unit(self,newUnit):
+        if isinstance(newUnit,str):
+            newUnit = [newUnit]*self.num_channels()
+        if len(newUnit) != self.num_channels():
+            raise ValueError("There must be one unit per channel")
+        self._unit = list(newUnit)
+
+    @property
+    def reference(self):
+        return np.array([levelReference.get(unit,1) for unit in self.unit])
+
+#%% SignalSet Methods
+
+    def num_channels(self):
+        array = self._timeSignal if self._timeSignal is not None \
+                    else self._freqSignal
+        return array.shape[2]
+
+    def __len__(self):
+        return self.numMeasurements
+
+    def __iter__(self):
+        for idx in range(self.numMeasurements):
+            yield self[idx]
+
+    def __getitem__(self,idx):
+        if isinstance(idx,slice):
+            subset = SignalSet.__new__(SignalSet)
+            subset.__dict__.update(self.__dict__)
+            if self._timeSignal is not None:
+                subset._timeSignal = self._timeSignal[idx]
+            if self._freqSignal is not None:
+                subset._freqSignal = self._freqSignal[idx]
+            return subset
+        return self._signal_view(idx)
+
+    def _signal_view(self,idx):
+        """
+        SignalObj sharing the samples, spectrum and vectors of the set,
+        built without calling the SignalObj setters, so no FFT is done
+        """
+        timeSignal, freqSignal = self.timeSignal[idx], self.freqSignal[idx]
+        if self.num_channels() == 1:
+            timeSignal, freqSignal = timeSignal[:,0], freqSignal[:,0]
+        view = SignalObj.__new__(SignalObj)
+        PyTTaObj.__init__(view,self.samplingRate,self.fftDegree,
+                          self.timeLength,self.numSamples,self.freqMin,
+                          self.freqMax,self.comment)
+        view._domain = self.domain
+        view._timeSignal = timeSignal
+        view._freqSignal = freqSignal
+        view._timeVector = self.timeVector
+        view._freqVector = self.freqVector
+        view._calibration = self._calibration
+        view._unit = list(self.unit)
+        view.streamHealth = None
+        return view
+
+    def _operand(self,other,domain):
+        """
+        Samples of other broadcast against the set's (measurements x
+        samples x channels) shape
+        """
+        if isinstance(other,SignalSet):
+            if other.samplingRate != self.samplingRate \
+                    or other.numSamples != self.numSamples:
+                raise ValueError("The SignalSets must have the same "
+                                 + "sampling rate and number of samples")
+            return other.timeSignal if domain == 'time' else other.freqSignal
+        if isinstance(other,SignalObj):
+            if other.samplingRate != self.samplingRate \
+                    or other.numSamples != self.numSamples:
+                raise ValueError("The SignalObj must have the set's "
+                                 + "sampling rate and number of samples")
+            array = other.timeSignal if domain == 'time' \
+                        else other.freqSignal
+            if array.ndim == 1:
+                array = array[:,np.newaxis]
+            return array[np.newaxis]
+        raise TypeError("A SignalSet can only operate with a SignalSet or "
+                        + "a SignalObj")
+
+    def _result(self,array,domain):
+        return SignalSet(array,domain,self.samplingRate,freqMin=self.freqMin,
+                         freqMax=self.freqMax)
+
+    @profiling.instrument('SignalSet.__add__')
+    def __add__(self,other):
+        """
+        Time domain addition method
+        """
+        return self._result(self.timeSignal + self._operand(other,'time'),
+                            'time')
+
+    @profiling.instrument('SignalSet.__sub__')
+    def __sub__(self,other):
+        """
+        Time domain subtraction method
+        """
+        return self._result(self.timeSignal - self._operand(other,'time'),
+                            'time')
+
+    @profiling.instrument('SignalSet.__truediv__')
+    def __truediv__(self,other):
+        """
+        Frequency domain division method
+        """
+        return self._result(self.freqSignal / self._operand(other,'freq'),
+                            'freq')
+
+    def mean(self):
+        """
+        Synchronous average of the measurements, in time domain
+        """
+        average = np.mean(self.timeSignal,axis=0)
+        if self.num_channels() == 1:
+            average = average[:,0]
+        return SignalObj(average,'time',self.samplingRate,
+                         freqMin=self.freqMin,freqMax=self.freqMax,
+                         calibration=self._calibration,unit=self.unit)
+
+    def level(self):
+        """
+        (measurements x channels) RMS levels, in dB re the unit's reference
+        """
+        meanSquared = np.mean(np.abs(self.timeSignal)**2,axis=1)
+        with np.errstate(divide='ignore'):
+            return 10*np.log10(meanSquared*(self.calibration
+                                            /self.reference)**2)
+
+    def psd(self,**kwargs):
+        """
+        Welch averaged power spectral density of every channel of every
+        measurement, with a single estimate over all of them. Same arguments
+        as pytta.spectral.psd()
+
+        >>> freq, Pxx = signalSet.psd(nperseg=8192)
+        >>> Pxx[3, :, 0] # fourth measurement, first channel
+        """
+        numMeasurements, numSamples, numChannels = self.timeSignal.shape
+        # (samples x measurements*channels) columns, as the spectral
+        # estimators take
+        columns = self.timeSignal.transpose(1,0,2).reshape(numSamples,-1)
+        freq, Pxx = spectral.psd(columns,self.samplingRate,**kwargs)
+        Pxx = Pxx.reshape(Pxx.shape[0],numMeasurements,numChannels)
+        Pxx = Pxx.transpose(1,0,2) * self.calibration**2
+        return freq, Pxx
 
 
 
@@ -399,12 +852,22 @@ class Measurement(PyTTaObj):
         - device: 	 	 	(system default),  	list of input and output devices;
         - inChannel:  	 	([1]), 	 	 	 	list of device's input channel used for recording;
         - outChannel: 	 	([1]), 	 	 	 	list of device's output channel used for playing/reproducing a signalObj
+        - calibration: 	 	(None), 	 	 	per input channel calibration factors given to the recordings;
+        - unit: 	 	 	('FS'), 	 	 	per input channel physical unit given to the recordings;
+        - onXrun: 	 	 	('warn'), 	 	 	action on audio stream under/overflows: 'ignore', 'warn', 'raise' (audio.XrunError) or 'retry';
+        - maxRetries: 	 	(2), 	 	 	 	number of times a run is repeated with onXrun='retry';
+        - streamHealth: 	(None), 	 	 	audio.StreamHealth of the last run, also attached to the recording;
 
     Properties(inherited): 	(default), 	 	 	meaning
         - samplingRate: 	 	(44100), 	 	 	measurement's sampling rate;
         - freqMin: 	 	 	(20),               minimum frequency bandwidth limits;
         - freqMax: 	 	 	(20000),            maximum frequency bandwidth limits;
         - comment: 	 	 	('No comments')     some commentary about the measurement;        
+
+    Methods:                meaning
+        - acquire():        audio acquisition part of run();
+        - process(recording): processing part of run();
+        - run_async():      starts run() in PyTTa's audio thread, returns a Future of its output.
         
     """
     def __init__(self,
@@ -412,12 +875,21 @@ class Measurement(PyTTaObj):
                  inChannel=None,
                  outChannel=None,
                  *args,
+                 calibration=None,
+                 unit='FS',
+                 onXrun='warn',
+                 maxRetries=2,
                  **kwargs
                  ):
         super().__init__(*args,**kwargs)
         self._device = device # device number. For device list use sounddevice.query_devices()
         self._inChannel = inChannel # input channels
         self._outChannel = outChannel # output channels
+        self._calibration = calibration # input channels calibration factors
+        self._unit = unit # input channels physical units
+        self.onXrun = onXrun # 'ignore', 'warn', 'raise' or 'retry'
+        self.maxRetries = maxRetries # runs repeated by onXrun='retry'
+        self.streamHealth = None # audio.StreamHealth of the last run
         
 #%% Measurement Properties
         
@@ -432,6 +904,93 @@ class Measurement(PyTTaObj):
     @property
     def outChannel(self):
         return self._outChannel
+
+    @property
+    def calibration(self):
+        return self._calibration
+    @calibration.setter
+    def calibration(self,newCalibration):
+        self._calibration = newCalibration
+
+    @property
+    def unit(self):
+        return self._unit
+    @unit.setter
+    def unit(self,newUnit):
+        self._unit = newUnit
+
+#%% Measurement Methods
+
+    def acquire(self):
+        """
+        Audio acquisition part of run(), outputs the recording signalObj
+        """
+        return self.run()
+
+    def process(self,recording):
+        """
+        Processing part of run(), done on the acquired recording. Outputs
+        the recording itself, unless overridden by the measurement class
+        """
+        return recording
+
+    def run_async(self):
+        """
+        Starts run() in the background and returns at once a
+        concurrent.futures.Future of its output. The runs of every
+        measurement are done one at a time, in the submission order, in
+        PyTTa's audio thread (see pytta.audio.executor()).
+
+        >>> future = frf.run_async()
+        >>> ...  # process the previous measurement meanwhile
+        >>> H = future.result()
+
+        For asyncio code, wait for asyncio.wrap_future(frf.run_async()).
+        The run uses the pytta.defaults() values of the calling code.
+        """
+        return audio.executor().submit(run_in_context(self.run))
+
+    def _acquire(self,acquisition):
+        """
+        Calls acquisition(), which returns a (recording, StreamHealth) pair,
+        handling the stream xruns as set by onXrun
+        """
+        attempt = 0
+        while True:
+            recording, health = acquisition()
+            self.streamHealth = health
+            if health.ok or self.onXrun == 'ignore':
+                return recording, health
+            message = str(health.xruns) + ' audio stream xrun(s): ' \
+                        + str(health.inputOverflows) + ' input overflow, ' \
+                        + str(health.inputUnderflows) + ' input underflow, ' \
+                        + str(health.outputOverflows) + ' output overflow, ' \
+                        + str(health.outputUnderflows) + ' output underflow'
+            if self.onXrun == 'raise':
+                raise audio.XrunError(message,health)
+            if self.onXrun == 'retry':
+                if attempt < self.maxRetries:
+                    attempt += 1
+                    warnings.warn(message + '. Repeating the run ('
+                                  + str(attempt) + '/' + str(self.maxRetries)
+                                  + ')')
+                    continue
+                raise audio.XrunError(message + ', after '
+                                      + str(self.maxRetries) + ' retries',
+                                      health)
+            warnings.warn(message + '. The recording may be corrupted')
+            return recording, health
+
+    def _calibrate_recording(self,recording):
+        """
+        Gives the measurement's calibration factors and units to a recording
+        """
+        if self.calibration is not None:
+            recording.calibration = self.calibration
+        recording.unit = self.unit if isinstance(self.unit,str) \
+                            or len(self.unit) == recording.num_channels() \
+                            else 'FS'
+        return recording
         
         
         
@@ -473,6 +1032,13 @@ class RecMeasure(Measurement):
             self._fftDegree = None
 
 #%% Rec Properties
+
+    @property
+    def domain(self):
+        return self._domain
+    @domain.setter
+    def domain(self,newDomain):
+        self._domain = newDomain
             
     @property
     def timeLength(self):
@@ -494,22 +1060,28 @@ class RecMeasure(Measurement):
 
 #%% Rec Methods
         
+    @profiling.instrument('RecMeasure.run')
     def run(self):
         """
         Run method: starts recording during Tmax seconds
         Outputs a signalObj with the recording content
         """
-        self.recording = sd.rec(self.numSamples,
-                                self.samplingRate,
-                                mapping = self.inChannel,
-                                blocking=True,
-                                latency='low',
-                                dtype = 'float32'
-                                )
-        self.recording = np.squeeze(self.recording)
+        recording, health = self._acquire(lambda: audio.rec(
+                                                self.numSamples,
+                                                self.samplingRate,
+                                                self.inChannel,
+                                                device=self.device,
+                                                latency='low',
+                                                dtype='float32'))
+        self.recording = np.squeeze(recording)
         self.recording = SignalObj(self.recording,'time',self.samplingRate)
-        maxOut = np.max(np.abs(self.recording.timeSignal[:,:]))
+        self.recording.streamHealth = health
+        self._calibrate_recording(self.recording)
+        maxOut = np.max(np.abs(self.recording.timeSignal))
         print('max input level (recording): ', 20*np.log10(maxOut), 'dBFs - ref.: 1 [-]')
+        if self.recording.isCalibrated:
+            print('RMS input level (recording): ', self.recording.level(),
+                  'dB - ref.:', self.recording._reference_label())
         return self.recording
     
     
@@ -525,6 +1097,9 @@ class PlayRecMeasure(Measurement):
         - freqMax: 	 	 	 (20000),           maximum frequency bandwidth limits;
         - numSamples:    	 (len(timeSignal)), number of samples will be 2**fftDeg. Used if domain is set to 'samples';
 		- timeLen: 	 	 	 (numSamples/samplingRate),  time length of the recording. Used if domain is set to 'time';
+        - compensateLatency: (False),           removes the interface round trip latency from the recordings;
+        - loopbackChannels:  (None),            (inChannel, outChannel) loopback pair used to measure the latency, defaults to the first channels;
+        - latencySamples:    (0),               latency removed from the last recording [samples];
 
     Properties(inherited): 	(default), 	 	 	meaning:
         - device: 	 	 	(system default),  	list of input and output devices;
@@ -535,36 +1110,74 @@ class PlayRecMeasure(Measurement):
 	Methods 	  	 	meaning:
 		- run(): 	 	starts playing the excitation signal and recording during the excitation timeLen duration;
 
+    With compensateLatency, the round trip latency is measured once per
+    device and sampling rate (see pytta.audio.round_trip_latency()), the
+    excitation is followed by that much silence and the recording starts
+    that much later, so it has the excitation length and is aligned with
+    it. The stopMargin then only needs to hold the system's decay.
+
     """
-    def __init__(self,excitation=None,*args,**kwargs):
+    def __init__(self,excitation=None,*args,
+                 compensateLatency=False,
+                 loopbackChannels=None,
+                 **kwargs):
         super().__init__(*args,**kwargs)
         if excitation is None:
             self._excitation = None
         else:
             self.excitation = excitation
+        self.compensateLatency = compensateLatency
+        self.loopbackChannels = loopbackChannels # (inChannel, outChannel)
+        self.latencySamples = 0 # latency removed from the last recording
 
 #%% PlayRec Methods
             
+    @profiling.instrument('PlayRecMeasure.run')
     def run(self):
         """
         Starts reproducing the excitation signal and recording at the same time
         Outputs a signalObj with the recording content
         """
-        recording = sd.playrec(self.excitation.timeSignal,
-                             samplerate=self.samplingRate, 
-                             input_mapping=self.inChannel,
-                             output_mapping=self.outChannel,
-                             device=self.device,
-                             blocking=True,
-                             latency='low',
-                             dtype = 'float32'
-                             ) # y_all(t) - out signal: x(t) conv h(t)
+        self.latencySamples = self._round_trip_latency()
+        excitation = self.excitation.timeSignal
+        if self.latencySamples:
+            # keeps playing silence while the delayed response is recorded
+            padding = np.zeros((self.latencySamples,)+excitation.shape[1:])
+            excitation = np.concatenate((excitation,padding),axis=0)
+        recording, health = self._acquire(lambda: audio.playrec(
+                                                excitation,
+                                                self.samplingRate,
+                                                self.inChannel,
+                                                self.outChannel,
+                                                device=self.device,
+                                                latency='low',
+                                                dtype='float32'
+                                                )) # y_all(t) - out signal: x(t) conv h(t)
+        recording = recording[self.latencySamples:] # aligned to the excitation
         recording = np.squeeze( recording ) # turn column array into line array
         self.recording = SignalObj(recording, 'time', self.samplingRate )
+        self.recording.streamHealth = health
+        self._calibrate_recording(self.recording)
 #        print('max output level (excitation): ', 20*np.log10(max(self.excitation.timeSignal)), 'dBFs - ref.: 1 [-]')
 #        print('max input level (recording): ', 20*np.log10(max(self.recording.timeSignal)), 'dBFs - ref.: 1 [-]')
         return self.recording
 
+    def _round_trip_latency(self):
+        """
+        Interface latency in samples, measured on the first run for each
+        device and sampling rate, or 0 if compensateLatency is False
+        """
+        if not self.compensateLatency:
+            return 0
+        loopbackChannels = self.loopbackChannels
+        if loopbackChannels is None:
+            loopbackChannels = (np.atleast_1d(self.inChannel)[0],
+                                np.atleast_1d(self.outChannel)[0])
+        return audio.round_trip_latency(self.samplingRate,
+                                        loopbackChannels,
+                                        device=self.device,
+                                        latency='low')
+
 #%% PlayRec Properties
             
     @property
@@ -611,6 +1224,9 @@ class FRFMeasure(PlayRecMeasure):
         - freqMax: 	 	 	 (20000),           maximum frequency bandwidth limits;
         - numSamples:    	 (len(timeSignal)), number of samples will be 2**fftDeg. Used if domain is set to 'samples';
 		- timeLen: 	 	 	 (numSamples/samplingRate),  time length of the recording. Used if domain is set to 'time';
+        - estimator:         ('deterministic'), 'deterministic' spectral division, or 'H1', 'H2', 'Hv' averaged estimators for noise excitation;
+        - nperseg:           (4096),            frame length of the averaged estimators, also the resulting transferfunction length;
+        - coherence:         (None),            (freq x channels) coherence of the last averaged estimate, first nperseg//2+1 bins of transferfunction.freqVector;
 
     Properties(inherited): 	(default), 	 	 	meaning:
         - device: 	 	 	(system default),  	list of input and output devices;
@@ -620,17 +1236,599 @@ class FRFMeasure(PlayRecMeasure):
 		
 	Methods 	  	 	meaning:
 		- run(): 	 	starts playing the excitation signal and recording during the excitation timeLen duration. At the end of recording calculates the transferfunction between recorded and reproduced signals;
+		- acquire(): 	 	plays and records, without calculating the transferfunction;
+		- process(recording): calculates the transferfunction of an already acquired recording;
+		- run_async(): 	starts run() in PyTTa's audio thread, returns a Future of the transferfunction;
+
+    The 'H1', 'H2' and 'Hv' estimators average the cross and auto spectra of
+    nperseg long frames of the excitation and the recording, so a continuous
+    random excitation (pytta.generate.noise()) can be used, even with
+    background noise:
+
+        >>> frf = pytta.generate.measurement('frf', estimator='H1')
+        >>> H = frf.run()
+        >>> frf.coherence
 
     """
-    def __init__(self,*args,**kwargs):
+    def __init__(self,*args,estimator='deterministic',nperseg=4096,**kwargs):
         super().__init__(*args,**kwargs)
+        self._estimator = estimator
+        self._nperseg = nperseg
+        self.coherence = None
+
+#%% FRF Properties
+
+    @property
+    def estimator(self):
+        return self._estimator
+
+    @property
+    def nperseg(self):
+        return self._nperseg
+
+#%% FRF Methods
         
+    @profiling.instrument('FRFMeasure.run')
     def run(self):
         """
         Starts reproducing the excitation signal and recording at the same time
         Divides the recorded signalObj by the excitation signalObj to generate a transferfunction
         Outputs the transferfunction signalObj
         """
-        self.recording = super().run()
-        self.transferfunction = self.recording/self.excitation
-        return self.transferfunction
\ No newline at end of file
+        self.recording = self.acquire()
+        return self.process(self.recording)
+
+    def acquire(self):
+        """
+        Plays the excitation and records the response, without calculating
+        the transferfunction. Outputs the recording signalObj
+        """
+        return super().run()
+
+    @profiling.instrument('FRFMeasure.process')
+    def process(self,recording):
+        """
+        Calculates the transferfunction between the recording and the
+        excitation signal, with the measurement's estimator
+        Outputs the transferfunction signalObj
+        """
+        if self.estimator == 'deterministic':
+            self.transferfunction = recording/self.excitation
+            # equal channel counts are divided column by column
+            columnwise = recording.num_channels() \
+                            == self.excitation.num_channels()
+            return self._calibrate_frf(self.transferfunction,recording,
+                                       columnwise)
+        freq, H, Cxy = spectral.frf(self.excitation.timeSignal,
+                                    recording.timeSignal,
+                                    self.estimator, self.samplingRate,
+                                    nperseg=self.nperseg)
+        # (freq x inChannels x outChannels) into (freq x channels) columns
+        H = H.reshape(H.shape[0],-1)
+        self.coherence = np.squeeze(Cxy.reshape(Cxy.shape[0],-1))
+        # rebuilds the negative frequencies, so the transferfunction is a
+        # regular two sided SignalObj with nperseg samples
+        negative = np.conj(H[1:self.nperseg - H.shape[0] + 1][::-1])
+        H = np.concatenate((H,negative),axis=0)
+        self.transferfunction = SignalObj(np.squeeze(H),'freq',
+                                          self.samplingRate)
+        return self._calibrate_frf(self.transferfunction,recording)
+
+    def _calibrate_frf(self,transferfunction,recording,columnwise=False):
+        """
+        The transferfunction samples are the ratio of the raw samples, so
+        the calibration factors of the recording and excitation are carried
+        as their ratio, for each (excitation, recording) channel pair: the
+        matching columns if columnwise, otherwise every pair.
+        """
+        if not (recording.isCalibrated or self.excitation.isCalibrated):
+            return transferfunction
+        if columnwise:
+            ratio = recording.calibration / self.excitation.calibration
+            units = [outUnit + '/' + inUnit for inUnit, outUnit
+                     in zip(self.excitation.unit, recording.unit)]
+        else:
+            ratio = recording.calibration[np.newaxis,:] \
+                        / self.excitation.calibration[:,np.newaxis]
+            units = [outUnit + '/' + inUnit
+                     for inUnit in self.excitation.unit
+                     for outUnit in recording.unit]
+        if ratio.size != transferfunction.num_channels():
+            raise ValueError("The transferfunction channels do not match "
+                             + "the (excitation, recording) channel pairs, "
+                             + "it can not be calibrated")
+        transferfunction.calibration = ratio.ravel()
+        transferfunction.unit = units
+        return transferfunction
+
+
+
+class MIMOMeasure(PlayRecMeasure):
+    """
+    Multiple input, multiple output transfer matrix measurement, with the
+    multiple exponential sweep method: the same exponential sweep is played
+    by every outChannel at once, each one delayed by shift samples from the
+    previous, so all the M outputs x N inputs impulse responses are
+    measured in a single run, instead of M sequential ones.
+
+    Properties(self) 	 	 (default),         meaning:
+        - sweep:             (SignalObj),       single channel exponential sweep played by each output;
+        - irLength:          (1),               [s] length of each separated impulse response;
+        - harmonics:         (2),               highest harmonic distortion order kept out of the impulse response windows;
+        - shift:             (irSamples + guard), [samples] delay between the sweeps of consecutive outputs;
+        - regularization:    (1e-8),            relative regularization of the sweep spectrum inversion;
+        - excitation:        (SignalObj),       (samples x outputs) time shifted sweeps, built from sweep;
+        - irMatrix:          (None),            (irSamples x outputs x inputs) impulse responses of the last run;
+        - transferfunction:  (None),            transfer functions of the last run, one channel per (output, input) pair, output first;
+
+    Properties(inherited): 	(default), 	 	 	meaning:
+        - device: 	 	 	(system default),  	list of input and output devices;
+        - inChannel:  	 	([1]), 	 	 	 	list of device's input channels, the N inputs;
+        - outChannel: 	 	([1]), 	 	 	 	list of device's output channels, the M outputs;
+        - compensateLatency: (False),           removes the interface round trip latency from the recordings;
+        - comment: 	 	 	('No comments.'), 	some commentary about the measurement;
+
+	Methods 	  	 	meaning:
+		- run(): 	 	plays the shifted sweeps, records all inputs and separates the transfer matrix;
+		- acquire(): 	 	plays and records only;
+		- process(recording): deconvolves the recording and separates the impulse responses;
+
+    After a single deconvolution by the sweep, the impulse response of
+    output m is at m*shift samples, and is cut with a rectangular window of
+    irLength. An exponential sweep places the k-th harmonic distortion
+    response sweepRate*ln(k) seconds before the linear one, so the shift
+    includes that time for k = harmonics, and the distortion of each output
+    falls between the windows, instead of over the previous output's
+    response. The sweepRate is taken as timeLength/ln(freqMax/freqMin) of
+    the sweep, a slight overestimate, as the sweep has silent margins.
+
+    The interface latency delays every response, so it should be small
+    compared to the shift or removed with compensateLatency.
+
+        >>> mimo = pytta.generate.measurement('mimo', outChannel=[1,2,3,4],
+        >>>                                   inChannel=[1,2], irLength=0.5)
+        >>> H = mimo.run()
+        >>> mimo.irMatrix[:, 2, 1]  # output 3 to input 2 impulse response
+
+    """
+    def __init__(self,sweep=None,*args,
+                 irLength=1,
+                 harmonics=2,
+                 shift=None,
+                 regularization=1e-8,
+                 **kwargs):
+        super().__init__(None,*args,**kwargs)
+        self._irLength = irLength
+        self._harmonics = harmonics
+        self._shift = shift
+        self.regularization = regularization
+        self.irMatrix = None
+        self.transferfunction = None
+        if sweep is not None:
+            self.sweep = sweep
+
+#%% MIMO Properties
+
+    @property
+    def sweep(self):
+        return self._sweep
+    @sweep.setter
+    def sweep(self,newSweep):
+        if newSweep.num_channels() != 1:
+            raise ValueError("The MIMO sweep must have a single channel")
+        self._sweep = newSweep
+        self._build_excitation()
+
+    @property
+    def numOutputs(self):
+        return np.size(self.outChannel) if self.outChannel is not None else 1
+
+    @property
+    def numInputs(self):
+        return np.size(self.inChannel) if self.inChannel is not None else 1
+
+    @property
+    def irLength(self):
+        return self._irLength
+
+    @property
+    def irSamples(self):
+        return int(round(self.irLength * self.sweep.samplingRate))
+
+    @property
+    def harmonics(self):
+        return self._harmonics
+
+    @property
+    def shift(self):
+        if self._shift is not None:
+            return int(self._shift)
+        sweepRate = self.sweep.timeLength \
+                        / np.log(self.sweep.freqMax / self.sweep.freqMin)
+        guard = sweepRate * np.log(max(self.harmonics, 1))
+        return self.irSamples + int(np.ceil(guard * self.sweep.samplingRate))
+
+#%% MIMO Methods
+
+    def _build_excitation(self):
+        """
+        Output m plays the sweep delayed by m*shift samples, and the last
+        irLength samples are silence, recording the last output's decay
+        """
+        sweep = self.sweep.timeSignal
+        shift = self.shift
+        numSamples = sweep.shape[0] + (self.numOutputs - 1)*shift \
+                        + self.irSamples
+        excitation = np.zeros((numSamples, self.numOutputs))
+        for output in range(self.numOutputs):
+            start = output*shift
+            excitation[start:start + sweep.shape[0], output] = sweep
+        self._excitation = SignalObj(excitation, 'time',
+                                     self.sweep.samplingRate,
+                                     freqMin=self.sweep.freqMin,
+                                     freqMax=self.sweep.freqMax,
+                                     calibration=self.sweep._calibration,
+                                     unit=self.sweep.unit[0])
+
+    def acquire(self):
+        """
+        Plays the shifted sweeps and records the inputs. Outputs the
+        recording signalObj
+        """
+        return PlayRecMeasure.run(self)
+
+    @profiling.instrument('MIMOMeasure.run')
+    def run(self):
+        """
+        Plays the shifted sweeps, records the inputs and separates the
+        impulse responses. Outputs the transferfunction signalObj
+        """
+        self.recording = self.acquire()
+        return self.process(self.recording)
+
+    @profiling.instrument('MIMOMeasure.process')
+    def process(self,recording):
+        """
+        Deconvolves the recording by the sweep, with a single FFT for all
+        inputs, and cuts the impulse response of each output. Outputs the
+        transferfunction signalObj, also kept with irMatrix
+        """
+        recorded = recording.timeSignal
+        if recorded.ndim == 1:
+            recorded = recorded[:,np.newaxis]
+        sweep = self.sweep.timeSignal
+        shift, irSamples = self.shift, self.irSamples
+        # linear, not circular, deconvolution, so the harmonic distortion
+        # of the first output does not wrap over the last one's response
+        nfft = fft.next_fast_len(recorded.shape[0] + sweep.shape[0])
+        sweepSpectrum = fft.rfft(sweep, nfft)
+        power = np.abs(sweepSpectrum)**2
+        inverse = np.conj(sweepSpectrum) \
+                    / (power + self.regularization*np.max(power))
+        impulseResponses = fft.irfft(fft.rfft(recorded, nfft, axis=0)
+                                     * inverse[:,np.newaxis], nfft, axis=0)
+        irMatrix = np.zeros((irSamples, self.numOutputs, recorded.shape[1]))
+        for output in range(self.numOutputs):
+            segment = impulseResponses[output*shift:output*shift + irSamples]
+            irMatrix[:segment.shape[0], output, :] = segment
+        self.irMatrix = irMatrix
+        # (samples x outputs x inputs) into columns, output first, like
+        # FRFMeasure's (excitation, recording) channel pairs
+        self.transferfunction = SignalObj(
+                                    np.squeeze(irMatrix.reshape(irSamples,-1)),
+                                    'time', self.samplingRate)
+        return self._calibrate_mimo(self.transferfunction,recording)
+
+    def _calibrate_mimo(self,transferfunction,recording):
+        """
+        Carries the ratio of the recording and sweep calibration factors,
+        for each (output, input) pair, as FRFMeasure does
+        """
+        if not (recording.isCalibrated or self.sweep.isCalibrated):
+            return transferfunction
+        calibration = np.broadcast_to(recording.calibration,
+                                      (self.numInputs,))
+        ratio = np.tile(calibration / self.sweep.calibration[0],
+                        self.numOutputs)
+        units = [inUnit + '/' + self.sweep.unit[0]
+                 for output in range(self.numOutputs)
+                 for inUnit in np.broadcast_to(recording.unit,
+                                               (self.numInputs,))]
+        transferfunction.calibration = ratio
+        transferfunction.unit = units
+        return transferfunction
+
+
+
+SteppedSineResult = collections.namedtuple('SteppedSineResult',
+                                           ['frequencies', 'frf', 'thd',
+                                            'harmonics'])
+SteppedSineResult.__doc__ = """
+    Outcome of a stepped sine measurement: the (steps) frequencies [Hz],
+    the (steps x inChannels) complex frequency response [unit/FS], the
+    (steps x inChannels) total harmonic distortion ratio, and the
+    (steps x harmonics x inChannels) complex amplitudes [unit] of the
+    fundamental and its harmonics, nan above the Nyquist frequency.
+    """
+
+
+
+class SteppedSineMeasure(PlayRecMeasure):
+    """
+    Stepped sine measurement: one pure tone per frequency step, played and
+    recorded through a single audio stream. The tones are generated block by
+    block and the fundamental and harmonics of each step are detected, with
+    the Goertzel algorithm (pytta.spectral.goertzel()), as soon as the step
+    is recorded, so neither the excitation nor the minutes long recording
+    are ever kept, nor transformed by a whole FFT.
+
+    Properties(self) 	 	 (default),         meaning:
+        - frequencies:       (None),            [Hz] requested step frequencies, defaults to stepsPerOctave steps from freqMin to freqMax;
+        - stepsPerOctave:    (12),              steps per octave of the default frequencies;
+        - amplitude:         (0.5),             [FS] peak amplitude of the tones;
+        - harmonics:         (5),               number of detected components: the fundamental and its harmonics up to this order;
+        - integration:       (0.1),             [s] minimum detection time of each step;
+        - minCycles:         (10),              minimum number of fundamental periods detected in each step;
+        - settle:            (0.05),            [s] time from each step's start to its detection, for the system's transient;
+        - fade:              (0.005),           [s] raised cosine fade in and out of each tone;
+        - stepFrequencies:   (ndarray),         [Hz] actual step frequencies, each with a whole number of periods in its detection time;
+        - result:            (None),            SteppedSineResult of the last run;
+
+    Properties(inherited): 	(default), 	 	 	meaning:
+        - device: 	 	 	(system default),  	list of input and output devices;
+        - inChannel:  	 	([1]), 	 	 	 	list of device's input channels;
+        - outChannel: 	 	([1]), 	 	 	 	list of device's output channels, all playing the same tones;
+        - compensateLatency: (False),           shifts the detection by the interface round trip latency;
+        - calibration: 	 	(None), 	 	 	per input channel calibration factors;
+        - comment: 	 	 	('No comments.'), 	some commentary about the measurement;
+
+	Methods 	  	 	meaning:
+		- run(): 	 	plays the steps and returns the SteppedSineResult, frequency response and THD;
+		- acquire(): 	 	plays the steps and returns the raw (steps x harmonics x inChannels) detected amplitudes;
+		- process(detections): calibrates the detections into the SteppedSineResult;
+
+    Each step frequency is rounded so a whole number of its periods fits
+    the detection time, which makes the fundamental and its harmonics free
+    of leakage. The settle time must hold the fade in, the system's
+    transient and, without compensateLatency, the interface latency.
+
+        >>> ss = pytta.generate.measurement('steppedsine', freqMin=100,
+        >>>                                 freqMax=10000, harmonics=5)
+        >>> result = ss.run()
+        >>> result.frequencies, 20*np.log10(np.abs(result.frf))
+        >>> result.thd
+
+    """
+    def __init__(self,frequencies=None,*args,
+                 stepsPerOctave=12,
+                 amplitude=0.5,
+                 harmonics=5,
+                 integration=0.1,
+                 minCycles=10,
+                 settle=0.05,
+                 fade=0.005,
+                 **kwargs):
+        super().__init__(None,*args,**kwargs)
+        if settle <= fade:
+            raise ValueError("The settle time must be longer than the fade")
+        self._frequencies = frequencies
+        self._stepsPerOctave = stepsPerOctave
+        self.amplitude = amplitude
+        self._harmonics = harmonics
+        self._integration = integration
+        self._minCycles = minCycles
+        self._settle = settle
+        self._fade = fade
+        self.result = None
+        self._build_steps()
+
+#%% SteppedSine Properties
+
+    @property
+    def samplingRate(self):
+        return self._samplingRate or default.samplingRate
+
+    @property
+    def freqMin(self):
+        return self._freqMin or default.freqMin
+
+    @property
+    def freqMax(self):
+        return self._freqMax or default.freqMax
+
+    @property
+    def frequencies(self):
+        return self._frequencies
+
+    @property
+    def stepsPerOctave(self):
+        return self._stepsPerOctave
+
+    @property
+    def harmonics(self):
+        return self._harmonics
+
+    @property
+    def integration(self):
+        return self._integration
+
+    @property
+    def minCycles(self):
+        return self._minCycles
+
+    @property
+    def settle(self):
+        return self._settle
+
+    @property
+    def fade(self):
+        return self._fade
+
+    @property
+    def stepFrequencies(self):
+        return self._stepFrequencies
+
+    @property
+    def numSamples(self):
+        return int(self._stepEnds[-1]) if self._stepEnds.size else 0
+
+    @property
+    def timeLength(self):
+        return self.numSamples / self.samplingRate
+
+    @property
+    def fftDegree(self):
+        return None
+
+#%% SteppedSine Methods
+
+    def _build_steps(self):
+        """
+        Step schedule: each step fades in, settles, is detected over
+        detectionSamples, with a whole number of periods, and fades out
+        """
+        samplingRate = self.samplingRate
+        frequencies = self.frequencies
+        if frequencies is None:
+            numSteps = int(np.floor(self.stepsPerOctave
+                                    * np.log2(self.freqMax/self.freqMin)
+                                    + 1e-9)) + 1
+            frequencies = self.freqMin \
+                            * 2**(np.arange(numSteps)/self.stepsPerOctave)
+        frequencies = np.atleast_1d(np.asarray(frequencies,dtype='float64'))
+        if np.any(frequencies <= 0) \
+                or np.any(frequencies >= samplingRate/2):
+            raise ValueError("The step frequencies must be between 0 and "
+                             + "the Nyquist frequency")
+        detection = np.rint(np.maximum(self.integration,
+                                       self.minCycles/frequencies)
+                            * samplingRate).astype(int)
+        cycles = np.maximum(np.rint(frequencies*detection/samplingRate),1)
+        self._stepFrequencies = cycles * samplingRate / detection
+        self._detectionSamples = detection
+        self._settleSamples = int(round(self.settle*samplingRate))
+        self._fadeSamples = max(int(round(self.fade*samplingRate)),1)
+        lengths = self._settleSamples + detection + self._fadeSamples
+        self._stepEnds = np.cumsum(lengths)
+        self._stepStarts = self._stepEnds - lengths
+
+    def _tones(self,start,frames):
+        """
+        Output samples start to start + frames, generated in the audio
+        callback: the tone of each sample's step, with its fades
+        """
+        samples = start + np.arange(frames)
+        step = np.clip(np.searchsorted(self._stepStarts,samples,'right') - 1,
+                       0,self._stepStarts.size - 1)
+        local = samples - self._stepStarts[step]
+        remaining = self._stepEnds[step] - samples
+        fade = self._fadeSamples
+        envelope = 0.5*(1 - np.cos(np.pi*np.clip(np.minimum(local,remaining)
+                                                 / fade,0,1)))
+        envelope[remaining <= 0] = 0
+        return self.amplitude * envelope \
+                * np.sin(2*np.pi*self._stepFrequencies[step]*local
+                         / self.samplingRate)
+
+    @profiling.instrument('SteppedSineMeasure.run')
+    def run(self):
+        """
+        Plays the steps, detects the responses and outputs the
+        SteppedSineResult, also kept as result
+        """
+        self.result = self.process(self.acquire())
+        return self.result
+
+    def acquire(self):
+        """
+        Plays the steps and detects the fundamental and harmonics of each
+        one while it is recorded. Outputs the raw
+        (steps x harmonics x inChannels) complex amplitudes [FS]
+        """
+        self.latencySamples = self._round_trip_latency()
+        numChannels = np.size(self.inChannel) \
+                        if self.inChannel is not None else 1
+
+        def acquisition():
+            detector = _StepDetector(self._stepStarts + self._settleSamples
+                                     + self.latencySamples,
+                                     self._detectionSamples,
+                                     self._stepFrequencies,self.harmonics,
+                                     self.samplingRate,numChannels)
+            health = audio.stream_playrec(self._tones,detector.update,
+                                          self.numSamples
+                                          + self.latencySamples,
+                                          self.samplingRate,self.inChannel,
+                                          self.outChannel,device=self.device,
+                                          latency='low',dtype='float32')
+            return detector.detections, health
+
+        detections, health = self._acquire(acquisition)
+        return detections
+
+    @profiling.instrument('SteppedSineMeasure.process')
+    def process(self,detections):
+        """
+        Calibrates the detected amplitudes and divides the fundamentals by
+        the tones' own, for the frequency response. Outputs the
+        SteppedSineResult
+        """
+        detections = np.array(detections)
+        if self.calibration is not None:
+            detections *= np.asarray(self.calibration)
+        # the sine tone, detected from settleSamples after its step's start
+        omega = 2*np.pi*self._stepFrequencies/self.samplingRate
+        tones = self.amplitude * np.exp(1j*(omega*self._settleSamples
+                                            - np.pi/2))
+        fundamental = detections[:,0,:]
+        frf = fundamental / tones[:,np.newaxis]
+        distortion = np.sqrt(np.nansum(np.abs(detections[:,1:,:])**2,axis=1))
+        with np.errstate(divide='ignore',invalid='ignore'):
+            thd = distortion / np.abs(fundamental)
+        return SteppedSineResult(self._stepFrequencies.copy(),frf,thd,
+                                 detections)
+
+
+
+class _StepDetector(object):
+    """
+    Sink of the stepped sine stream: copies the recorded blocks into the
+    detection window of the current step and, when it is complete, detects
+    the fundamental and harmonics, so only one window is kept at a time.
+    """
+
+    def __init__(self,windowStarts,windowLengths,frequencies,harmonics,
+                 samplingRate,numChannels):
+        self.windowStarts = windowStarts
+        self.windowLengths = windowLengths
+        self.frequencies = frequencies
+        self.orders = np.arange(1,harmonics + 1)
+        self.samplingRate = samplingRate
+        self.detections = np.full((frequencies.size,harmonics,numChannels),
+                                  np.nan,dtype='complex128')
+        self._step = 0
+        self._window = None
+
+    def update(self,start,block):
+        stop = start + block.shape[0]
+        while self._step < self.frequencies.size:
+            step = self._step
+            windowStart = int(self.windowStarts[step])
+            windowStop = windowStart + int(self.windowLengths[step])
+            if windowStart >= stop:
+                return
+            if self._window is None:
+                self._window = np.zeros((windowStop - windowStart,
+                                         block.shape[1]))
+            low, high = max(start,windowStart), min(stop,windowStop)
+            if high > low:
+                self._window[low - windowStart:high - windowStart] \
+                    = block[low - start:high - start]
+            if windowStop > stop:
+                return
+            self.detections[step] = spectral.goertzel(
+                                        self._window,
+                                        self.orders*self.frequencies[step],
+                                        self.samplingRate)
+            self._window = None
+            self._step += 1
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+FFT
+====
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule is the single entry point of every FFT calculated by
+    PyTTa, so the FFT library and the number of threads used can be chosen
+    once, through the default properties:
+
+        >>> pytta.default.set_defaults(fftBackend = 'scipy',
+        >>>                            fftWorkers = 8)
+
+    Available backends:
+    -------------------
+
+        - 'numpy':  numpy.fft, single threaded (factory default);
+        - 'scipy':  scipy.fft, multithreaded over the channels with
+                    fftWorkers threads (-1 uses all CPUs);
+        - 'pyfftw': pyFFTW's numpy-like interface, if installed, with
+                    fftWorkers threads. The planning effort is set by
+                    fftPlanning ('estimate', 'measure', 'patient'), and if
+                    fftPlanCache is True the plans are cached, so repeated
+                    transforms of the same size are only planned once.
+
+    If pyFFTW is not installed, 'pyfftw' falls back to 'scipy'.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.fft.fft( x, n, axis )
+        >>> pytta.fft.ifft( x, n, axis )
+        >>> pytta.fft.rfft( x, n, axis )
+        >>> pytta.fft.irfft( x, n, axis )
+        >>> pytta.fft.next_fast_len( n )
+
+    For further information, check the function specific documentation.
+"""
+
+import os
+import warnings
+import numpy as np
+from pytta import default
+from pytta import profiling
+from pytta._lazy import LazyModule
+
+scipyFFT = LazyModule('scipy.fft') # loaded on first use
+
+_pyfftw = None
+""" pyFFTW's numpy_fft interface, once loaded, or False if not installed """
+
+_plannerEffort = {'estimate': 'FFTW_ESTIMATE',
+                  'measure': 'FFTW_MEASURE',
+                  'patient': 'FFTW_PATIENT'}
+
+
+def _load_pyfftw():
+    global _pyfftw
+    if _pyfftw is None:
+        try:
+            import pyfftw.interfaces.numpy_fft as numpyFFT
+            import pyfftw.interfaces.cache as cache
+            _pyfftw = (numpyFFT, cache)
+        except ImportError:
+            warnings.warn("pyFFTW is not installed, using the 'scipy' FFT "
+                          + "backend instead")
+            _pyfftw = False
+    return _pyfftw
+
+
+def _transform(name, x, n, axis):
+    if profiling._enabled:
+        size = np.shape(x)[axis] if n is None else n
+        with profiling.section('fft.' + name, size):
+            return _dispatch(name, x, n, axis)
+    return _dispatch(name, x, n, axis)
+
+
+def _dispatch(name, x, n, axis):
+    backend = default.fftBackend
+    workers = default.fftWorkers
+    if backend == 'pyfftw':
+        pyfftw = _load_pyfftw()
+        if pyfftw:
+            numpyFFT, cache = pyfftw
+            if default.fftPlanCache:
+                cache.enable()
+            else:
+                cache.disable()
+            return getattr(numpyFFT, name)(
+                x, n=n, axis=axis,
+                threads=workers if workers > 0 else (os.cpu_count() or 1),
+                planner_effort=_plannerEffort.get(default.fftPlanning,
+                                                  'FFTW_ESTIMATE'))
+        backend = 'scipy'
+    if backend == 'scipy':
+        return getattr(scipyFFT, name)(x, n=n, axis=axis, workers=workers)
+    if backend == 'numpy':
+        return getattr(np.fft, name)(x, n=n, axis=axis)
+    raise ValueError("Unknown FFT backend " + repr(backend)
+                     + ", use 'numpy', 'scipy' or 'pyfftw'")
+
+
+def fft(x, n=None, axis=-1):
+    """
+    Discrete Fourier transform along axis, with the default backend.
+
+    >>> freqSignal = pytta.fft.fft(timeSignal, axis=0)
+    """
+    return _transform('fft', x, n, axis)
+
+
+def ifft(x, n=None, axis=-1):
+    """
+    Inverse discrete Fourier transform along axis, with the default backend.
+    """
+    return _transform('ifft', x, n, axis)
+
+
+def rfft(x, n=None, axis=-1):
+    """
+    Discrete Fourier transform of a real signal, positive frequencies only,
+    along axis, with the default backend.
+    """
+    return _transform('rfft', x, n, axis)
+
+
+def irfft(x, n=None, axis=-1):
+    """
+    Inverse of rfft(), along axis, with the default backend.
+    """
+    return _transform('irfft', x, n, axis)
+
+
+def next_fast_len(n):
+    """
+    Smallest length, not less than n, with only small prime factors, which
+    is calculated much faster than an arbitrary length.
+    """
+    return scipyFFT.next_fast_len(int(n))
@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+Filters
+========
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule provides IIR (second order sections) and FIR filter
+    objects, which filter whole signals or successive blocks of a stream,
+    e.g. from pytta.read_wav_blocks() or a recording callback. The filter
+    state is kept between blocks, so filtering block by block gives the
+    same samples as filtering the whole signal at once:
+
+        >>> highpass = pytta.filters.butter(4, 100, 'highpass', 48000)
+        >>> for block in pytta.read_wav_blocks(fileName):
+        >>>     filtered = highpass.process(block)
+
+    The states are kept as (sections x 2 x channels) and
+    (taps - 1 x channels) arrays, so every block is filtered for all
+    channels in a single scipy.signal.sosfilt() or lfilter() call. Long FIR
+    filters are applied by FFT overlap-add instead, carrying the same state.
+
+    Whole signals can also be filtered without touching the stream state,
+    causally or with zero phase:
+
+        >>> aWeighted = pytta.filters.weighting('A').filter(recording)
+        >>> smooth = lowpass.filter(recording, zeroPhase=True)
+
+    Blocks may be SignalObjs, which are returned as SignalObjs with the same
+    calibration and unit, or (samples) and (samples x channels) arrays,
+    returned as arrays, with less overhead.
+
+    Available classes:
+    ------------------
+
+        >>> pytta.filters.SOSFilter( sos, samplingRate, steadyStart )
+        >>> pytta.filters.FIRFilter( taps, samplingRate, method )
+
+    Available functions:
+    --------------------
+
+        >>> pytta.filters.butter( order, cutoff, btype, samplingRate )
+        >>> pytta.filters.weighting( kind, samplingRate )
+        >>> pytta.filters.firwin( numTaps, cutoff, samplingRate )
+
+    For further information, check the class and function specific
+    documentation.
+"""
+
+import numpy as np
+from pytta import default
+from pytta import fft
+from pytta import profiling
+from pytta._lazy import LazyModule
+
+ss = LazyModule('scipy.signal') # loaded on first use
+
+
+_fftTaps = 64
+""" FIR filters with more taps are applied by FFT with method='auto' """
+
+
+def _samples(block):
+    """ (samples x channels) float samples of a SignalObj or array """
+    samples = np.asarray(getattr(block, 'timeSignal', block),
+                         dtype='float64')
+    return samples[:, np.newaxis] if samples.ndim == 1 else samples
+
+
+def _like(block, samples):
+    """ Wraps the filtered samples as the same kind of object as block """
+    if not hasattr(block, 'timeSignal'):
+        return samples[:, 0] if np.ndim(block) == 1 else samples
+    from pytta.classes import SignalObj
+    if np.ndim(block.timeSignal) == 1:
+        samples = samples[:, 0]
+    result = SignalObj(samples, 'time', block.samplingRate,
+                       freqMin=block.freqMin, freqMax=block.freqMax,
+                       comment=block.comment)
+    if block.isCalibrated:
+        result.calibration = block.calibration
+    result.unit = block.unit
+    return result
+
+
+class _StreamingFilter(object):
+    """
+    Common part of the filters: per channel state, kept between the blocks
+    given to process(), and whole signal filtering.
+    """
+
+    def __init__(self, samplingRate=None):
+        if samplingRate is None:
+            samplingRate = default.samplingRate
+        self._samplingRate = samplingRate
+        self.reset()
+
+    @property
+    def samplingRate(self):
+        return self._samplingRate
+
+    @property
+    def numChannels(self):
+        return None if self._state is None else self._state.shape[-1]
+
+    @property
+    def state(self):
+        return self._state
+
+    def reset(self):
+        """
+        Clears the filter state, the next block starts a new stream, which
+        may have a different number of channels.
+        """
+        self._state = None
+
+    @profiling.instrument('filters.process')
+    def process(self, block):
+        """
+        Filters a block of the stream, a SignalObj or (samples) or
+        (samples x channels) array, continuing from the state left by the
+        previous block. Returns the filtered block, of the same kind. Empty
+        blocks, as the last one of a chunked reader, give an empty result
+        and leave the state unchanged.
+        """
+        samples = _samples(block)
+        if samples.shape[0] == 0:
+            return _like(block, samples)
+        if self._state is None:
+            self._state = self._initial_state(samples)
+        elif samples.shape[1] != self._state.shape[-1]:
+            raise ValueError("Number of channels changed between blocks")
+        filtered, self._state = self._filter_block(samples, self._state)
+        return _like(block, filtered)
+
+    @profiling.instrument('filters.filter')
+    def filter(self, signalIn, zeroPhase=False):
+        """
+        Filters a whole signal, a SignalObj or array, as a stream of its
+        own, leaving the state of process() untouched. With zeroPhase, the
+        signal is filtered forwards and backwards, which squares the
+        magnitude response and cancels the phase. The edges are treated as
+        scipy.signal.filtfilt() and sosfiltfilt() do, for both IIR and FIR
+        filters: the signal is extended by its odd reflection, and each pass
+        starts in the steady state of its first sample.
+        """
+        samples = _samples(signalIn)
+        if samples.shape[0] == 0:
+            return _like(signalIn, samples)
+        if zeroPhase:
+            filtered = self._zero_phase(samples)
+        else:
+            filtered = self._filter_block(samples,
+                                          self._initial_state(samples))[0]
+        return _like(signalIn, filtered)
+
+
+class SOSFilter(_StreamingFilter):
+    """
+    IIR filter of cascaded second order sections.
+
+    Properties(self):       (default),      meaning
+        - sos:              (ndarray),      (sections x 6) coefficients, as scipy.signal's output='sos' designs;
+        - samplingRate:     (44100),        sampling rate of the signals;
+        - steadyStart:      (False),        starts the stream state in the steady state of the first sample, avoiding the step transient;
+        - state:            (None),         (sections x 2 x channels) filter state, None before the first block;
+        - numChannels:      (None),         number of channels of the stream.
+
+    Methods:                meaning
+        - process(block):   filters the next block of the stream;
+        - filter(signalIn, zeroPhase): filters a whole signal, causally or with zero phase;
+        - response(numPoints): frequency response;
+        - reset():          clears the state.
+
+    >>> lowpass = pytta.filters.SOSFilter(scipy.signal.butter(
+    >>>             8, 1000, fs=48000, output='sos'), 48000)
+    """
+
+    def __init__(self, sos, samplingRate=None, steadyStart=False):
+        sos = np.atleast_2d(np.asarray(sos, dtype='float64'))
+        if sos.ndim != 2 or sos.shape[1] != 6:
+            raise ValueError("sos must be a (sections x 6) array")
+        self._sos = sos
+        self.steadyStart = steadyStart
+        super().__init__(samplingRate)
+
+    @property
+    def sos(self):
+        return self._sos
+
+    def _initial_state(self, samples):
+        state = np.zeros((self._sos.shape[0], 2, samples.shape[1]))
+        if self.steadyStart and samples.shape[0]:
+            state += ss.sosfilt_zi(self._sos)[:, :, np.newaxis] * samples[0]
+        return state
+
+    def _filter_block(self, samples, state):
+        return ss.sosfilt(self._sos, samples, axis=0, zi=state)
+
+    def _zero_phase(self, samples):
+        return ss.sosfiltfilt(self._sos, samples, axis=0)
+
+    def response(self, numPoints=512):
+        """
+        Frequency response at numPoints frequencies from 0 to the Nyquist
+        frequency. Returns the frequencies [Hz] and the complex response.
+        """
+        return ss.sosfreqz(self._sos, worN=numPoints, fs=self.samplingRate)
+
+
+class FIRFilter(_StreamingFilter):
+    """
+    FIR filter.
+
+    Properties(self):       (default),      meaning
+        - taps:             (ndarray),      filter coefficients;
+        - samplingRate:     (44100),        sampling rate of the signals;
+        - method:           ('auto'),       'direct' (lfilter), 'fft' (overlap-add) or 'auto', FFT for more than 64 taps;
+        - state:            (None),         (taps - 1 x channels) filter state, None before the first block;
+        - numChannels:      (None),         number of channels of the stream.
+
+    Methods:                meaning
+        - process(block):   filters the next block of the stream;
+        - filter(signalIn, zeroPhase): filters a whole signal, causally or with zero phase;
+        - response(numPoints): frequency response;
+        - reset():          clears the state.
+
+    The state is the part of the past blocks' convolution that overlaps the
+    next outputs, so both methods carry the same state and can be switched
+    between blocks.
+
+    >>> eq = pytta.filters.FIRFilter(pytta.phase.fir_minimum_phase(taps))
+    """
+
+    def __init__(self, taps, samplingRate=None, method='auto'):
+        taps = np.asarray(taps, dtype='float64')
+        if taps.ndim != 1 or taps.size == 0:
+            raise ValueError("taps must be a non empty 1D array")
+        if method not in ('auto', 'direct', 'fft'):
+            raise ValueError("Unknown method " + repr(method)
+                             + ", use 'auto', 'direct' or 'fft'")
+        self._taps = taps
+        self.method = method
+        self._spectra = {}
+        super().__init__(samplingRate)
+
+    @property
+    def taps(self):
+        return self._taps
+
+    def _spectrum(self, taps, nfft):
+        """ rfft of the taps, cached for each FFT length of the stream """
+        if taps is not self._taps:
+            return fft.rfft(taps, nfft)[:, np.newaxis]
+        if nfft not in self._spectra:
+            if len(self._spectra) > 8:
+                self._spectra.clear()
+            self._spectra[nfft] = fft.rfft(taps, nfft)[:, np.newaxis]
+        return self._spectra[nfft]
+
+    def _convolve(self, samples, taps):
+        """ Full linear convolution of every channel with taps, by FFT """
+        numSamples = samples.shape[0] + taps.size - 1
+        nfft = fft.next_fast_len(numSamples)
+        return fft.irfft(fft.rfft(samples, nfft, axis=0)
+                         * self._spectrum(taps, nfft),
+                         nfft, axis=0)[:numSamples]
+
+    def _initial_state(self, samples):
+        return np.zeros((self._taps.size - 1, samples.shape[1]))
+
+    def _filter_block(self, samples, state):
+        method = self.method
+        if method == 'auto':
+            method = 'fft' if self._taps.size > _fftTaps else 'direct'
+        if method == 'direct':
+            return ss.lfilter(self._taps, [1], samples, axis=0, zi=state)
+        convolution = self._convolve(samples, self._taps)
+        convolution[:state.shape[0]] += state
+        numSamples = samples.shape[0]
+        return convolution[:numSamples], \
+            convolution[numSamples:numSamples + state.shape[0]]
+
+    def _steady_pass(self, samples):
+        """
+        Causal filtering starting in the steady state of the first sample,
+        as if it had been the input forever: by FFT convolution, with
+        taps - 1 copies of it before the samples.
+        """
+        delay = self._taps.size - 1
+        extended = np.concatenate((np.repeat(samples[:1], delay, axis=0),
+                                   samples))
+        return self._convolve(extended, self._taps)[
+                    delay:delay + samples.shape[0]]
+
+    def _zero_phase(self, samples):
+        # as scipy.signal.filtfilt(): odd extension of 3*taps samples at
+        # both ends, forward and backward passes from the steady state
+        padding = 3*self._taps.size
+        if samples.shape[0] <= padding:
+            raise ValueError("The signal must be longer than " + str(padding)
+                             + " samples, 3 times the taps, for zero phase "
+                             + "filtering")
+        extended = np.concatenate((
+            2*samples[:1] - samples[padding:0:-1],
+            samples,
+            2*samples[-1:] - samples[-2:-padding - 2:-1]))
+        filtered = self._steady_pass(extended)
+        filtered = self._steady_pass(filtered[::-1])[::-1]
+        return filtered[padding:padding + samples.shape[0]]
+
+    def response(self, numPoints=512):
+        """
+        Frequency response at numPoints frequencies from 0 to the Nyquist
+        frequency. Returns the frequencies [Hz] and the complex response.
+        """
+        return ss.freqz(self._taps, worN=numPoints, fs=self.samplingRate)
+
+
+#%% Filter design
+
+def butter(order, cutoff, btype='lowpass', samplingRate=None, **kwargs):
+    """
+    Butterworth SOSFilter of the given order and cutoff frequency [Hz], or
+    [low, high] frequencies for 'bandpass' and 'bandstop' btypes.
+
+    >>> highpass = pytta.filters.butter(4, 100, 'highpass', 48000)
+
+    Further keyword arguments are passed to SOSFilter.
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    sos = ss.butter(order, cutoff, btype, fs=samplingRate, output='sos')
+    return SOSFilter(sos, samplingRate, **kwargs)
+
+
+def weighting(kind='A', samplingRate=None, **kwargs):
+    """
+    A, C or Z frequency weighting SOSFilter (IEC 61672-1), see
+    pytta.levels.weighting_sos(). Z weighting passes the samples unchanged.
+
+    >>> aWeighting = pytta.filters.weighting('A', 48000)
+    """
+    from pytta.levels import weighting_sos
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    sos = weighting_sos(kind, samplingRate)
+    if sos is None:
+        sos = np.array([[1., 0, 0, 1, 0, 0]])
+    return SOSFilter(sos, samplingRate, **kwargs)
+
+
+def firwin(numTaps, cutoff, samplingRate=None, method='auto', **kwargs):
+    """
+    Windowed linear phase FIRFilter, by scipy.signal.firwin(), with the
+    cutoff frequencies in Hz.
+
+    >>> lowpass = pytta.filters.firwin(255, 2000, 48000)
+
+    Further keyword arguments (window, pass_zero, ...) are passed to
+    scipy.signal.firwin().
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    taps = ss.firwin(numTaps, cutoff, fs=samplingRate, **kwargs)
+    return FIRFilter(taps, samplingRate, method)
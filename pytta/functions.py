@@ -12,22 +12,31 @@ Functions
     
         >>> pytta.list_devices()
         >>> pytta.read_wav( fileName )
+        >>> pytta.read_wav_blocks( fileName, blockSize )
         >>> pytta.write_wav( fileName, signalObject )
         >>> pytta.merge( signalObj1, signalObj2, ..., signalObjN )
-        >>> pytta.fftconvolve( signalObj1, signalObj2 )
-        >>> pytta.finddelay( signalObj1, signalObj2 )
+        >>> pytta.fft_convolve( signalObj1, signalObj2 )
+        >>> pytta.find_delay( signalObj1, signalObj2 )
         >>> pytta.corrcoef( signalObj1, signalObj2 )
+        >>> pytta.similarity_matrix( signals, references, measure, bands )
+        >>> pytta.band_masks( numSamples, samplingRate, bands )
         >>> pytta.resample( signalObj, newSamplingRate )
         
     For further information, check the function specific documentation.
 """
 
-from scipy.io import wavfile as wf
 import numpy as np
-import sounddevice as sd
-import scipy.signal as ss
-import scipy.fftpack as sfft
+from ._lazy import LazyModule
 from .classes import SignalObj
+from . import fft
+from . import axes
+from . import profiling
+from pytta import default
+
+# loaded on first use, keeping "import pytta" fast and free of audio I/O
+wf = LazyModule('scipy.io.wavfile')
+sd = LazyModule('sounddevice')
+ss = LazyModule('scipy.signal')
 
 def list_devices():
     """
@@ -41,6 +50,7 @@ def list_devices():
     return sd.query_devices()
 
 
+@profiling.instrument('functions.read_wav')
 def read_wav(fileName):
     """
     Reads a wave file into a SignalObj   
@@ -49,6 +59,19 @@ def read_wav(fileName):
     signal = SignalObj(data,'time',samplingRate)
     return signal
 
+def read_wav_blocks(fileName,blockSize=2**16):
+    """
+    Reads a wave file block by block, without loading it to memory. Yields
+    (blockSize x channels) arrays, the last one may be shorter.
+    
+    >>> for block in pytta.read_wav_blocks( fileName ):
+    >>>     stream.process( block )
+    """
+    samplingRate, data = wf.read(fileName,mmap=True)
+    for start in range(0,data.shape[0],blockSize):
+        yield np.array(data[start:start+blockSize])
+
+@profiling.instrument('functions.write_wav')
 def write_wav(fileName,signalIn):
     """
     Writes a SignalObj into a single wave file
@@ -58,6 +81,7 @@ def write_wav(fileName,signalIn):
     return wf.write(fileName,samplingRate,data)
 
 
+@profiling.instrument('functions.merge')
 def merge(signal1,*signalObjects):
     """
     Gather all of the input argument signalObjs into a single
@@ -77,30 +101,41 @@ def merge(signal1,*signalObjects):
     newSignal = SignalObj(mergedSignal,'time',samplingRate)
     return newSignal
 
+@profiling.instrument('functions.fft_convolve')
 def fft_convolve(signal1,signal2):
     """
-    Uses scipy.signal.fftconvolve() to convolve two time domain signals.
+    Convolves two time domain signals, with real FFTs of the default FFT
+    backend, zero padded to a fast transform length. Multichannel signals
+    are convolved column by column (or broadcast against a single channel).
     
     >>> convolution = pytta.fft_convolve(signal1,signal2)
     """
-#    Fs = signal1.Fs
-    conv = ss.fftconvolve(signal1.timeSignal,signal2.timeSignal)
-    signal = SignalObj(conv, 'time', signal1.samplingRate)
+    timeSignal1, timeSignal2 = signal1.timeSignal, signal2.timeSignal
+    numSamples = timeSignal1.shape[0] + timeSignal2.shape[0] - 1
+    nfft = fft.next_fast_len(numSamples)
+    if timeSignal1.ndim != timeSignal2.ndim:
+        # single channel against multichannel: broadcast as a column
+        if timeSignal1.ndim == 1: timeSignal1 = timeSignal1[:,np.newaxis]
+        if timeSignal2.ndim == 1: timeSignal2 = timeSignal2[:,np.newaxis]
+    conv = fft.irfft( fft.rfft(timeSignal1, nfft, axis=0) \
+                     * fft.rfft(timeSignal2, nfft, axis=0), nfft, axis=0 )
+    signal = SignalObj(conv[:numSamples], 'time', signal1.samplingRate)
     return signal
 
+@profiling.instrument('functions.find_delay')
 def find_delay(signal1, signal2):
     """
     Cross Correlation alternative, more efficient fft based method to calculate time shift between two signals.
    
     >>> shift = pytta.find_delay(signal1,signal2)
     """
-    if signal1.N != signal2.N:
+    if signal1.numSamples != signal2.numSamples:
         return print('Signal1 and Signal2 must have the same length')
     else:
         freqSignal1 = signal1.freqSignal
-        freqSignal2 = sfft.fft( np.flipud( signal2.timeSignal ) )
-        convoluted = np.real( sfft.ifft( freqSignal1 * freqSignal2 ) )
-        convShifted = sfft.fftshift( convoluted )
+        freqSignal2 = fft.fft( np.flipud( signal2.timeSignal ), axis=0 )
+        convoluted = np.real( fft.ifft( freqSignal1 * freqSignal2, axis=0 ) )
+        convShifted = np.fft.fftshift( convoluted, axes=0 )
         zeroIndex = int(signal1.numSamples / 2) - 1
         shift = zeroIndex - np.argmax(convShifted)          
     return shift
@@ -108,18 +143,218 @@ def find_delay(signal1, signal2):
 def corr_coef(signal1, signal2):
     """
     Finds the correlation coeficient between two SignalObjs using
-    the numpy.corrcoef() function.
+    the numpy.corrcoef() function. For many channels or signals at once,
+    see pytta.similarity_matrix().
     """
     coef = np.corrcoef(signal1.timeSignal, signal2.timeSignal)
     return coef[0,1]
 
+_similarityMeasures = ('correlation', 'coherence', 'distance')
+
+def _channel_rows(signals):
+    """
+    (rows x samples) matrix with every channel of a SignalObj, SignalSet,
+    (samples x channels) or (measurements x samples x channels) array, or
+    list of them, measurement by measurement; and the rows' calibration
+    factors.
+    """
+    if isinstance(signals, (list, tuple)):
+        parts = [_channel_rows(signal) for signal in signals]
+        if len({rows.shape[1] for rows, calibration in parts}) > 1:
+            raise ValueError("All signals must have the same number of samples")
+        return np.concatenate([rows for rows, calibration in parts]), \
+            np.concatenate([calibration for rows, calibration in parts])
+    timeSignal = np.asarray(getattr(signals,'timeSignal',signals),
+                            dtype='float64')
+    if timeSignal.ndim == 1: timeSignal = timeSignal[:,np.newaxis]
+    if timeSignal.ndim == 2: timeSignal = timeSignal[np.newaxis]
+    if timeSignal.ndim != 3:
+        raise ValueError("Signals must be 1D, 2D (samples x channels) or 3D "
+                         + "(measurements x samples x channels) arrays")
+    numMeasurements, numSamples, numChannels = timeSignal.shape
+    rows = timeSignal.transpose(0,2,1).reshape(-1,numSamples)
+    calibration = np.tile(getattr(signals,'calibration',np.ones(numChannels)),
+                          numMeasurements)
+    return rows, calibration
+
+def _sampling_rate(*signals):
+    for signal in signals:
+        if isinstance(signal, (list, tuple)) and signal:
+            signal = signal[0]
+        if hasattr(signal,'samplingRate'):
+            return signal.samplingRate
+    return default.samplingRate
+
+def band_masks(numSamples, samplingRate, bands):
+    """
+    Boolean masks of the rfft bins of a numSamples signal within each
+    [low, high] band [Hz], to restrict pytta.similarity_matrix() to them.
+    The masks depend only on the signals' length, so they can be calculated
+    once for a whole campaign:
+
+    >>> masks = pytta.band_masks(numSamples, 48000, [(100, 1000), (1000, 8000)])
+
+    Returns a (bins) mask for a single (low, high) pair, or a
+    (bands x bins) array for a list of them.
+    """
+    freqVector = axes.freq_axis(numSamples, samplingRate, 'one')
+    bands = np.asarray(bands, dtype='float64')
+    masks = np.zeros(bands.shape[:-1] + (freqVector.size,), dtype=bool)
+    for band, (low, high) in zip(masks.reshape(-1,freqVector.size),
+                                 bands.reshape(-1,2)):
+        band[freqVector.band(low,high)] = True
+    return masks
+
+def _band_products(values, refValues, weights):
+    """
+    (bands x rows x refs) sums over the bins of values*conj(refValues),
+    weighted by each band's (bands x bins) weights. Each band is a single
+    matmul of the bins it weights, so its cost does not depend on the other
+    bands.
+    """
+    products = []
+    for bandWeights in weights:
+        bins = np.flatnonzero(bandWeights)
+        products.append((values[:,bins]*bandWeights[bins])
+                        @ refValues[:,bins].conj().T)
+    return np.stack(products)
+
+def _levels(spectra, calibration):
+    with np.errstate(divide='ignore'):
+        return 20*np.log10(np.maximum(np.abs(spectra)
+                                      * calibration[:,np.newaxis],
+                                      np.finfo(float).tiny))
+
+@profiling.instrument('functions.similarity_matrix')
+def similarity_matrix(signals, references=None, measure='correlation',
+                      bands=None, samplingRate=None):
+    """
+    Similarity between every channel of signals and every channel of
+    references, all pairs at once by matrix products, e.g. to compare every
+    channel of a set of recordings against reference responses.
+
+    >>> corr = pytta.similarity_matrix(recordings)          # channels x channels
+    >>> dist = pytta.similarity_matrix(recordings, references, 'distance',
+    >>>                                bands=[(100, 1000), (1000, 8000)])
+
+    Parameters:
+    -----------
+
+        - signals: SignalObj, SignalSet, array or list of them, all with the
+                    same number of samples. Each channel of each measurement
+                    is a row of the matrix: row = measurement*numChannels +
+                    channel, the signals of a list one after the other;
+        - references: the same, for the columns, defaults to signals;
+        - measure: 'correlation' (Pearson correlation coefficient, as
+                    numpy.corrcoef()), 'coherence' (squared magnitude of the
+                    complex correlation of the analytic signals, which is
+                    not affected by polarity or constant phase shifts) or
+                    'distance' (RMS difference of the calibrated magnitude
+                    spectra [dB]);
+        - bands: [low, high] band [Hz] or list of bands, or boolean masks
+                    of the rfft bins, from pytta.band_masks(), to restrict
+                    the measure to the bins within them;
+        - samplingRate: to convert the bands to masks, defaults to the
+                    signals' sampling rate.
+
+    Returns a (rows x refs) matrix, or a (bands x rows x refs) array for a
+    list of bands. Channels with no energy within a band give nan
+    correlations and coherences.
+    """
+    if measure not in _similarityMeasures:
+        raise ValueError("Unknown measure " + repr(measure) + ", use "
+                         + ", ".join(repr(m) for m in _similarityMeasures))
+    rows, calibration = _channel_rows(signals)
+    if references is None:
+        refRows, refCalibration = rows, calibration
+    else:
+        refRows, refCalibration = _channel_rows(references)
+        if refRows.shape[1] != rows.shape[1]:
+            raise ValueError("Signals and references must have the same "
+                             + "number of samples")
+    numSamples = rows.shape[1]
+    if measure == 'correlation' and bands is None:
+        # broadband Pearson correlation, straight from the samples
+        def normalized(x):
+            x = x - x.mean(axis=1,keepdims=True)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return x / np.linalg.norm(x,axis=1,keepdims=True)
+        rows = normalized(rows)
+        refRows = rows if references is None else normalized(refRows)
+        return rows @ refRows.T
+    numBins = numSamples//2 + 1
+    if bands is None:
+        masks = np.ones(numBins, dtype=bool)
+    elif np.asarray(bands).dtype == bool:
+        masks = np.asarray(bands)
+    else:
+        if samplingRate is None:
+            samplingRate = _sampling_rate(signals, references)
+        masks = band_masks(numSamples, samplingRate, bands)
+    squeeze = masks.ndim == 1
+    masks = np.atleast_2d(masks)
+    if masks.ndim != 2 or masks.shape[1] != numBins:
+        raise ValueError("Band masks must have " + str(numBins)
+                         + " bins, numSamples//2 + 1")
+    # only the bins within some band are transformed into the products
+    used = np.flatnonzero(masks.any(axis=0))
+    masks = masks[:,used].astype('float64')
+    spectra = fft.rfft(rows, axis=1)[:,used]
+    refSpectra = spectra if refRows is rows \
+        else fft.rfft(refRows,axis=1)[:,used]
+    if measure == 'distance':
+        levels = _levels(spectra, calibration)
+        refLevels = levels if refSpectra is spectra \
+            else _levels(refSpectra, refCalibration)
+        # a common offset per bin does not change the differences, and
+        # keeps the expanded squares small, against cancellation
+        offset = levels.mean(axis=0)
+        levels = levels - offset
+        refLevels = levels if refSpectra is spectra else refLevels - offset
+        counts = masks.sum(axis=1)[:,np.newaxis,np.newaxis]
+        squares = (levels**2 @ masks.T).T[:,:,np.newaxis]
+        refSquares = (refLevels**2 @ masks.T).T[:,np.newaxis,:]
+        cross = _band_products(levels, refLevels, masks)
+        result = np.sqrt(np.maximum(squares + refSquares - 2*cross, 0)
+                         / counts)
+    else:
+        if measure == 'correlation':
+            # one-sided bins stand for their negative frequency pairs, and
+            # the mean is removed
+            weights = np.full(numBins, 2.)
+            weights[0] = 0
+        else:
+            # analytic signals: doubled positive frequencies, no negative
+            weights = np.full(numBins, 4.)
+            weights[0] = 1
+        if numSamples % 2 == 0: weights[-1] = 1
+        weights = masks * weights[used]
+        power = (np.abs(spectra)**2 @ weights.T).T[:,:,np.newaxis]
+        refPower = (np.abs(refSpectra)**2 @ weights.T).T[:,np.newaxis,:]
+        if measure == 'correlation':
+            # real part only: real and imaginary parts as real columns
+            # halve the products
+            cross = _band_products(
+                        np.ascontiguousarray(spectra).view('float64'),
+                        np.ascontiguousarray(refSpectra).view('float64'),
+                        np.repeat(weights,2,axis=1))
+        else:
+            cross = _band_products(spectra, refSpectra, weights)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if measure == 'correlation':
+                result = cross / np.sqrt(power*refPower)
+            else:
+                result = np.abs(cross)**2 / (power*refPower)
+    return result[0] if squeeze else result
+
 
+@profiling.instrument('functions.resample')
 def resample(signal,newSamplingRate):
     """
         Resample the timeSignal of the input SignalObj to the
         given sample rate using the scipy.signal.resample() function
     """
-    newSignalSize = np.int(signal.timeLength*newSamplingRate)
+    newSignalSize = int(signal.timeLength*newSamplingRate)
     resampled = ss.resample(signal.timeSignal[:], newSignalSize)
     newSignal = SignalObj(resampled,"time",newSamplingRate)
     return newSignal
\ No newline at end of file
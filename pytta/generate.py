@@ -31,12 +31,33 @@ Generate
 """
 
 #%%
-from .classes import SignalObj, RecMeasure, FRFMeasure, PlayRecMeasure
+from .classes import SignalObj, RecMeasure, FRFMeasure, PlayRecMeasure, MIMOMeasure, SteppedSineMeasure
 from pytta import default
-from scipy import signal
+from pytta import fft
+from pytta import profiling
+from pytta._lazy import LazyModule
 import numpy as np
 
+signal = LazyModule('scipy.signal') # loaded on first use
 
+_measurementOptions = ('calibration', 'unit', 'onXrun', 'maxRetries',
+                       'compensateLatency', 'loopbackChannels')
+""" Measurement keyword arguments, not passed to the excitation generators """
+
+_playbackOptions = ('compensateLatency', 'loopbackChannels')
+""" Measurement options of the kinds with playback only """
+
+_sweepMethods = {'logarithmic': 'logarithmic', 'log': 'logarithmic',
+                 'exponential': 'logarithmic', 'linear': 'linear',
+                 'lin': 'linear', 'synchronized': 'synchronized',
+                 'novak': 'synchronized'}
+""" Sweep method names and aliases """
+
+_chunkSize = 2**16
+""" [samples] sweep samples calculated at once, bounding the temporary arrays """
+
+
+@profiling.instrument('generate.sweep')
 def sweep(freqMin = None,
           freqMax = None,
           samplingRate = None,
@@ -44,7 +65,8 @@ def sweep(freqMin = None,
           startMargin = None,
           stopMargin = None,
           method = 'logarithmic',
-          windowing = 'hann'):
+          windowing = 'hann',
+          dtype = 'float64'):
     """
    Generates a chirp signal defined by the "method" input, windowed, with
    silence interval at the beggining and end of the signal, plus a hanning
@@ -63,6 +85,22 @@ def sweep(freqMin = None,
    are used for each fade, so the number of time samples during each frequency
    is respected.
 
+   The method may be:
+
+       - 'logarithmic': exponential sweep, same time for every octave;
+       - 'linear': same time for every Hz;
+       - 'synchronized': exponential sweep whose rate is rounded so its
+               harmonic distortion responses are in phase with the linear
+               one (Novak et al., 2015), so they can be separated and
+               compared after the deconvolution. As the rate is rounded
+               down, it may end before the stopMargin, which gets the
+               remaining samples.
+
+   The samples are calculated from the analytic phase, a block at a time,
+   directly into the output array, and the fade limits from the analytic
+   instantaneous frequency, so long sweeps (fftDegree 22 and over) need a
+   single signal sized array. dtype='float32' halves it.
+
     """
     if freqMin is None: freqMin = default.freqMin
     if freqMax is None: freqMax = default.freqMax
@@ -70,51 +108,63 @@ def sweep(freqMin = None,
     if fftDegree is None: fftDegree = default.fftDegree
     if startMargin is None: startMargin = default.startMargin
     if stopMargin is None: stopMargin = default.stopMargin
+    method = _sweepMethods.get(method, method)
+    if method not in _sweepMethods.values():
+        raise ValueError("Unknown sweep method " + repr(method) + ", use "
+                         + "'logarithmic', 'linear' or 'synchronized'")
     
     freqLimits = np.array( [ freqMin / ( 2**(1/6) ), \
                            min( freqMax*( 2**(1/6) ), \
                                    samplingRate/2 )
                            ] ) # frequency limits [Hz]
-    samplingTime = 1/samplingRate # [s] sampling period
     
     stopSamples = stopMargin*samplingRate 
-    # [samples] initial silence number of samples
-    
-    startSamples = startMargin*samplingRate
     # [samples] ending silence number of samples
     
-    marginSamples = startSamples + stopSamples
-    # [samples] total silence number of samples
+    startSamples = int(startMargin*samplingRate)
+    # [samples] initial silence number of samples
     
-    numSamples = 2**fftDegree # [samples] full signal number of samples
+    numSamples = int(2**fftDegree) # [samples] full signal number of samples
     
-    sweepSamples = numSamples - marginSamples +1
+    sweepTime = (numSamples - startMargin*samplingRate - stopSamples + 1) \
+                    / samplingRate # [s] sweep's time length
+    sweepSamples = int(round(sweepTime*samplingRate, 6))
     # [samples] actual sweep number of samples
     
-    sweepTime = sweepSamples/samplingRate # [s] sweep's time length
-    timeVecSweep = np.arange(0, sweepTime, samplingTime) # [s] sweep time vector
-    if timeVecSweep.size > sweepSamples:
-        timeVecSweep = timeVecSweep[0:int(sweepSamples)] # adjust length
-    sweep = 0.8*signal.chirp(timeVecSweep, \
-                             freqLimits[0],\
-                             sweepTime, \
-                             freqLimits[1],\
-                              'logarithmic', \
-                              phi=-90) # sweep, time domain
-    sweep = __do_sweep_windowing(sweep, \
-                                 timeVecSweep, \
-                                 freqLimits, \
-                                 freqMin, \
-                                 freqMax, \
-                                 windowing) # fade in and fade out
-    timeSignal = np.concatenate( ( np.zeros( \
-                                   int(startSamples) ), \
-                                   sweep, \
-                                   np.zeros( \
-                                   int(stopSamples) 
-                                   ) ) ) # add initial and ending sileces
-    if timeSignal.size != numSamples:
-        timeSignal = timeSignal[0:int(numSamples)] # adjust length
+    if sweepSamples <= 0:
+        raise ValueError("The start and stop margins are longer than the "
+                         + "2**fftDegree samples, there is no room for the "
+                         + "sweep")
+    
+    if method == 'synchronized':
+        # rate rounded to a whole number of the start frequency's periods
+        rate = np.floor(freqLimits[0]*sweepTime
+                        / np.log(freqLimits[1]/freqLimits[0])) / freqLimits[0]
+        if rate <= 0:
+            raise ValueError("The sweep is too short to be synchronized")
+        sweepTime = rate*np.log(freqLimits[1]/freqLimits[0])
+        sweepSamples = min(sweepSamples,
+                           int(np.ceil(round(sweepTime*samplingRate, 6))))
+    
+    timeSignal = np.zeros(numSamples, dtype=dtype)
+    sweepSignal = timeSignal[startSamples:startSamples + sweepSamples]
+    # view of the sweep samples, between the initial and ending silences
+    
+    for start in range(0, sweepSignal.size, _chunkSize):
+        stop = min(start + _chunkSize, sweepSignal.size)
+        timeVecSweep = np.arange(start, stop) / samplingRate # [s]
+        sweepSignal[start:stop] = 0.8*np.sin(_sweep_phase(timeVecSweep,
+                                                          freqLimits,
+                                                          sweepTime,
+                                                          method))
+    if windowing is not None:
+        __do_sweep_windowing(sweepSignal, \
+                             sweepSamples, \
+                             freqLimits, \
+                             freqMin, \
+                             freqMax, \
+                             method, \
+                             windowing) # fade in and fade out
     
     sweepSignal = SignalObj(timeSignal,'time',samplingRate) 
     # transforms into a pytta signalObj
@@ -124,45 +174,73 @@ def sweep(freqMin = None,
     # pass on the frequency limits considering the fade in and fade out
     return sweepSignal
 
+
+def _sweep_phase(time, freqLimits, sweepTime, method):
+    """
+    Analytic phase [rad] of the sweep at the time instants, for a sine
+    starting at freqLimits[0] and reaching freqLimits[1] at sweepTime.
+    """
+    if method == 'linear':
+        return 2*np.pi*(freqLimits[0]*time
+                        + 0.5*(freqLimits[1] - freqLimits[0])
+                        / sweepTime*time**2)
+    rate = sweepTime/np.log(freqLimits[1]/freqLimits[0])
+    return 2*np.pi*rate*freqLimits[0]*np.expm1(time/rate)
+
+
+def _sweep_fraction(freq, freqLimits, method):
+    """
+    Fraction of the sweep length at which the instantaneous frequency is
+    freq.
+    """
+    if method == 'linear':
+        return (freq - freqLimits[0])/(freqLimits[1] - freqLimits[0])
+    return np.log(freq/freqLimits[0])/np.log(freqLimits[1]/freqLimits[0])
+
+@profiling.instrument('generate.sweep_windowing')
 def __do_sweep_windowing(inputSweep,
-                        timeVecSweep,
+                        sweepSamples,
                         freqLimits,
                         freqMin,
                         freqMax,
+                        method,
                         window):
     """
-    Applies a fade in and fade out that are minimum at the chirp start and end,
-    and maximum between the time intervals corresponding to Finf and Fsup.
+    Applies, in place, a fade in and fade out that are minimum at the chirp
+    start and end, and maximum between the time intervals corresponding to
+    Finf and Fsup. The samples where the chirp reaches them are calculated
+    from its instantaneous frequency, without scanning the signal.
     
     """
+    if window != 'hann':
+        raise ValueError("Unknown sweep windowing " + repr(window)
+                         + ", use 'hann' or None")
+    lastSample = sweepSamples - 1
+    freqMinSample = int(np.clip(np.floor(lastSample*_sweep_fraction(
+                                            freqMin, freqLimits, method)
+                                         + 1e-9), 0, lastSample))
+    # last sample where the chirp is below freqMin [Hz]
+    freqMaxSample = sweepSamples - int(np.clip(np.floor(
+                                            lastSample*_sweep_fraction(
+                                                freqMax, freqLimits, method)
+                                            + 1e-9), 0, lastSample))
+    # samples from the one where the chirp reaches freqMax [Hz] to the end
     
-    freqSweep = freqLimits[0]*( ( freqLimits[1] \
-                          / freqLimits[0] ) \
-                        **( 1/max(timeVecSweep) ) ) \
-                        **timeVecSweep # frequencies at time instants: freq(t)
-    freqMinSample = np.where(freqSweep<=freqMin) # exact sample where the chirp
-                                              # reaches freqMin [Hz]
-    freqMinSample = freqMinSample[-1][-1]
-
-    freqMaxSample = np.where(freqSweep<=freqMax) # exact sample where the chirp
-                                                # reaches freqMax [Hz]
-    freqMaxSample = len(freqSweep) - freqMaxSample[-1][-1]
-    windowStart = signal.hann(2*freqMinSample)
-    windowEnd = signal.hann(2*freqMaxSample)
-    
-    # Uses first half of windowStart, last half of windowEnd, and a vector of 
-    # ones with the remaining length, in between the half windows
-    fullWindow = np.concatenate((windowStart[0:freqMinSample], \
-                          np.ones( int( len(freqSweep) \
-                                       - freqMinSample \
-                                       - freqMaxSample \
-                                       + 1) ), \
-                          windowEnd[freqMaxSample:-1] ) )
-    newSweep = fullWindow * inputSweep
-    return newSweep
+    # first half of a 2*freqMinSample Hann window, and the last half of a
+    # 2*freqMaxSample one, without its last point, ones in between
+    fadeIn = np.arange(min(freqMinSample, inputSweep.size))
+    inputSweep[:fadeIn.size] *= 0.5 - 0.5*np.cos(2*np.pi*fadeIn
+                                                 / max(2*freqMinSample - 1, 1))
+    fadeOut = np.arange(freqMaxSample, 2*freqMaxSample - 1)
+    fadeStart = sweepSamples - fadeOut.size
+    fadeOut = fadeOut[:max(inputSweep.size - fadeStart, 0)]
+    inputSweep[fadeStart:fadeStart + fadeOut.size] *= \
+        0.5 - 0.5*np.cos(2*np.pi*fadeOut/max(2*freqMaxSample - 1, 1))
+    return inputSweep
  
     
  
+@profiling.instrument('generate.noise')
 def noise(kind = 'white',
           samplingRate = None,
           fftDegree = None,
@@ -211,12 +289,13 @@ def noise(kind = 'white',
 
     noiseSignal = __do_noise_windowing( noiseSignal, noiseSamples, windowing )
     noiseSignal = noiseSignal / max( abs( noiseSignal ) )
-    fullSignal = np.concatenate( ( np.zeros( startSamples ), \
+    fullSignal = np.concatenate( ( np.zeros( int(startSamples) ), \
                               noiseSignal, \
-                              np.zeros( stopSamples ) ) )
+                              np.zeros( int(stopSamples) ) ) )
     fullSignal = SignalObj( fullSignal, 'time', samplingRate )
     return fullSignal
 
+@profiling.instrument('generate.noise_windowing')
 def __do_noise_windowing(inputNoise,
                         noiseSamples,
                         window):
@@ -232,6 +311,7 @@ def __do_noise_windowing(inputNoise,
 
 
 
+@profiling.instrument('generate.impulse')
 def impulse(samplingRate = None,
 			fftDegree = None):
     """
@@ -244,7 +324,7 @@ def impulse(samplingRate = None,
     numSamples = 2**fftDegree
     impulseSignal = (numSamples / samplingRate) \
                     * np.ones(numSamples) + 1j * np.random.randn(numSamples)
-    impulseSignal = np.real( np.fft.ifft( impulseSignal ) )
+    impulseSignal = np.real( fft.ifft( impulseSignal ) )
     impulseSignal = impulseSignal / max( impulseSignal )
     newImpulse = SignalObj( impulseSignal, 'time', samplingRate )
     return newImpulse
@@ -286,6 +366,8 @@ def measurement(kind = 'playrec',
 	>>> msRec = pytta.generate.measurement(kind='rec')
 	>>> msPlayRec = pytta.generate.measurement(kind='playrec')
 	>>> msFRF = pytta.generate.measurement(kind='frf')
+	>>> msMIMO = pytta.generate.measurement(kind='mimo')
+	>>> msStepped = pytta.generate.measurement(kind='steppedsine')
 	
 	The input arguments may be different for each measurement kind.
 	
@@ -322,13 +404,55 @@ def measurement(kind = 'playrec',
 							for M channels it is mandatory for the
 							excitation signal to have M columns in the 
 							timeSignal parameter.
-			- comment: any commentary about the recording.
+			- comment: any commentary about the recording;
+			- compensateLatency: removes the interface round trip latency
+						from the recordings;
+			- loopbackChannels: (inChannel, outChannel) pair used to
+						measure the latency.
 
 
 		Options for (kind='frf'):
 		-------------------------
 
-			Same as for (kind='playrec')
+			Same as for (kind='playrec'), plus:
+			
+			- estimator: 'deterministic' (default) divides the recording by
+						the excitation; 'H1', 'H2' or 'Hv' average the
+						spectra of noise excitation. If no excitation is
+						given, these use pytta.generate.noise() instead of
+						a sweep;
+			- nperseg: frame length, in samples, of the averaged estimators.
+
+
+		Options for (kind='mimo'):
+		-------------------------
+
+			Same as for (kind='playrec'), with the excitation being the
+			single channel exponential sweep played by every output, plus:
+
+			- irLength: [s] length of each separated impulse response;
+			- harmonics: highest harmonic distortion order kept out of the
+						impulse response windows;
+			- shift: [samples] delay between the sweeps of consecutive
+						outputs, calculated from irLength and harmonics
+						if not given.
+
+
+		Options for (kind='steppedsine'):
+		-------------------------
+
+			Same as for (kind='playrec'), without excitation, plus:
+
+			- frequencies: [Hz] step frequencies, defaulting to
+						stepsPerOctave steps from freqMin to freqMax;
+			- stepsPerOctave: steps per octave of the default frequencies;
+			- amplitude: [FS] peak amplitude of the tones;
+			- harmonics: number of detected components, the fundamental
+						and its harmonics up to this order;
+			- integration: [s] minimum detection time of each step;
+			- minCycles: minimum number of periods detected in each step;
+			- settle: [s] time before the detection of each step;
+			- fade: [s] fade in and out of each tone.
     """
 #%% Default Parameters
     if freqMin is None: freqMin = default.freqMin
@@ -337,15 +461,22 @@ def measurement(kind = 'playrec',
     if device is None: device = default.device
     if inChannel is None: inChannel = default.inChannel
     if outChannel is None: outChannel = default.outChannel
+    options = {key: kwargs.pop(key) for key in _measurementOptions
+               if key in kwargs}
 
 #%% Kind REC
     if kind in ['rec','record','recording','r']:
+        for key in _playbackOptions:
+            if key in options:
+                raise ValueError("The '" + key + "' option needs a playback, "
+                                 + "it is not available for kind='rec'")
         recordObj = RecMeasure(samplingRate = samplingRate,
                             freqMin = freqMin,
                             freqMax = freqMax,
                             device = device,
                             inChannel = inChannel,
                             **kwargs,
+                            **options,
                             )
         if ('domain' in kwargs) or args:
             if kwargs.get('domain') == 'time' or args[0]=='time':
@@ -380,15 +511,21 @@ def measurement(kind = 'playrec',
                                device = device,
                                inChannel = inChannel,
                                outChannel = outChannel,
-                               **kwargs
+                               **kwargs,
+                               **options
                                )
         return playRecObj
 	
 #%% Kind FRF    
     elif kind in ['tf','frf','transferfunction','freqresponse']:
+        estimator = kwargs.pop('estimator', 'deterministic')
+        nperseg = kwargs.pop('nperseg', 4096)
         if ('excitation' in kwargs) or args:
             signalIn = kwargs.get('excitation') or args[0]
             kwargs.pop('excitation', None)
+        elif estimator != 'deterministic':
+            signalIn = noise(samplingRate = samplingRate,
+                             **kwargs)
         else:
             signalIn = sweep(samplingRate = samplingRate,
                              freqMin = freqMin,
@@ -399,7 +536,57 @@ def measurement(kind = 'playrec',
                             device = device,
                             inChannel = inChannel,
                             outChannel = outChannel,
-                            **kwargs
+                            estimator = estimator,
+                            nperseg = nperseg,
+                            **kwargs,
+                            **options
                             )
         return frfObj
 
+#%% Kind MIMO
+    elif kind in ['mimo','mes','transfermatrix']:
+        mimoOptions = {key: kwargs.pop(key) for key in ('irLength',
+                                                        'harmonics',
+                                                        'shift',
+                                                        'regularization')
+                       if key in kwargs}
+        if ('excitation' in kwargs) or args:
+            signalIn = kwargs.get('excitation') or args[0]
+            kwargs.pop('excitation', None)
+        else:
+            signalIn = sweep(samplingRate = samplingRate,
+                             freqMin = freqMin,
+                             freqMax = freqMax,
+                             **kwargs)
+
+        mimoObj = MIMOMeasure(sweep = signalIn,
+                              device = device,
+                              inChannel = inChannel,
+                              outChannel = outChannel,
+                              **mimoOptions,
+                              **options
+                              )
+        return mimoObj
+
+#%% Kind STEPPED SINE
+    elif kind in ['steppedsine','stepped','sine']:
+        steppedOptions = {key: kwargs.pop(key) for key in ('frequencies',
+                                                           'stepsPerOctave',
+                                                           'amplitude',
+                                                           'harmonics',
+                                                           'integration',
+                                                           'minCycles',
+                                                           'settle',
+                                                           'fade')
+                          if key in kwargs}
+        steppedObj = SteppedSineMeasure(samplingRate = samplingRate,
+                                        freqMin = freqMin,
+                                        freqMax = freqMax,
+                                        device = device,
+                                        inChannel = inChannel,
+                                        outChannel = outChannel,
+                                        **steppedOptions,
+                                        **kwargs,
+                                        **options
+                                        )
+        return steppedObj
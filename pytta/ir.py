@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+IR
+===
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule post-processes measured impulse responses: finds their
+    onset (ISO 3382-1) and the point where the decay meets the background
+    noise (Lundeby et al., 1995), and truncates them to the useful part,
+    with fade in and fade out windows. A FRFMeasure transferfunction of
+    2**18 samples usually comes down to a few thousand samples:
+
+        >>> H = frf.run()
+        >>> h = pytta.ir.truncate(H)
+        >>> h.numSamples
+
+    The Lundeby iteration runs for all channels, and octave or third octave
+    bands, at once: the energy envelopes are taken from a single cumulative
+    sum of the squared impulse responses, so averaging intervals of
+    different lengths for each channel and band cost the same.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.ir.onset( ir, threshold )
+        >>> pytta.ir.lundeby( ir, samplingRate, bands )
+        >>> pytta.ir.band_filter( ir, samplingRate, centers, fraction )
+        >>> pytta.ir.truncate( ir, samplingRate )
+
+    For further information, check the function specific documentation.
+"""
+
+import numpy as np
+from pytta import default
+from pytta import profiling
+from pytta._lazy import LazyModule
+
+ss = LazyModule('scipy.signal') # loaded on first use
+
+
+_octaveCenters = (31.5, 63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+""" Nominal octave band center frequencies [Hz] """
+
+
+def _columns(ir):
+    """ Time samples of a SignalObj or array as (samples x columns) """
+    ir = np.asarray(getattr(ir, 'timeSignal', ir), dtype='float64')
+    if ir.ndim == 1:
+        ir = ir[:, np.newaxis]
+    return ir
+
+
+def _sampling_rate(ir, samplingRate):
+    if samplingRate is None:
+        samplingRate = getattr(ir, 'samplingRate', None) \
+            or default.samplingRate
+    return samplingRate
+
+
+@profiling.instrument('ir.onset')
+def onset(ir, threshold=-20):
+    """
+    Index of the first sample of each channel whose energy is above the
+    channel's peak energy plus threshold [dB], the ISO 3382-1 start of the
+    impulse response.
+
+    >>> start = pytta.ir.onset(transferfunction)
+    """
+    energy = _columns(ir)**2
+    limit = np.max(energy, axis=0) * 10**(threshold/10)
+    return np.argmax(energy >= limit, axis=0)
+
+
+@profiling.instrument('ir.band_filter')
+def band_filter(ir, samplingRate=None, centers=None, fraction=1, order=4):
+    """
+    Filters every channel by fractional octave bandpass filters, zero phase.
+
+    >>> bands = pytta.ir.band_filter(h, 44100, fraction=3)
+
+    Returns a (samples x bands x channels) array, and the band centers.
+    Bands whose upper edge is above the Nyquist frequency are left out.
+    """
+    samplingRate = _sampling_rate(ir, samplingRate)
+    ir = _columns(ir)
+    if centers is None:
+        if fraction == 1:
+            centers = _octaveCenters
+        else:
+            exact = 1000 * 2**(np.arange(-15, 15)/fraction)
+            centers = exact[(exact > 20) & (exact < 20000)]
+    factor = 2**(1/(2*fraction))
+    centers = np.array([center for center in centers
+                        if center*factor < samplingRate/2])
+    filtered = np.empty((ir.shape[0], centers.size, ir.shape[1]))
+    for idx, center in enumerate(centers):
+        sos = ss.butter(order, [center/factor, center*factor], 'bandpass',
+                        fs=samplingRate, output='sos')
+        filtered[:, idx, :] = ss.sosfiltfilt(sos, ir, axis=0)
+    return filtered, centers
+
+
+def _envelope(cumulative, centers, widths):
+    """
+    Mean energy of each column around the grid centers, over windows of
+    widths[column] samples, from the cumulative sum of the energy.
+    """
+    numSamples = cumulative.shape[0] - 1
+    half = np.maximum(widths, 1)[np.newaxis, :] / 2
+    low = np.clip(np.rint(centers[:, np.newaxis] - half), 0,
+                  numSamples - 1).astype(int)
+    high = np.clip(np.rint(centers[:, np.newaxis] + half), 1,
+                   numSamples).astype(int)
+    high = np.maximum(high, low + 1)
+    energy = np.take_along_axis(cumulative, high, axis=0) \
+        - np.take_along_axis(cumulative, low, axis=0)
+    return energy / (high - low)
+
+
+def _tail_mean(cumulative, start):
+    """ Mean energy of each column from start[column] to the end """
+    numSamples = cumulative.shape[0] - 1
+    start = np.clip(np.rint(start), 0, numSamples - 1).astype(int)
+    total = cumulative[-1] - np.take_along_axis(cumulative,
+                                                start[np.newaxis, :],
+                                                axis=0)[0]
+    return total / (numSamples - start)
+
+
+def _regression(x, y, mask):
+    """
+    Least squares line y = slope*x + intercept of each column, using only
+    the masked points. Columns with less than two points get nan.
+    """
+    count = np.sum(mask, axis=0)
+    xm = np.where(mask, x[:, np.newaxis], 0)
+    ym = np.where(mask, y, 0)
+    sx, sy = np.sum(xm, axis=0), np.sum(ym, axis=0)
+    sxx, sxy = np.sum(xm**2, axis=0), np.sum(xm*ym, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (count*sxy - sx*sy) / (count*sxx - sx**2)
+        intercept = (sy - slope*sx) / count
+    return slope, intercept
+
+
+def _lundeby_columns(ir, samplingRate, intervalsPer10dB, maxIterations,
+                     gridPoints):
+    numSamples, numColumns = ir.shape
+    energy = ir**2
+    peak = np.max(energy, axis=0)
+    peak[peak == 0] = 1
+    energy = energy / peak # 0 dB peak in every column
+    cumulative = np.concatenate((np.zeros((1, numColumns)),
+                                 np.cumsum(energy, axis=0)), axis=0)
+    peakIdx = np.argmax(energy, axis=0)
+    step = max(1, numSamples // gridPoints)
+    centers = np.arange(step/2, numSamples, step)
+    toDB = lambda value: 10*np.log10(np.maximum(value, 1e-30))
+    # 1. envelope with 10 ms intervals, noise from the last 10 %
+    widths = np.full(numColumns, max(1, int(0.01*samplingRate)))
+    envelope = toDB(_envelope(cumulative, centers, widths))
+    noise = toDB(_tail_mean(cumulative,
+                            np.full(numColumns, 0.9*numSamples)))
+    afterPeak = centers[:, np.newaxis] >= peakIdx[np.newaxis, :]
+    # 2. first regression, from the peak to 10 dB above the noise
+    aboveNoise = np.cumprod((envelope > noise + 10) | ~afterPeak,
+                           axis=0).astype(bool)
+    slope, intercept = _regression(centers, envelope,
+                                   afterPeak & aboveNoise)
+    crosspoint = (noise - intercept) / slope
+    for iteration in range(maxIterations):
+        valid = np.isfinite(slope) & (slope < 0)
+        if not np.any(valid):
+            break
+        # 3. intervals of 1/intervalsPer10dB of a 10 dB decay
+        widths = np.where(valid, -10 / (slope*intervalsPer10dB), widths)
+        widths = np.clip(widths, 1, numSamples)
+        envelope = toDB(_envelope(cumulative, centers, widths))
+        # 4. noise from 5 dB of decay past the crosspoint, or from the last
+        # 10 % of the impulse response
+        noiseStart = np.where(valid, crosspoint - 5/slope, 0.9*numSamples)
+        noiseStart = np.minimum(np.nan_to_num(noiseStart,
+                                              nan=0.9*numSamples),
+                                0.9*numSamples)
+        noise = toDB(_tail_mean(cumulative, noiseStart))
+        # 5. late decay regression, over 20 dB ending 5 dB above the noise
+        fitRange = (envelope > noise + 5) & (envelope < noise + 25)
+        aboveNoise = np.cumprod((envelope > noise + 5) | ~afterPeak,
+                               axis=0).astype(bool)
+        newSlope, newIntercept = _regression(centers, envelope,
+                                             afterPeak & fitRange
+                                             & aboveNoise)
+        update = np.isfinite(newSlope) & (newSlope < 0)
+        slope = np.where(update, newSlope, slope)
+        intercept = np.where(update, newIntercept, intercept)
+        newCrosspoint = (noise - intercept) / slope
+        converged = np.abs(newCrosspoint - crosspoint) < widths
+        crosspoint = newCrosspoint
+        if np.all(converged | ~update):
+            break
+    # no decay found, the whole impulse response is kept
+    crosspoint = np.where(np.isfinite(crosspoint) & (slope < 0),
+                          crosspoint, numSamples)
+    crosspoint = np.clip(np.rint(crosspoint), 1, numSamples).astype(int)
+    return crosspoint, noise, slope*samplingRate
+
+
+@profiling.instrument('ir.lundeby')
+def lundeby(ir, samplingRate=None, bands=None, fraction=1,
+            intervalsPer10dB=5, maxIterations=10, gridPoints=4000):
+    """
+    Truncation point of each channel, where the energy decay meets the
+    background noise, by Lundeby's iterative method.
+
+    >>> crosspoint, noise, decay = pytta.ir.lundeby(h)
+    >>> crosspoint, noise, decay = pytta.ir.lundeby(h, bands='octave')
+
+    Parameters:
+    -----------
+
+        - bands: None, for the broadband impulse responses, 'octave',
+                    'third' or a list of band centers [Hz], each channel
+                    is then filtered by band_filter();
+        - intervalsPer10dB: number of averaging intervals in a 10 dB decay;
+        - maxIterations: limit of the iterations, which usually converge
+                    in 3 to 5;
+        - gridPoints: number of envelope points fitted, at most.
+
+    Returns the crosspoint [samples], the noise level [dB re peak] and the
+    decay rate [dB/s] of each channel, or (bands x channels) arrays if
+    bands are given.
+    """
+    samplingRate = _sampling_rate(ir, samplingRate)
+    columns = _columns(ir)
+    if bands is None:
+        return _lundeby_columns(columns, samplingRate, intervalsPer10dB,
+                                maxIterations, gridPoints)
+    if isinstance(bands, str):
+        fraction = {'octave': 1, 'third': 3}[bands]
+        bands = None
+    filtered, centers = band_filter(columns, samplingRate, bands, fraction)
+    numBands, numChannels = filtered.shape[1:]
+    results = _lundeby_columns(filtered.reshape(filtered.shape[0], -1),
+                               samplingRate, intervalsPer10dB,
+                               maxIterations, gridPoints)
+    return tuple(result.reshape(numBands, numChannels) for result in results)
+
+
+@profiling.instrument('ir.truncate')
+def truncate(ir, samplingRate=None, onsetThreshold=-20, preOnset=0.001,
+             fadeOut=0.1, **kwargs):
+    """
+    Cuts the impulse responses to their useful part: from preOnset seconds
+    before the earliest onset, to the latest Lundeby crosspoint among the
+    channels. Each channel fades in over the preOnset samples and fades out
+    with a half Hann window ending at its own crosspoint, over fadeOut of
+    its decay length, so the noise tail is removed.
+
+    >>> h = pytta.ir.truncate(frf.transferfunction)
+
+    The input may be a SignalObj, e.g. a FRFMeasure transferfunction, or a
+    (samples x channels) array. Further keyword arguments go to lundeby();
+    with bands, each channel is cut and faded at its latest band
+    crosspoint, so no band's decay is cut short:
+
+    >>> h = pytta.ir.truncate(frf.transferfunction, bands='octave')
+
+    Returns a time domain SignalObj, with the input's calibration and
+    units, and the start sample in its comment.
+    """
+    from pytta.classes import SignalObj
+    samplingRate = _sampling_rate(ir, samplingRate)
+    columns = _columns(ir)
+    numSamples = columns.shape[0]
+    onsets = onset(columns, onsetThreshold)
+    preSamples = int(round(preOnset*samplingRate))
+    start = max(int(np.min(onsets)) - preSamples, 0)
+    crosspoint, noise, decay = lundeby(columns, samplingRate, **kwargs)
+    if crosspoint.ndim == 2:
+        # (bands x channels): the longest band decay of each channel
+        crosspoint = np.max(crosspoint, axis=0)
+    crosspoint = np.maximum(crosspoint, onsets + 1)
+    stop = int(np.max(crosspoint))
+    truncated = columns[start:stop].copy()
+    length = truncated.shape[0]
+    time = np.arange(length)[:, np.newaxis]
+    # fade in, over the samples before the earliest onset
+    fadeIn = min(preSamples, int(np.min(onsets)) - start)
+    if fadeIn > 0:
+        truncated[:fadeIn] *= np.hanning(2*fadeIn)[:fadeIn, np.newaxis]
+    # fade out, half Hann ending at each channel's crosspoint
+    end = (crosspoint - start)[np.newaxis, :]
+    fadeLength = np.maximum(fadeOut*(end - (onsets - start)), 1)
+    phase = np.clip((time - (end - fadeLength)) / fadeLength, 0, 1)
+    truncated *= 0.5*(1 + np.cos(np.pi*phase))
+    result = SignalObj(np.squeeze(truncated, axis=1)
+                       if truncated.shape[1] == 1 else truncated,
+                       'time', samplingRate,
+                       freqMin=getattr(ir, 'freqMin', None),
+                       freqMax=getattr(ir, 'freqMax', None),
+                       comment='Truncated impulse response, onset '
+                               + str(start))
+    if getattr(ir, 'isCalibrated', False):
+        result.calibration = ir.calibration
+    if hasattr(ir, 'unit'):
+        result.unit = ir.unit
+    return result
@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Levels
+=======
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule provides sound level metering for continuous monitoring.
+    A SoundLevelMeter receives blocks of samples, from a recording or from a
+    chunked wave file reader, and keeps the frequency and time weighting
+    filter states between blocks, so the levels are the same as the ones
+    obtained processing the whole signal at once.
+
+        >>> slm = pytta.levels.SoundLevelMeter(samplingRate=48000,
+        >>>                                    weighting='A',
+        >>>                                    interval=1)
+        >>> for block in pytta.read_wav_blocks(fileName):
+        >>>     for result in slm.process(block):
+        >>>         print(result['Leq'])
+
+    Every interval emits a dict with, per channel:
+
+        - 'time':   [s] start of the interval;
+        - 'Leq':    [dB] equivalent continuous level;
+        - 'LFmax':  [dB] maximum Fast (125 ms) time weighted level;
+        - 'LSmax':  [dB] maximum Slow (1 s) time weighted level;
+        - 'L10', 'L50', 'L90', ...: [dB] percentile levels, exceeded during
+                    the respective percentage of the interval, from the Fast
+                    time weighted level.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.levels.weighting_sos( kind, samplingRate )
+
+    For further information, check the function specific documentation.
+"""
+
+import functools
+import numpy as np
+from pytta import default
+from pytta import filters
+from pytta._lazy import LazyModule
+
+ss = LazyModule('scipy.signal') # loaded on first use
+
+
+_timeConstants = {'fast': 0.125, 'slow': 1.0}
+""" Exponential time weighting constants [s] (IEC 61672-1) """
+
+_poles = {'A': [20.598997, 20.598997, 107.65265, 737.86223, 12194.217,
+                12194.217],
+          'C': [20.598997, 20.598997, 12194.217, 12194.217]}
+""" Analog weighting filter poles [Hz] (IEC 61672-1) """
+
+_zeros = {'A': 4, 'C': 2}
+""" Number of analog weighting filter zeros at 0 Hz """
+
+
+def weighting_sos(kind='A', samplingRate=None):
+    """
+    Second order sections of the A, C or Z frequency weighting filters, by
+    bilinear transform of the IEC 61672-1 analog filters, normalized to 0 dB
+    at 1 kHz. The sections are cached for each (kind, samplingRate) pair, so
+    they are designed only once.
+
+    >>> sos = pytta.levels.weighting_sos('A', 48000)
+
+    Z weighting returns None, meaning no filtering at all.
+    """
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    return _weighting_sos(kind.upper(), samplingRate)
+
+
+@functools.lru_cache(maxsize=32)
+def _weighting_sos(kind, samplingRate):
+    if kind == 'Z':
+        return None
+    if kind not in _poles:
+        raise ValueError("Unknown weighting " + repr(kind)
+                         + ", use 'A', 'C' or 'Z'")
+    zeros = np.zeros(_zeros[kind])
+    poles = -2*np.pi*np.array(_poles[kind])
+    z, p, k = ss.bilinear_zpk(zeros, poles, 1, samplingRate)
+    sos = ss.zpk2sos(z, p, k)
+    _, h = ss.sosfreqz(sos, worN=[1000], fs=samplingRate)
+    sos[0, :3] /= np.abs(h[0])
+    return sos
+
+
+class SoundLevelMeter(object):
+    """
+    Streaming sound level meter.
+
+    Properties(self):       (default),      meaning
+        - samplingRate:     (44100),        sampling rate of the blocks;
+        - weighting:        ('A'),          frequency weighting, 'A', 'C' or 'Z';
+        - interval:         (1),            [s] integration time of each result;
+        - statisticsStep:   (0.01),         [s] sampling period of the Fast level for the percentiles;
+        - percentiles:      ((10,50,90)),   percentile levels calculated on each interval;
+        - reference:        (None),         level reference value, 2e-5 for [Pa] signals;
+        - calibration:      (None),         scalar, or per channel, calibration factors [unit/FS];
+        - callback:         (None),         function called with each interval result dict.
+
+    Methods:                meaning
+        - process(block):   adds a block of samples, returns the finished intervals;
+        - flush():          returns the currently unfinished interval, if any;
+        - reset():          clears the filter states and the accumulated interval.
+
+    If calibration or reference are None, they are taken from the blocks,
+    when these are calibrated SignalObjs (see SignalObj.calibrate()), so the
+    levels come out in dB SPL; otherwise 1 is used, meaning dBFS. They are
+    applied only to the resulting levels, never to the samples.
+
+    The frequency weighting is a pytta.filters.SOSFilter, and the time
+    weighting states are kept as (1 x channels) arrays, so every block is
+    filtered for all channels in a single scipy.signal.sosfilt() and
+    lfilter() call.
+    """
+
+    def __init__(self,
+                 samplingRate=None,
+                 weighting='A',
+                 interval=1,
+                 statisticsStep=0.01,
+                 percentiles=(10, 50, 90),
+                 reference=None,
+                 calibration=None,
+                 callback=None):
+        if samplingRate is None:
+            samplingRate = default.samplingRate
+        self._samplingRate = samplingRate
+        self._weighting = weighting.upper()
+        self._weightingFilter = None if self._weighting == 'Z' \
+            else filters.weighting(self._weighting, samplingRate)
+        self._interval = interval
+        self._intervalSamples = int(round(interval * samplingRate))
+        self._statisticsStep = max(1, int(round(statisticsStep
+                                                * samplingRate)))
+        self._percentiles = tuple(percentiles)
+        self._reference = reference
+        self._calibration = calibration
+        self.callback = callback
+        # one pole exponential averaging: y[n] = a*x[n] + (1-a)*y[n-1]
+        self._alpha = {name: 1 - np.exp(-1 / (tau*samplingRate))
+                       for name, tau in _timeConstants.items()}
+        self.reset()
+
+#%% SoundLevelMeter Properties
+
+    @property
+    def samplingRate(self):
+        return self._samplingRate
+
+    @property
+    def weighting(self):
+        return self._weighting
+
+    @property
+    def interval(self):
+        return self._interval
+
+    @property
+    def percentiles(self):
+        return self._percentiles
+
+    @property
+    def reference(self):
+        if self._reference is None:
+            return self._blockReference
+        return self._reference
+
+    @property
+    def calibration(self):
+        if self._calibration is None:
+            return self._blockCalibration
+        return self._calibration
+
+#%% SoundLevelMeter Methods
+
+    def reset(self):
+        self._numChannels = None
+        if self._weightingFilter is not None:
+            self._weightingFilter.reset()
+        self._timeStates = None
+        self._samplesDone = 0
+        self._blockCalibration = 1
+        self._blockReference = 1
+        self._clear_interval()
+
+    def _clear_interval(self):
+        self._intervalStart = self._samplesDone
+        self._intervalCount = 0
+        self._sumSquared = 0
+        self._maxFast = None
+        self._maxSlow = None
+        self._fastSamples = []
+
+    def _init_states(self, numChannels):
+        self._numChannels = numChannels
+        self._timeStates = {name: np.zeros((1, numChannels))
+                            for name in _timeConstants}
+
+    def process(self, block):
+        """
+        Adds a block of samples, a SignalObj or (samples x channels) array,
+        and returns the list of intervals completed within it.
+        """
+        if getattr(block, 'isCalibrated', False):
+            self._blockCalibration = block.calibration
+            self._blockReference = block.reference
+        block = getattr(block, 'timeSignal', block)
+        block = np.asarray(block, dtype='float64')
+        if block.ndim == 1:
+            block = block[:, np.newaxis]
+        if self._numChannels is None:
+            self._init_states(block.shape[1])
+        elif block.shape[1] != self._numChannels:
+            raise ValueError("Number of channels changed between blocks")
+        if self._weightingFilter is not None:
+            block = self._weightingFilter.process(block)
+        squared = block**2
+        timeWeighted = {}
+        for name, alpha in self._alpha.items():
+            timeWeighted[name], self._timeStates[name] = \
+                ss.lfilter([alpha], [1, alpha - 1], squared, axis=0,
+                           zi=self._timeStates[name])
+        results = []
+        start = 0
+        while start < squared.shape[0]:
+            remaining = self._intervalSamples - self._intervalCount
+            stop = min(start + remaining, squared.shape[0])
+            self._accumulate(squared[start:stop],
+                             timeWeighted['fast'][start:stop],
+                             timeWeighted['slow'][start:stop])
+            start = stop
+            if self._intervalCount == self._intervalSamples:
+                results.append(self._emit())
+        return results
+
+    def flush(self):
+        """
+        Returns the unfinished interval as a list with a single result, or an
+        empty list if there are no samples accumulated.
+        """
+        if self._intervalCount == 0:
+            return []
+        return [self._emit()]
+
+    def _accumulate(self, squared, fast, slow):
+        self._sumSquared = self._sumSquared + np.sum(squared, axis=0)
+        maxFast, maxSlow = np.max(fast, axis=0), np.max(slow, axis=0)
+        if self._maxFast is None:
+            self._maxFast, self._maxSlow = maxFast, maxSlow
+        else:
+            self._maxFast = np.maximum(self._maxFast, maxFast)
+            self._maxSlow = np.maximum(self._maxSlow, maxSlow)
+        # Fast level samples taken every statisticsStep, counted from the
+        # stream start, so the sampling grid does not depend on block sizes
+        firstIdx = (-self._samplesDone) % self._statisticsStep
+        self._fastSamples.append(fast[firstIdx::self._statisticsStep])
+        self._intervalCount += squared.shape[0]
+        self._samplesDone += squared.shape[0]
+
+    def _level(self, meanSquared):
+        factor = np.asarray(self.calibration, dtype='float64') \
+            / np.asarray(self.reference, dtype='float64')
+        with np.errstate(divide='ignore'):
+            return 10*np.log10(meanSquared * factor**2)
+
+    def _emit(self):
+        result = {'time': self._intervalStart / self.samplingRate,
+                  'Leq': self._level(self._sumSquared / self._intervalCount),
+                  'LFmax': self._level(self._maxFast),
+                  'LSmax': self._level(self._maxSlow)}
+        fastSamples = np.concatenate(self._fastSamples, axis=0)
+        if fastSamples.shape[0] > 0 and self.percentiles:
+            # exceeded during N% of the time is the (100 - N)th percentile
+            values = np.percentile(fastSamples,
+                                   [100 - n for n in self.percentiles],
+                                   axis=0)
+            for n, value in zip(self.percentiles, values):
+                result['L' + str(n)] = self._level(value)
+        self._clear_interval()
+        if self.callback is not None:
+            self.callback(result)
+        return result
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Phase
+======
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule analyses the phase of signals and impulse responses:
+    unwrapped phase, group delay, and the decomposition of a response into
+    its minimum phase and all-pass (excess phase) parts, by folding the real
+    cepstrum. Every function works on all channels, and on every measurement
+    of a SignalSet, with one FFT call per step:
+
+        >>> freq, tau = pytta.phase.group_delay(frf.transferfunction)
+        >>> hmin, hap = pytta.phase.decompose(frf.transferfunction)
+
+    The minimum phase part has the magnitude response of the original with
+    the least possible delay, so, truncated, it makes compact equalisation
+    filters; fir_minimum_phase() converts FIR filters, e.g. the inverses of
+    the measured responses, to minimum phase filters of the same magnitude:
+
+        >>> h = pytta.ir.truncate(frf.transferfunction)
+        >>> eq = pytta.phase.fir_minimum_phase(inverseTaps, numTaps=512)
+
+    Available functions:
+    --------------------
+
+        >>> pytta.phase.unwrapped_phase( signal, nfft )
+        >>> pytta.phase.group_delay( signal, nfft )
+        >>> pytta.phase.minimum_phase( signal, nfft )
+        >>> pytta.phase.decompose( signal, nfft )
+        >>> pytta.phase.fir_minimum_phase( taps, numTaps, nfft, axis )
+
+    The inputs may be SignalObjs, SignalSets or arrays with the time samples
+    along the first axis. For further information, check the function
+    specific documentation.
+"""
+
+import numpy as np
+from pytta import default
+from pytta import profiling
+from pytta import fft
+from pytta import axes
+
+
+def _time_data(signal):
+    """
+    Time samples of a SignalObj, SignalSet or array, the axis of the
+    samples, and the sampling rate.
+    """
+    if hasattr(signal, 'numMeasurements'):   # SignalSet
+        return signal.timeSignal, 1, signal.samplingRate
+    if hasattr(signal, 'timeSignal'):        # SignalObj
+        return np.asarray(signal.timeSignal), 0, signal.samplingRate
+    return np.asarray(signal), 0, default.samplingRate
+
+
+def _shape(vector, ndim, axis):
+    """ Reshapes a 1D vector to broadcast along axis of an ndim array """
+    shape = [1]*ndim
+    shape[axis] = vector.size
+    return vector.reshape(shape)
+
+
+def _fold(nfft):
+    """
+    Window that folds a real cepstrum of nfft points into its causal,
+    minimum phase, counterpart: the anti-causal half is added to the causal.
+    """
+    window = np.zeros(nfft)
+    window[0] = 1
+    window[1:(nfft + 1)//2] = 2
+    if nfft % 2 == 0:
+        window[nfft//2] = 1
+    return window
+
+
+def _minimum_spectrum(magnitude, nfft, axis, floor):
+    """
+    One-sided minimum phase spectrum with the given one-sided magnitude,
+    along axis. Magnitudes are limited to floor dB below each column's
+    maximum, so spectral zeros do not reach the logarithm.
+    """
+    limit = np.max(magnitude, axis=axis, keepdims=True) * 10**(floor/20)
+    logMagnitude = np.log(np.maximum(magnitude,
+                                     np.maximum(limit, np.finfo(float).tiny)))
+    cepstrum = fft.irfft(logMagnitude, nfft, axis=axis)
+    cepstrum *= _shape(_fold(nfft), cepstrum.ndim, axis)
+    return np.exp(fft.rfft(cepstrum, axis=axis))
+
+
+def _like(signal, timeSignal, comment, keepCalibration=True):
+    """ Wraps the time samples as the same kind of object as signal """
+    if hasattr(signal, 'numMeasurements'):
+        from pytta.classes import SignalSet as cls
+    elif hasattr(signal, 'timeSignal'):
+        from pytta.classes import SignalObj as cls
+        if timeSignal.ndim == 2 and timeSignal.shape[1] == 1:
+            timeSignal = timeSignal[:, 0]
+    else:
+        return timeSignal
+    result = cls(timeSignal, 'time', signal.samplingRate,
+                 freqMin=signal.freqMin, freqMax=signal.freqMax,
+                 comment=comment)
+    if keepCalibration:
+        if signal.isCalibrated:
+            result.calibration = signal.calibration
+        result.unit = signal.unit
+    return result
+
+
+@profiling.instrument('phase.unwrapped_phase')
+def unwrapped_phase(signal, nfft=None):
+    """
+    Unwrapped phase [rad] of the positive frequencies of every channel,
+    from an nfft points FFT, defaulting to the number of samples.
+
+    >>> freq, phase = pytta.phase.unwrapped_phase(frf.transferfunction)
+
+    Returns the one-sided frequency vector and the phase, shaped as the
+    time samples with nfft//2 + 1 frequency bins in place of the samples.
+    """
+    timeSignal, axis, samplingRate = _time_data(signal)
+    nfft = nfft or timeSignal.shape[axis]
+    spectrum = fft.rfft(timeSignal, nfft, axis=axis)
+    return axes.freq_axis(nfft, samplingRate, 'one'), \
+        np.unwrap(np.angle(spectrum), axis=axis)
+
+
+@profiling.instrument('phase.group_delay')
+def group_delay(signal, nfft=None):
+    """
+    Group delay [s] of the positive frequencies of every channel,
+    tau = -dphase/domega, from an nfft points FFT, defaulting to the number
+    of samples.
+
+    >>> freq, tau = pytta.phase.group_delay(frf.transferfunction)
+
+    It is calculated without unwrapping the phase, as the real part of
+    FFT(n*h[n])/FFT(h[n]). Bins where the magnitude is over 200 dB below
+    the channel's maximum are set to nan.
+
+    Returns the one-sided frequency vector and the group delay, shaped as
+    the time samples with nfft//2 + 1 frequency bins in place of the
+    samples.
+    """
+    timeSignal, axis, samplingRate = _time_data(signal)
+    nfft = nfft or timeSignal.shape[axis]
+    ramp = _shape(np.arange(timeSignal.shape[axis]), timeSignal.ndim, axis)
+    spectra = fft.rfft(np.stack((timeSignal, timeSignal*ramp)), nfft,
+                       axis=axis + 1)
+    spectrum, rampSpectrum = spectra[0], spectra[1]
+    power = np.abs(spectrum)**2
+    singular = power <= np.max(power, axis=axis, keepdims=True)*1e-20
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delay = np.real(rampSpectrum/spectrum) / samplingRate
+    delay[singular] = np.nan
+    return axes.freq_axis(nfft, samplingRate, 'one'), delay
+
+
+@profiling.instrument('phase.minimum_phase')
+def minimum_phase(signal, nfft=None, floor=-200):
+    """
+    Minimum phase version of every channel: same magnitude response,
+    obtained by folding the real cepstrum of an nfft points FFT, defaulting
+    to the number of samples.
+
+    >>> hmin = pytta.phase.minimum_phase(frf.transferfunction)
+
+    Magnitudes more than floor [dB] below the channel's maximum are limited
+    to it. A larger nfft reduces the time aliasing of the cepstrum, at the
+    cost of longer responses.
+
+    Returns the same kind of object as the input, with nfft samples.
+    """
+    timeSignal, axis, samplingRate = _time_data(signal)
+    nfft = nfft or timeSignal.shape[axis]
+    spectrum = fft.rfft(timeSignal, nfft, axis=axis)
+    minimum = fft.irfft(_minimum_spectrum(np.abs(spectrum), nfft, axis,
+                                          floor), nfft, axis=axis)
+    return _like(signal, minimum, 'Minimum phase response')
+
+
+@profiling.instrument('phase.decompose')
+def decompose(signal, nfft=None, floor=-200):
+    """
+    Decomposition of every channel into a minimum phase and an all-pass
+    (excess phase) part, H = Hmin*Hap, from an nfft points FFT, defaulting
+    to the number of samples.
+
+    >>> hmin, hap = pytta.phase.decompose(frf.transferfunction)
+    >>> freq, excessPhase = pytta.phase.unwrapped_phase(hap)
+    >>> freq, excessDelay = pytta.phase.group_delay(hap)
+
+    The all-pass part holds the pure delay and the non minimum phase zeros
+    of the response, so its group delay is the excess group delay.
+    Magnitudes more than floor [dB] below the channel's maximum are limited
+    to it.
+
+    Returns the minimum phase and the all-pass parts, as the same kind of
+    object as the input, with nfft samples. The all-pass part is
+    dimensionless, so it is returned uncalibrated.
+    """
+    timeSignal, axis, samplingRate = _time_data(signal)
+    nfft = nfft or timeSignal.shape[axis]
+    spectrum = fft.rfft(timeSignal, nfft, axis=axis)
+    minimumSpectrum = _minimum_spectrum(np.abs(spectrum), nfft, axis, floor)
+    spectra = np.stack((minimumSpectrum, spectrum/minimumSpectrum))
+    minimum, allpass = fft.irfft(spectra, nfft, axis=axis + 1)
+    return _like(signal, minimum, 'Minimum phase response'), \
+        _like(signal, allpass, 'All-pass response', keepCalibration=False)
+
+
+@profiling.instrument('phase.fir_minimum_phase')
+def fir_minimum_phase(taps, numTaps=None, nfft=None, axis=0, floor=-200):
+    """
+    Converts FIR filters to minimum phase filters with the same magnitude
+    response, e.g. linear phase or measured inverse filters, into compact
+    equalisation filters. Many filters, along the other axes, are converted
+    by the same FFT calls.
+
+    >>> eq = pytta.phase.fir_minimum_phase(inverseTaps, numTaps=512)
+
+    Parameters:
+    -----------
+
+        - taps: array with the coefficients along axis, or SignalObj or
+                    SignalSet;
+        - numTaps: length of the converted filters, defaults to the input
+                    length. The minimum phase filter concentrates its energy
+                    at its start, so it can usually be much shorter;
+        - nfft: FFT length of the cepstrum, defaults to 64 times the input
+                    length, to limit the cepstrum time aliasing, which is
+                    large for filters with zeros on the unit circle, as
+                    windowed designs' stopbands;
+        - floor: magnitudes more than floor [dB] below the maximum are
+                    limited to it.
+
+    Unlike scipy.signal.minimum_phase(), the magnitude response is kept, not
+    square rooted.
+    """
+    if hasattr(taps, 'timeSignal'):
+        timeSignal, axis, samplingRate = _time_data(taps)
+    else:
+        timeSignal = np.asarray(taps, dtype='float64')
+        axis = axis % timeSignal.ndim
+    length = timeSignal.shape[axis]
+    numTaps = numTaps or length
+    nfft = nfft or fft.next_fast_len(64*max(length, numTaps))
+    spectrum = fft.rfft(timeSignal, nfft, axis=axis)
+    minimum = fft.irfft(_minimum_spectrum(np.abs(spectrum), nfft, axis,
+                                          floor), nfft, axis=axis)
+    minimum = np.take(minimum, np.arange(numTaps), axis=axis)
+    return _like(taps, minimum, 'Minimum phase filter')
@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Plotting
+=========
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule does the plots of the signals, sending matplotlib only
+    as many points as the axes have pixels, instead of every sample:
+
+        - time plots show the min/max envelope of the samples under each
+          pixel column, which looks the same as plotting every sample;
+        - frequency plots average the power of the bins within
+          logarithmically spaced bands, one per pixel column, as the
+          logarithmic axis packs thousands of linear bins in the pixels of
+          the higher frequencies.
+
+    The plotting cost depends on the screen size, not on the signal length.
+    When the plot is zoomed or panned, the visible range is decimated
+    again, so the detail is recovered:
+
+        >>> signalObj.plot_time()                 # decimated, re-decimated on zoom
+        >>> signalObj.plot_freq(decimate=False)   # every bin
+
+    Available functions:
+    --------------------
+
+        >>> pytta.plotting.plot_time( signalObj, decimate, zoom )
+        >>> pytta.plotting.plot_freq( signalObj, smooth, decimate, zoom )
+        >>> pytta.plotting.envelope( timeSignal, numPoints, start, stop )
+        >>> pytta.plotting.log_average( freqVector, power, numPoints, freqMin, freqMax )
+
+    For further information, check the function specific documentation.
+"""
+
+import numpy as np
+from pytta._lazy import LazyModule
+
+plot = LazyModule('matplotlib.pyplot') # loaded on first use
+signal = LazyModule('scipy.signal')
+
+_defaultPoints = 2000
+""" Number of points when the axes size is unknown """
+
+
+def _columns(array):
+    array = np.asarray(array)
+    return array[:, np.newaxis] if array.ndim == 1 else array
+
+
+def envelope(timeSignal, numPoints, start=0, stop=None):
+    """
+    Min/max envelope of the (samples x channels) timeSignal from sample
+    start to stop, in numPoints bins of equal length. All bins and channels
+    are reduced by the same two numpy calls.
+
+    >>> x, y = pytta.plotting.envelope(signalObj.timeSignal, 1000)
+
+    Returns the positions [samples], with each bin's center repeated twice,
+    and the (2*bins x channels) minimum and maximum of each bin, so plotting
+    them draws a vertical segment per bin. If there are less samples than
+    2*numPoints, returns the samples themselves.
+    """
+    timeSignal = _columns(timeSignal)
+    stop = timeSignal.shape[0] if stop is None \
+        else min(max(int(stop), 0), timeSignal.shape[0])
+    start = min(max(int(start), 0), stop)
+    numSamples = stop - start
+    binLength = numSamples // max(int(numPoints), 1)
+    if binLength < 2:
+        return np.arange(start, stop, dtype='float64'), timeSignal[start:stop]
+    numBins = numSamples // binLength
+    bins = timeSignal[start:start + numBins*binLength].reshape(
+                numBins, binLength, timeSignal.shape[1])
+    lows, highs = bins.min(axis=1), bins.max(axis=1)
+    tail = timeSignal[start + numBins*binLength:stop]
+    if tail.shape[0]:
+        # last, shorter bin with the remaining samples
+        lows = np.concatenate((lows, tail.min(axis=0, keepdims=True)))
+        highs = np.concatenate((highs, tail.max(axis=0, keepdims=True)))
+    edges = start + np.arange(lows.shape[0] + 1)*binLength
+    edges[-1] = stop
+    centers = (edges[:-1] + edges[1:] - 1) / 2
+    values = np.empty((2*lows.shape[0], timeSignal.shape[1]),
+                      dtype=timeSignal.dtype)
+    values[0::2], values[1::2] = lows, highs
+    return np.repeat(centers, 2), values
+
+
+def log_average(freqVector, power, numPoints, freqMin=None, freqMax=None):
+    """
+    Averages the (bins x channels) power of evenly spaced frequency bins
+    within numPoints logarithmically spaced bands, from freqMin (defaults to
+    the first non zero bin) to freqMax (defaults to the last bin). Bands
+    narrower than a bin are merged, so each output point averages at least
+    one bin.
+
+    >>> freq, Pxx = pytta.plotting.log_average(freqVector, np.abs(X)**2, 1000)
+
+    Returns the mean frequency and the mean power of each band.
+    """
+    freqVector = np.asarray(freqVector)
+    power = _columns(power)
+    step = freqVector[1] - freqVector[0]
+    low = freqVector[1] if freqMin is None else max(freqMin, freqVector[1])
+    high = freqVector[-1] if freqMax is None \
+        else min(freqMax, freqVector[-1])
+    if high <= low:
+        return freqVector[:0], power[:0]
+    edges = np.geomspace(low, high, max(int(numPoints), 1) + 1)
+    # evenly spaced bins: the band edges' indexes are found by arithmetic
+    first = np.ceil((edges[:-1] - freqVector[0])/step - 1e-9)
+    last = np.floor((high - freqVector[0])/step + 1e-9) + 1
+    indexes = np.unique(np.clip(np.append(first, last), 0,
+                                freqVector.size).astype(int))
+    if indexes.size < 2:
+        return freqVector[:0], power[:0]
+    counts = np.diff(indexes)
+    sums = np.add.reduceat(power[:indexes[-1]], indexes[:-1], axis=0)
+    freq = freqVector[0] + step*(indexes[:-1] + (counts - 1)/2)
+    return freq, sums / counts[:, np.newaxis]
+
+
+def _pixels(ax):
+    """ Width of the axes in pixels, the number of points worth plotting """
+    try:
+        width = int(ax.get_window_extent().width)
+    except Exception:
+        width = 0
+    return width if width > 0 else _defaultPoints
+
+
+class _Redecimator(object):
+    """
+    Recalculates the plotted points of the lines, for the visible x range,
+    every time the axes limits change.
+    """
+
+    def __init__(self, ax, lines, compute):
+        self.lines = lines
+        self.compute = compute
+        ax.callbacks.connect('xlim_changed', self)
+
+    def __call__(self, ax):
+        low, high = ax.get_xlim()
+        x, y = self.compute(low, high, _pixels(ax))
+        for channel, line in enumerate(self.lines):
+            line.set_data(x, y[:, channel])
+
+
+def plot_time(signalObj, decimate=True, zoom=True):
+    """
+    Time domain plot of every channel of a SignalObj, in its calibrated
+    unit. With decimate, the min/max envelope of the samples under each
+    pixel is plotted, instead of every sample; with zoom, it is calculated
+    again for the visible range after zooming or panning.
+
+    >>> pytta.plotting.plot_time(recording)
+    """
+    timeSignal = _columns(signalObj.timeSignal)
+    calibration = signalObj.calibration if signalObj.isCalibrated \
+        else np.ones(1)
+    samplingRate = signalObj.samplingRate
+    timeVector = signalObj.timeVector
+    fig = plot.figure( figsize=(10,5) )
+    ax = fig.gca()
+
+    def compute(low, high, numPoints):
+        start = int(np.floor(low*samplingRate)) - 1
+        stop = int(np.ceil(high*samplingRate)) + 2
+        x, y = envelope(timeSignal, numPoints, start, stop)
+        # scales only the plotted points
+        return x / samplingRate, y * calibration
+
+    if decimate:
+        x, y = compute(0, timeVector[-1], _pixels(ax))
+        lows, highs = timeSignal.min(axis=0), timeSignal.max(axis=0)
+        limits = np.concatenate((lows*calibration, highs*calibration))
+    else:
+        x, y = timeVector, timeSignal * calibration
+        limits = y
+    lines = ax.plot( x, y )
+    ax.axis( [ timeVector[0] - 10/samplingRate, \
+               timeVector[-1] + 10/samplingRate, \
+               1.05*np.min( limits ), \
+               1.05*np.max( limits ) ] )
+    if decimate and zoom:
+        _Redecimator(ax, lines, compute)
+    ax.set_xlabel(r'$Time$ [s]')
+    ax.set_ylabel(r'$Amplitude$ [' + signalObj._unit_label() + ']')
+
+
+def plot_freq(signalObj, smooth=True, decimate=True, zoom=True):
+    """
+    Frequency domain plot, in dB, of every channel of a SignalObj, offset by
+    its calibration. With smooth, the magnitude is smoothed by a
+    Savitzky-Golay filter first. With decimate, the power of the bins within
+    each pixel wide logarithmic band is averaged, instead of plotting every
+    bin; with zoom, it is calculated again for the visible range after
+    zooming or panning.
+
+    >>> pytta.plotting.plot_freq(transferfunction, smooth=False)
+    """
+    # calibration as a dB offset per channel
+    offset = 20*np.log10(signalObj.calibration/signalObj.reference)
+    freqSignal = _columns(signalObj.freqSignal)
+    numSamples = signalObj.numSamples
+    if smooth:
+        magnitude = signal.savgol_filter( np.abs( freqSignal ), 31, 3,
+                                          axis=0 )
+        scale = 1
+    else:
+        magnitude = freqSignal
+        scale = 2 / numSamples
+    fig = plot.figure( figsize=(10,5) )
+    ax = fig.gca()
+    if decimate:
+        numBins = numSamples//2 + 1
+        freqVector = np.asarray(signalObj.freqVector[:numBins])
+
+        def compute(low, high, numPoints):
+            freq, power = None, []
+            # one channel at a time, bounding the temporary arrays
+            for channel in range(magnitude.shape[1]):
+                freq, channelPower = log_average(
+                                        freqVector,
+                                        np.abs(magnitude[:numBins, channel]
+                                               * scale)**2,
+                                        numPoints, max(low, 0), high)
+                power.append(channelPower[:, 0])
+            with np.errstate(divide='ignore'):
+                return freq, 10*np.log10(np.stack(power, axis=1)) + offset
+
+        freq, dBSignal = compute(0, freqVector[-1], _pixels(ax))
+    else:
+        freq = signalObj.freqVector
+        with np.errstate(divide='ignore'):
+            dBSignal = 20 * np.log10( np.abs( magnitude*scale ) ) + offset
+    lines = ax.semilogx( freq, dBSignal )
+    finite = dBSignal[np.isfinite(dBSignal)]
+    ax.axis( ( 15, 22050,
+               np.min( finite )/1.05, 1.05*np.max( finite ) ) )
+    if decimate and zoom:
+        _Redecimator(ax, lines, compute)
+    ax.set_xlabel(r'$Frequency$ [Hz]')
+    if signalObj.isCalibrated:
+        ax.set_ylabel(r'$Magnitude$ [dB re ' + signalObj._reference_label()
+                      + ']')
+    else:
+        ax.set_ylabel(r'$Magnitude$ [dBFS]')
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling
+==========
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule records how much time each PyTTa operation takes, so a
+    slow pipeline can be broken down into FFTs, signal generation, audio
+    I/O, file I/O and so on. It is disabled by default, and while disabled
+    each instrumented call costs a single flag check.
+
+        >>> with pytta.profiling.profile() as prof:
+        >>>     frf = pytta.generate.measurement('frf')
+        >>>     H = frf.run()
+        >>> prof.print_report()
+
+    Or globally, e.g. for a whole application run:
+
+        >>> prof = pytta.profiling.enable(callback=metrics.send)
+        >>> ...
+        >>> pytta.profiling.disable()
+        >>> prof.report()
+
+    For each operation it records:
+
+        - 'calls':  number of calls;
+        - 'total', 'mean', 'max':  [s] wall time, inclusive of the nested
+                    operations (e.g. 'SignalObj.timeSignal' includes its
+                    'fft.fft');
+        - 'bytes':  memory allocated by the calls: the sum of each call's
+                    traced memory peak above its start, so temporaries freed
+                    before returning, as FFT buffers, are counted. Only if
+                    memory=True, through tracemalloc, which slows
+                    everything down;
+
+    and the number of FFTs calculated of each (transform, size) pair. If a
+    callback is given, it is called with a dict for every finished
+    operation: {'name', 'time', 'bytes', 'size'}, 'bytes' being that call's
+    peak allocation and 'size' the FFT size for the FFT operations, else
+    None.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.profiling.profile( callback, memory )
+        >>> pytta.profiling.enable( callback, memory )
+        >>> pytta.profiling.disable()
+        >>> pytta.profiling.is_enabled()
+
+    The instrumentation is added to PyTTa's functions with the instrument()
+    decorator, or around blocks of code with section(name).
+
+    For further information, check the function specific documentation.
+"""
+
+import collections
+import contextlib
+import functools
+import threading
+import time
+import tracemalloc
+
+
+_enabled = False
+""" Checked by every instrumented call, True while any Profile is active """
+
+_active = []
+""" Active Profile objects, every operation is recorded on all of them """
+
+_lock = threading.Lock()
+
+_nullSection = contextlib.nullcontext()
+
+_sections = threading.local()
+""" Open memory traced sections of each thread, innermost last """
+
+
+class Profile(object):
+    """
+    Collection of operation timings.
+
+    Properties(self):       (default),      meaning
+        - callback:         (None),         function called with a dict for each finished operation;
+        - memory:           (False),        if True, records the peak allocated bytes of each call with tracemalloc.
+
+    Methods:                meaning
+        - report():         per operation statistics and FFT size counts;
+        - print_report():   prints the report as a table, slowest operations first;
+        - reset():          clears the recorded timings.
+    """
+
+    def __init__(self, callback=None, memory=False):
+        self.callback = callback
+        self.memory = memory
+        self.reset()
+
+    def reset(self):
+        self._operations = collections.OrderedDict()
+        self._fftSizes = collections.Counter()
+
+    def _record(self, name, elapsed, allocated, size):
+        with _lock:
+            stats = self._operations.get(name)
+            if stats is None:
+                stats = self._operations[name] = {'calls': 0, 'total': 0.0,
+                                                  'max': 0.0, 'bytes': 0}
+            stats['calls'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['bytes'] += allocated
+            if size is not None:
+                self._fftSizes[(name, size)] += 1
+        if self.callback is not None:
+            self.callback({'name': name, 'time': elapsed,
+                           'bytes': allocated, 'size': size})
+
+    def report(self):
+        """
+        Returns a dict with 'operations', {name: {'calls', 'total', 'mean',
+        'max', 'bytes'}}, and 'fftSizes', {(name, size): count}.
+        """
+        with _lock:
+            operations = collections.OrderedDict()
+            for name, stats in self._operations.items():
+                operations[name] = dict(stats,
+                                        mean=stats['total']/stats['calls'])
+            return {'operations': operations,
+                    'fftSizes': dict(self._fftSizes)}
+
+    def print_report(self):
+        report = self.report()
+        rows = sorted(report['operations'].items(),
+                      key=lambda item: item[1]['total'], reverse=True)
+        print('{:<32}{:>8}{:>12}{:>12}{:>12}{:>14}'.format(
+            'operation', 'calls', 'total [s]', 'mean [s]', 'max [s]',
+            'bytes'))
+        for name, stats in rows:
+            print('{:<32}{:>8}{:>12.4g}{:>12.4g}{:>12.4g}{:>14}'.format(
+                name, stats['calls'], stats['total'], stats['mean'],
+                stats['max'], stats['bytes']))
+        for (name, size), count in sorted(report['fftSizes'].items()):
+            print('{:<32}size {:<10}{:>8} calls'.format(name, size, count))
+
+
+def _activate(prof):
+    global _enabled
+    with _lock:
+        _active.append(prof)
+        _enabled = True
+    if prof.memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        prof._startedTracing = True
+
+
+def _deactivate(prof):
+    global _enabled
+    with _lock:
+        if prof in _active:
+            _active.remove(prof)
+        _enabled = bool(_active)
+    if getattr(prof, '_startedTracing', False):
+        tracemalloc.stop()
+        prof._startedTracing = False
+
+
+def enable(callback=None, memory=False):
+    """
+    Starts recording every PyTTa operation, until disable() is called.
+    Returns the Profile object that receives the timings.
+    """
+    prof = Profile(callback, memory)
+    _activate(prof)
+    return prof
+
+
+def disable(prof=None):
+    """
+    Stops the given Profile, or every active one if None.
+    """
+    for active in ([prof] if prof is not None else list(_active)):
+        _deactivate(active)
+
+
+def is_enabled():
+    return _enabled
+
+
+@contextlib.contextmanager
+def profile(callback=None, memory=False):
+    """
+    Records every PyTTa operation done inside the with block.
+
+    >>> with pytta.profiling.profile() as prof:
+    >>>     ...
+    >>> prof.report()
+    """
+    prof = Profile(callback, memory)
+    _activate(prof)
+    try:
+        yield prof
+    finally:
+        _deactivate(prof)
+
+
+class _Section(object):
+
+    def __init__(self, name, size=None):
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self._memory = any(prof.memory for prof in _active) \
+            and tracemalloc.is_tracing()
+        if self._memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # the peak is reset for this section, the enclosing ones keep
+            # the peak reached so far
+            stack = getattr(_sections, 'stack', None)
+            if stack is None:
+                stack = _sections.stack = []
+            for outer in stack:
+                outer._peak = max(outer._peak, peak)
+            tracemalloc.reset_peak()
+            self._startBytes = self._peak = current
+            stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        allocated = 0
+        if self._memory:
+            self._peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            _sections.stack.remove(self)
+            allocated = self._peak - self._startBytes
+        for prof in list(_active):
+            prof._record(self.name, elapsed, allocated, self.size)
+        return False
+
+
+def section(name, size=None):
+    """
+    Context manager recording the enclosed block as the operation name.
+    Does nothing while profiling is disabled.
+
+    >>> with profiling.section('sd.playrec'):
+    >>>     recording = sd.playrec(...)
+    """
+    if not _enabled:
+        return _nullSection
+    return _Section(name, size)
+
+
+def instrument(name=None):
+    """
+    Decorator recording every call of the function as the operation name,
+    defaulting to the function's qualified name.
+
+    >>> @profiling.instrument('generate.sweep')
+    >>> def sweep(...):
+    """
+    def decorator(function):
+        operation = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Section(operation):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -31,31 +31,68 @@ PyTTa Default Properties:
     The main difference is that using the set_default() function, a list of
     properties can be set at the same time
     
-    The default device start as the one set default at the user's OS. We
-    recommend changing it's value to the desired audio in/out device, as it
-    can be identified using list_devices() method
+    The default device start as the one set default at the user's OS, which
+    is only queried the first time it is needed, so importing PyTTa does not
+    initialise the audio library. We recommend changing it's value to the
+    desired audio in/out device, as it can be identified using list_devices()
+    method
     
         >>> pytta.list_devices()
     
+    The values can also be changed only inside a with block, and only for
+    the thread (or asyncio task) running it, so concurrent jobs can use
+    different settings without affecting each other or the global ones:
+    
+        >>> with pytta.defaults(samplingRate = 48000, fftDegree = 20):
+        >>>     sweep = pytta.generate.sweep()   # 48 kHz, 2**20 samples
+    
+    The measurement threads of PyTTa (Measurement.run_async(),
+    pytta.scheduler, pytta.batch) run with the settings of the code that
+    started them. A read-only copy of the settings in use is returned by
+    snapshot():
+    
+        >>> settings = pytta.default.snapshot()
+        >>> settings['samplingRate']
+    
 """
-import sounddevice as sd
+import contextlib
+import contextvars
+import types
+from pytta._lazy import LazyModule
 
-__default_device = sd.default.device 
-""" Used only to hold the default audio I/O device at pytta import time"""
+sd = LazyModule('sounddevice')
+""" Only imported when the audio devices are used, see Default.device """
 
 default = {'samplingRate': 44100,
            'fftDegree': 18,
            'timeLength': 10,
            'freqMin': 20,
            'freqMax': 20000,
-           'device': __default_device,
+           'device': None,
            'inChannel': 1,
            'outChannel': 1,
            'stopMargin': 0.7,
            'startMargin': 0.3,
            'comment': 'No comments.',
+           'fftBackend': 'numpy',
+           'fftWorkers': 1,
+           'fftPlanning': 'estimate',
+           'fftPlanCache': True,
            }
 
+_scope = contextvars.ContextVar('pyttaDefaults', default=None)
+""" Read-only mapping of the values set by the enclosing defaults() blocks """
+
+levelReference = {'FS': 1,
+                  'Pa': 2e-5,
+                  'V': 1,
+                  'm/s2': 1e-6,
+                  'm/s': 1e-9,
+                  'm': 1e-12,
+                  'N': 1e-6,
+                  }
+""" Reference values used for the levels [dB] of each physical unit (ISO 1683) """
+
 
 
 class Default(object):
@@ -95,6 +132,14 @@ class Default(object):
             Beginning and ending's amount of time left for silence (Signals only);
         comments:
             Any commentary about the signal or measurement the user wants to add.
+        fftBackend:
+            FFT library used by all PyTTa transforms: 'numpy', 'scipy' or 'pyfftw' (see pytta.fft);
+        fftWorkers:
+            Number of threads of the 'scipy' and 'pyfftw' FFT backends, -1 uses all CPUs;
+        fftPlanning:
+            Planning effort of the 'pyfftw' backend: 'estimate', 'measure' or 'patient';
+        fftPlanCache:
+            If True, the 'pyfftw' backend caches its plans for repeated transform sizes.
         
     
     Methods:
@@ -106,6 +151,10 @@ class Default(object):
             
         reset():
             Attributes goes back to "factory default".
+            
+        snapshot():
+            Read-only mapping of the values in use, including the ones set by
+            the enclosing pytta.defaults() blocks.
     
     """
 
@@ -120,6 +169,10 @@ class Default(object):
     _stopMargin = []
     _startMargin = []
     _comment = []
+    _fftBackend = []
+    _fftWorkers = []
+    _fftPlanning = []
+    _fftPlanCache = []
                         
     def __init__(self):
         """
@@ -144,11 +197,11 @@ class Default(object):
 
 
     def __call__(self):
-        for name, value in vars(self).items():
-            if len(name)<=8:
-                print(name[1:]+'\t\t =',value)
+        for name, value in self.snapshot().items():
+            if len(name)<=7:
+                print(name+'\t\t =',value)
             else: 
-                print(name[1:]+'\t =',value)
+                print(name+'\t =',value)
                 
 
     def set_defaults(self,**namevalues):
@@ -183,57 +236,137 @@ class Default(object):
         vars(self).clear()
         self.__init__()
 
+    def _value(self,name):
+        """ Value set by the innermost defaults() block, else the global one """
+        scope = _scope.get()
+        if scope is not None and name in scope:
+            return scope[name]
+        return vars(self)['_'+name]
+
+    def snapshot(self):
+        """
+        Read-only mapping of the default values in use by the calling thread
+        or task, to be kept or passed to other threads and processes:
+        
+        >>> settings = pytta.default.snapshot()
+        >>> with pytta.defaults(**settings):
+        >>>     ...
+        """
+        values = {name[1:]: value for name, value in vars(self).items()}
+        values.update(_scope.get() or {})
+        return types.MappingProxyType(values)
+
         
     @property
     def samplingRate(self):
-        return self._samplingRate
+        return self._value('samplingRate')
     
     @property
     def fftDegree(self):
-        return self._fftDegree
+        return self._value('fftDegree')
     
     @property
     def timeLength(self):
-        return self._timeLength
+        return self._value('timeLength')
     
     @property
     def freqMin(self):
-        return self._freqMin
+        return self._value('freqMin')
     
     @property
     def freqMax(self):
-        return self._freqMax
+        return self._value('freqMax')
     
     @property
     def freqLims(self):
-        return {'min': self._freqMin, 'max': self._freqMax}
+        return {'min': self.freqMin, 'max': self.freqMax}
     
     @property
     def device(self):
-        return self._device
+        device = self._value('device')
+        if device is None: # OS default, queried on first use
+            return sd.default.device
+        return device
     
     @property
     def inChannel(self):
-        return self._inChannel
+        return self._value('inChannel')
     
     @property
     def outChannel(self):
-        return self._outChannel
+        return self._value('outChannel')
     
     @property
     def startMargin(self):
-        return self._startMargin
+        return self._value('startMargin')
     
     @property
     def stopMargin(self):
-        return self._stopMargin
+        return self._value('stopMargin')
     
     @property
     def margins(self):
-        return {'start': self._startMargin, 'stop': self._stopMargin}
+        return {'start': self.startMargin, 'stop': self.stopMargin}
     
     @property
     def comment(self):
-        return self._comment
+        return self._value('comment')
+    
+    @property
+    def fftBackend(self):
+        return self._value('fftBackend')
+    
+    @property
+    def fftWorkers(self):
+        return self._value('fftWorkers')
     
+    @property
+    def fftPlanning(self):
+        return self._value('fftPlanning')
+    
+    @property
+    def fftPlanCache(self):
+        return self._value('fftPlanCache')
+
+
+
+@contextlib.contextmanager
+def defaults(**namevalues):
+    """
+    Changes default values only inside the with block, and only for the
+    thread, or asyncio task, running it. Blocks can be nested, the inner
+    values take precedence:
+    
+    >>> with pytta.defaults(samplingRate = 48000):
+    >>>     sweep = pytta.generate.sweep()
+    
+    The global values, and the values seen by other threads, are unchanged,
+    so no locking is needed. The values are read through pytta.default, as
+    usual, at no extra cost but a context variable lookup.
+    """
+    for name in namevalues:
+        if name not in default:
+            raise AttributeError('There is no default settings for '
+                                 + repr(name))
+    values = dict(_scope.get() or {})
+    values.update(namevalues)
+    token = _scope.set(types.MappingProxyType(values))
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def run_in_context(function):
+    """
+    Wraps function so it runs with the defaults() values in use where the
+    wrapper was created, e.g. when submitted to a thread pool, whose threads
+    do not inherit them:
+    
+    >>> pool.submit(run_in_context(function), *args)
+    """
+    context = contextvars.copy_context()
+    def wrapper(*args, **kwargs):
+        return context.copy().run(function, *args, **kwargs)
+    return wrapper
 
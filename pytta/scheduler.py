@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduler
+==========
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule runs a sequence of measurements, e.g. the positions of a
+    measurement campaign, acquiring them back to back in PyTTa's audio
+    thread while the already acquired ones are processed by a pool of
+    workers. The processing of position N is so overlapped with the
+    acquisition of position N+1.
+
+        >>> schedule = pytta.scheduler.MeasurementScheduler(workers=4)
+        >>> for position in positions:
+        >>>     schedule.add(frf, name=position,
+        >>>                  before=functools.partial(turntable.move,
+        >>>                                           position))
+        >>> results = schedule.run()
+        >>> results[0].result  # transferfunction of the first position
+
+    Each measurement is acquired with its acquire() method, and processed by
+    the given processing function, defaulting to its process() method, e.g.
+    the transferfunction calculation of a FRFMeasure. The same measurement
+    object can be added many times, its recording is passed to the
+    processing function, so the acquisitions do not overwrite each other.
+
+    Available classes:
+    ------------------
+
+        >>> pytta.scheduler.MeasurementScheduler( workers, executor )
+
+    For further information, check the class specific documentation.
+"""
+
+import collections
+import concurrent.futures as futures
+import threading
+import time
+import traceback
+from pytta import audio
+from pytta import default
+from pytta.properties import defaults, run_in_context
+
+
+ScheduleResult = collections.namedtuple('ScheduleResult',
+                                        ['name', 'recording', 'result',
+                                         'timings', 'error'])
+ScheduleResult.__doc__ = """
+    Outcome of a scheduled measurement: the acquired recording, the
+    processing result, the time spent on each step [s] and the formatted
+    traceback if the acquisition or processing raised an exception (else
+    None).
+    """
+
+_Item = collections.namedtuple('_Item', ['name', 'measurement', 'processing',
+                                         'before'])
+
+
+class MeasurementScheduler(object):
+    """
+    Queue of measurements, acquired in sequence and processed concurrently.
+
+    Properties(self):       (default),      meaning
+        - workers:          (None),         number of processing threads, defaults to the number of CPUs;
+        - executor:         (None),         concurrent.futures.Executor used for the processing instead of the threads;
+        - stopOnError:      (False),        if True, the acquisitions stop after the first failed one.
+
+    Methods:                meaning
+        - add(measurement, processing, name, before): queues a measurement;
+        - submit():         starts the queued measurements, returns a Future of each ScheduleResult;
+        - run():            runs the queued measurements, returns the list of ScheduleResults;
+        - clear():          empties the queue.
+
+    The processing runs in threads by default, as PyTTa's processing is
+    mostly numpy and FFT calls, which release the GIL. A
+    concurrent.futures.ProcessPoolExecutor can be given instead, in which
+    case the processing functions and recordings must be picklable, and
+    the default process() runs on a copy of the measurement object.
+
+    The acquisitions and the processing use the pytta.defaults() values of
+    the code calling submit() or run(), but the audio device, which given
+    executors' workers do not use.
+    """
+
+    def __init__(self, workers=None, executor=None, stopOnError=False):
+        self.workers = workers
+        self.executor = executor
+        self.stopOnError = stopOnError
+        self._queue = []
+
+    def add(self, measurement, processing=None, name=None, before=None):
+        """
+        Queues a measurement.
+
+        Parameters:
+        -----------
+
+            - processing: function receiving the recording, defaults to
+                        measurement.process;
+            - name: identification of the result, defaults to the queue
+                        position;
+            - before: function called without arguments right before the
+                        acquisition, e.g. to move the microphone.
+        """
+        if name is None:
+            name = len(self._queue)
+        self._queue.append(_Item(name, measurement, processing, before))
+        return self
+
+    def clear(self):
+        self._queue = []
+
+    def __len__(self):
+        return len(self._queue)
+
+    def submit(self):
+        """
+        Starts acquiring the queued measurements in the audio thread and
+        returns at once a list of Futures of their ScheduleResults, in the
+        queue order. The queue is emptied.
+        """
+        items, self._queue = self._queue, []
+        pool = self.executor
+        ownPool = pool is None
+        if ownPool:
+            pool = futures.ThreadPoolExecutor(max_workers=self.workers,
+                                              thread_name_prefix='pytta-proc')
+        else:
+            # other executors, e.g. process pools, can not take the
+            # context, only picklable values
+            settings = _pool_settings()
+        results = [futures.Future() for item in items]
+        pending = [len(items)]
+        lock = threading.Lock()
+        stopped = threading.Event()
+
+        def finished(idx, result):
+            results[idx].set_result(result)
+            with lock:
+                pending[0] -= 1
+                done = pending[0] == 0
+            if done and ownPool:
+                pool.shutdown(wait=False)
+
+        def processed(idx, item, recording, timings, task):
+            try:
+                result, elapsed = task.result()
+                timings['process'] = elapsed
+                error = None
+            except Exception:
+                result, error = None, traceback.format_exc()
+            finished(idx, ScheduleResult(item.name, recording, result,
+                                         timings, error))
+
+        def acquire(idx, item):
+            timings = collections.OrderedDict()
+            if stopped.is_set():
+                finished(idx, ScheduleResult(item.name, None, None, timings,
+                                             'Not acquired, a previous '
+                                             + 'measurement failed'))
+                return
+            try:
+                if item.before is not None:
+                    start = time.perf_counter()
+                    item.before()
+                    timings['before'] = time.perf_counter() - start
+                start = time.perf_counter()
+                recording = item.measurement.acquire()
+                timings['acquire'] = time.perf_counter() - start
+            except Exception:
+                if self.stopOnError:
+                    stopped.set()
+                finished(idx, ScheduleResult(item.name, None, None, timings,
+                                             traceback.format_exc()))
+                return
+            processing = item.processing or item.measurement.process
+            if ownPool:
+                task = pool.submit(run_in_context(_timed), processing,
+                                   recording)
+            else:
+                task = pool.submit(_timed_with_defaults, settings,
+                                   processing, recording)
+            task.add_done_callback(lambda task: processed(idx, item,
+                                                          recording,
+                                                          timings, task))
+
+        if not items and ownPool:
+            pool.shutdown(wait=False)
+        for idx, item in enumerate(items):
+            audio.executor().submit(run_in_context(acquire), idx, item)
+        return results
+
+    def run(self):
+        """
+        Acquires and processes every queued measurement, and returns the
+        list of ScheduleResults, in the queue order.
+        """
+        return [future.result() for future in self.submit()]
+
+
+def _timed(function, recording):
+    start = time.perf_counter()
+    result = function(recording)
+    return result, time.perf_counter() - start
+
+
+def _pool_settings():
+    """ Default values in use, but the audio device, for other executors """
+    settings = dict(default.snapshot())
+    settings.pop('device')
+    return settings
+
+
+def _timed_with_defaults(settings, function, recording):
+    with defaults(**settings):
+        return _timed(function, recording)
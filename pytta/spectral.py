@@ -0,0 +1,751 @@
+# -*- coding: utf-8 -*-
+"""
+Spectral
+=========
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule carries the averaged spectral estimators used for noise
+    and random signal analysis. Instead of a single FFT over the whole signal,
+    the signal is split into overlapping, windowed frames and the spectra of
+    all frames are averaged (Welch's method), which reduces the variance of
+    the estimate.
+
+    The frames are taken as strided views of the time signal, so no copy of
+    the samples is made, and the spectra of all frames and channels are
+    calculated with a single batched rfft call.
+
+    Available functions:
+    --------------------
+
+        >>> pytta.spectral.psd( signalObj )
+        >>> pytta.spectral.csd( signalObj1, signalObj2 )
+        >>> pytta.spectral.coherence( signalObj1, signalObj2 )
+        >>> pytta.spectral.frf( excitation, recording, estimator )
+        >>> pytta.spectral.stft( signalObj )
+        >>> pytta.spectral.istft( stftArray, samplingRate )
+        >>> pytta.spectral.spectrogram( signalObj, fileName )
+        >>> pytta.spectral.goertzel( signalObj, frequencies )
+
+    For recordings that do not fit in memory, or that are acquired block by
+    block, the same estimates can be updated incrementally:
+
+        >>> acc = pytta.spectral.SpectralAccumulator(samplingRate=44100)
+        >>> for block in blocks:
+        >>>     acc.update(block)
+        >>> freq, Pxx = acc.freqVector, acc.autoSpectrum
+
+    Short-time Fourier transforms of long recordings can be calculated frame
+    by frame in the same fashion, with STFTStream:
+
+        >>> stream = pytta.spectral.STFTStream(samplingRate=44100)
+        >>> for block in pytta.read_wav_blocks(fileName):
+        >>>     frames = stream.process(block)
+
+    For further information, check the function specific documentation.
+"""
+
+import numpy as np
+from pytta import default
+from pytta import axes
+from pytta import fft
+from pytta import profiling
+from pytta._lazy import LazyModule
+
+ss = LazyModule('scipy.signal') # loaded on first use
+
+
+_batchSize = 2**22
+""" Maximum number of samples transformed at once by a single rfft call """
+
+
+def _as_columns(signalIn):
+    """
+    Returns the time samples of a SignalObj or array as a 2D
+    (samples x channels) array, without copying.
+    """
+    if hasattr(signalIn, 'timeSignal'):
+        signalIn = signalIn.timeSignal
+    signalIn = np.asarray(signalIn)
+    if signalIn.ndim == 1:
+        signalIn = signalIn[:, np.newaxis]
+    elif signalIn.ndim != 2:
+        raise ValueError("Only 1D or 2D (samples x channels) arrays are accepted")
+    return signalIn
+
+
+def _frames(timeSignal, nperseg, hop):
+    """
+    Strided (frames x nperseg x channels) view over a (samples x channels)
+    array. No samples are copied.
+    """
+    numFrames = max(0, 1 + (timeSignal.shape[0] - nperseg) // hop)
+    stride0, stride1 = timeSignal.strides
+    return np.lib.stride_tricks.as_strided(timeSignal,
+                                           shape=(numFrames, nperseg,
+                                                  timeSignal.shape[1]),
+                                           strides=(hop*stride0, stride0,
+                                                    stride1),
+                                           writeable=False)
+
+
+class SpectralAccumulator(object):
+    """
+    Streaming Welch estimator of auto and cross power spectral densities.
+
+    Blocks of samples are fed through update(), the samples left over at the
+    end of each block are kept to build the overlapping frame with the next
+    block, so the final estimate is the same as the one obtained processing
+    the whole signal at once.
+
+    Properties(self):       (default),      meaning
+        - samplingRate:     (44100),        sampling rate of the blocks;
+        - nperseg:          (4096),         frame length in samples;
+        - noverlap:         (nperseg//2),   overlapping samples between frames;
+        - nfft:             (nperseg),      FFT length, zero padded if larger;
+        - window:           ('hann'),       any scipy.signal.get_window() spec;
+        - detrend:          ('constant'),   frame mean removal, or None;
+        - scaling:          ('density'),    'density' [unit²/Hz] or 'spectrum' [unit²];
+        - freqVector:       (Axis),         one sided frequency vector [Hz];
+        - numAverages:      (0),            number of frames averaged so far;
+        - autoSpectrum:     (ndarray),      (freq x channels) averaged PSD of the input;
+        - outputSpectrum:   (ndarray),      (freq x channels) averaged PSD of the output;
+        - crossSpectrum:    (ndarray),      (freq x inChannels x outChannels) averaged CSD;
+        - coherence:        (ndarray),      magnitude squared coherence.
+
+    Methods:                meaning
+        - update(x, y):     adds a block of input (and optional output) samples;
+        - transfer_function(estimator): H1, H2 or Hv estimate from the averages;
+        - reset():          discards every accumulated frame.
+
+    The output spectra are only available if y blocks are given to update().
+    """
+
+    def __init__(self,
+                 samplingRate=None,
+                 nperseg=4096,
+                 noverlap=None,
+                 nfft=None,
+                 window='hann',
+                 detrend='constant',
+                 scaling='density'):
+        if samplingRate is None:
+            samplingRate = default.samplingRate
+        if noverlap is None:
+            noverlap = nperseg // 2
+        if nfft is None:
+            nfft = nperseg
+        if not 0 <= noverlap < nperseg:
+            raise ValueError("noverlap must be smaller than nperseg")
+        if nfft < nperseg:
+            raise ValueError("nfft must be greater than or equal to nperseg")
+        if scaling not in ['density', 'spectrum']:
+            raise ValueError("scaling must be 'density' or 'spectrum'")
+        self._samplingRate = samplingRate
+        self._nperseg = int(nperseg)
+        self._noverlap = int(noverlap)
+        self._nfft = int(nfft)
+        self._detrend = detrend
+        self._scaling = scaling
+        self._window = ss.get_window(window, self.nperseg)
+        self._freqVector = axes.freq_axis(self.nfft, self.samplingRate, 'one')
+        if scaling == 'density':
+            self._scale = 1 / (self.samplingRate * np.sum(self._window**2))
+        else:
+            self._scale = 1 / np.sum(self._window)**2
+        self.reset()
+
+#%% SpectralAccumulator Properties
+
+    @property
+    def samplingRate(self):
+        return self._samplingRate
+
+    @property
+    def nperseg(self):
+        return self._nperseg
+
+    @property
+    def noverlap(self):
+        return self._noverlap
+
+    @property
+    def nfft(self):
+        return self._nfft
+
+    @property
+    def freqVector(self):
+        return self._freqVector
+
+    @property
+    def numAverages(self):
+        return self._numAverages
+
+    @property
+    def autoSpectrum(self):
+        return self._average(self._sumXX)
+
+    @property
+    def outputSpectrum(self):
+        return self._average(self._sumYY)
+
+    @property
+    def crossSpectrum(self):
+        return self._average(self._sumXY)
+
+    @property
+    def coherence(self):
+        Pxx, Pyy, Pxy = self._sumXX, self._sumYY, self._sumXY
+        if Pxy is None:
+            raise AttributeError("Coherence needs output blocks on update()")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Cxy = np.abs(Pxy)**2 / (Pxx[:, :, np.newaxis]
+                                    * Pyy[:, np.newaxis, :])
+        return np.nan_to_num(Cxy)
+
+#%% SpectralAccumulator Methods
+
+    def transfer_function(self, estimator='H1'):
+        """
+        Transfer function estimate between every input (x) channel and every
+        output (y) channel, from the averaged spectra:
+
+            - 'H1': Pxy/Pxx, unbiased by noise at the output;
+            - 'H2': Pyy/Pyx, unbiased by noise at the input;
+            - 'Hv': total least squares estimate, between H1 and H2.
+
+        Each input/output pair is estimated as a single input system.
+        Returns the (freq x inChannels x outChannels) complex array.
+        """
+        Pxx = self._sumXX[:, :, np.newaxis]
+        Pyy = self._sumYY[:, np.newaxis, :]
+        Pxy = self._sumXY
+        if Pxy is None:
+            raise AttributeError("Transfer functions need output blocks on "
+                                 + "update()")
+        # the scaling factors cancel out, so the raw sums are used
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if estimator.upper() == 'H1':
+                H = Pxy / Pxx
+            elif estimator.upper() == 'H2':
+                H = Pyy / Pxy.conj()
+            elif estimator.upper() == 'HV':
+                H = (Pyy - Pxx + np.sqrt((Pxx - Pyy)**2 + 4*np.abs(Pxy)**2)) \
+                    / (2*Pxy.conj())
+            else:
+                raise ValueError("Unknown estimator " + repr(estimator)
+                                 + ", use 'H1', 'H2' or 'Hv'")
+        return np.nan_to_num(H)
+
+    def reset(self):
+        self._numAverages = 0
+        self._tailX = None
+        self._tailY = None
+        self._sumXX = None
+        self._sumYY = None
+        self._sumXY = None
+
+    def update(self, x, y=None):
+        """
+        Adds a block of samples to the estimate. The blocks can be SignalObjs
+        or (samples x channels) arrays; if y is given, it must have the same
+        number of samples as x, and the output and cross spectra are also
+        accumulated.
+
+        >>> acc.update(excitationBlock, recordingBlock)
+        """
+        x = _as_columns(x)
+        x = self._with_tail(x, self._tailX)
+        if y is not None:
+            y = _as_columns(y)
+            y = self._with_tail(y, self._tailY)
+            if y.shape[0] != x.shape[0]:
+                raise ValueError("Input and output blocks must have the "
+                                 + "same number of samples")
+        hop = self.nperseg - self.noverlap
+        framesX = _frames(x, self.nperseg, hop)
+        framesY = None if y is None else _frames(y, self.nperseg, hop)
+        numFrames = framesX.shape[0]
+        batchFrames = max(1, _batchSize // (self.nperseg * x.shape[1]))
+        for start in range(0, numFrames, batchFrames):
+            stop = min(start + batchFrames, numFrames)
+            X = self._spectra(framesX[start:stop])
+            self._sumXX = self._accumulate(self._sumXX,
+                                           np.sum(X.real**2 + X.imag**2,
+                                                  axis=0))
+            if framesY is not None:
+                Y = self._spectra(framesY[start:stop])
+                self._sumYY = self._accumulate(self._sumYY,
+                                               np.sum(Y.real**2 + Y.imag**2,
+                                                      axis=0))
+                self._sumXY = self._accumulate(self._sumXY,
+                                               np.einsum('fkc,fkd->kcd',
+                                                         X.conj(), Y))
+        self._numAverages += numFrames
+        # keep what is needed to build the next overlapping frame
+        consumed = numFrames * hop
+        self._tailX = x[consumed:].copy()
+        if y is not None:
+            self._tailY = y[consumed:].copy()
+        return self
+
+    def _with_tail(self, block, tail):
+        if tail is None or tail.shape[0] == 0:
+            return block
+        if tail.shape[1] != block.shape[1]:
+            raise ValueError("Number of channels changed between blocks")
+        return np.concatenate((tail, block), axis=0)
+
+    def _spectra(self, frames):
+        if self._detrend == 'constant':
+            frames = frames - np.mean(frames, axis=1, keepdims=True)
+        elif self._detrend not in [None, False]:
+            raise ValueError("detrend must be 'constant' or None")
+        frames = frames * self._window[np.newaxis, :, np.newaxis]
+        return fft.rfft(frames, n=self.nfft, axis=1)
+
+    @staticmethod
+    def _accumulate(total, value):
+        return value if total is None else total + value
+
+    def _average(self, total):
+        if total is None or self.numAverages == 0:
+            raise AttributeError("No frames were accumulated yet")
+        average = total * (self._scale / self.numAverages)
+        # one sided spectrum: doubles everything but DC and Nyquist bins
+        if self.nfft % 2:
+            average[1:] *= 2
+        else:
+            average[1:-1] *= 2
+        return average
+
+
+def _calibration(signalIn):
+    """
+    Per channel calibration factors of a calibrated SignalObj, or ones.
+    """
+    if getattr(signalIn, 'isCalibrated', False):
+        return signalIn.calibration
+    return np.ones(_as_columns(signalIn).shape[1])
+
+
+def _estimate(x, y, samplingRate, kwargs):
+    if samplingRate is None:
+        samplingRate = getattr(x, 'samplingRate', None)
+    accumulator = SpectralAccumulator(samplingRate, **kwargs)
+    squeeze = np.ndim(getattr(x, 'timeSignal', x)) == 1 \
+        and (y is None or np.ndim(getattr(y, 'timeSignal', y)) == 1)
+    accumulator.update(x, y)
+    return accumulator, squeeze
+
+
+@profiling.instrument('spectral.psd')
+def psd(signalIn, samplingRate=None, **kwargs):
+    """
+    Welch averaged power spectral density of every channel of a SignalObj, or
+    of a (samples x channels) array.
+
+    >>> freq, Pxx = pytta.spectral.psd(signalObj, nperseg=8192)
+
+    The keyword arguments are the ones accepted by SpectralAccumulator.
+    Returns the one sided frequency vector and the (freq x channels) PSD, in
+    the SignalObj's calibrated unit squared per Hz.
+    """
+    accumulator, squeeze = _estimate(signalIn, None, samplingRate, kwargs)
+    Pxx = accumulator.autoSpectrum * _calibration(signalIn)**2
+    return accumulator.freqVector, (Pxx[:, 0] if squeeze else Pxx)
+
+
+@profiling.instrument('spectral.csd')
+def csd(signal1, signal2, samplingRate=None, **kwargs):
+    """
+    Welch averaged cross power spectral density between every channel of
+    signal1 and every channel of signal2.
+
+    >>> freq, Pxy = pytta.spectral.csd(excitation, recording)
+
+    Returns the one sided frequency vector and the
+    (freq x channels1 x channels2) CSD, conj(X)*Y convention, calibrated.
+    """
+    accumulator, squeeze = _estimate(signal1, signal2, samplingRate, kwargs)
+    Pxy = accumulator.crossSpectrum \
+        * np.outer(_calibration(signal1), _calibration(signal2))
+    return accumulator.freqVector, (Pxy[:, 0, 0] if squeeze else Pxy)
+
+
+@profiling.instrument('spectral.coherence')
+def coherence(signal1, signal2, samplingRate=None, **kwargs):
+    """
+    Magnitude squared coherence between every channel of signal1 and every
+    channel of signal2.
+
+    >>> freq, Cxy = pytta.spectral.coherence(excitation, recording)
+
+    Returns the one sided frequency vector and the
+    (freq x channels1 x channels2) coherence, between 0 and 1.
+    """
+    accumulator, squeeze = _estimate(signal1, signal2, samplingRate, kwargs)
+    Cxy = accumulator.coherence
+    return accumulator.freqVector, (Cxy[:, 0, 0] if squeeze else Cxy)
+
+
+@profiling.instrument('spectral.frf')
+def frf(excitation, recording, estimator='H1', samplingRate=None, **kwargs):
+    """
+    Frequency response estimate between every channel of the excitation and
+    every channel of the recording, for random (noise) excitation signals.
+
+    >>> freq, H, Cxy = pytta.spectral.frf(excitation, recording, 'H1')
+
+    Returns the one sided frequency vector, the
+    (freq x inChannels x outChannels) complex transfer function and the
+    coherence between the same channel pairs, as quality indicator. The
+    transfer function is given in recording unit per excitation unit, for
+    calibrated SignalObjs.
+    """
+    accumulator, squeeze = _estimate(excitation, recording, samplingRate,
+                                     kwargs)
+    H = accumulator.transfer_function(estimator) \
+        * np.outer(1/_calibration(excitation), _calibration(recording))
+    Cxy = accumulator.coherence
+    if squeeze:
+        H, Cxy = H[:, 0, 0], Cxy[:, 0, 0]
+    return accumulator.freqVector, H, Cxy
+
+
+class STFTStream(object):
+    """
+    Streaming short-time Fourier transform.
+
+    Each block given to process() returns the complex spectra of the frames
+    that could be completed with it, the remaining samples are kept to build
+    the next frames. Only one block worth of frames is in memory at a time.
+    flush() returns the frames of the remaining samples, zero padded, at
+    the end of the stream.
+
+    With boundary, the stream is padded with nperseg - hop zeros at both
+    ends, so the first and last samples are covered by as many frames as
+    the others, and istft() can give them back.
+
+    Properties(self):       (default),      meaning
+        - samplingRate:     (44100),        sampling rate of the blocks;
+        - nperseg:          (2048),         frame length in samples;
+        - hop:              (nperseg//4),   samples between frame starts;
+        - nfft:             (nperseg),      FFT length, zero padded if larger;
+        - window:           ('hann'),       any scipy.signal.get_window() spec;
+        - boundary:         (False),        pads nperseg - hop zeros before the first and after the last samples;
+        - freqVector:       (Axis),         one sided frequency vector [Hz];
+        - numFrames:        (0),            frames output so far.
+
+    Methods:                meaning
+        - process(block):   (frames x freq x channels) spectra of a new block;
+        - flush():          spectra of the last, zero padded, frames;
+        - frame_times():    time instant of each frame's center [s];
+        - reset():          discards the buffered samples.
+    """
+
+    def __init__(self,
+                 samplingRate=None,
+                 nperseg=2048,
+                 hop=None,
+                 nfft=None,
+                 window='hann',
+                 boundary=False):
+        if samplingRate is None:
+            samplingRate = default.samplingRate
+        if hop is None:
+            hop = nperseg // 4
+        if nfft is None:
+            nfft = nperseg
+        if not 0 < hop <= nperseg:
+            raise ValueError("hop must be between 1 and nperseg")
+        if nfft < nperseg:
+            raise ValueError("nfft must be greater than or equal to nperseg")
+        self._samplingRate = samplingRate
+        self._nperseg = int(nperseg)
+        self._hop = int(hop)
+        self._nfft = int(nfft)
+        self._window = ss.get_window(window, self.nperseg)
+        self._boundary = bool(boundary)
+        self._freqVector = axes.freq_axis(self.nfft, self.samplingRate, 'one')
+        self.reset()
+
+#%% STFTStream Properties
+
+    @property
+    def samplingRate(self):
+        return self._samplingRate
+
+    @property
+    def nperseg(self):
+        return self._nperseg
+
+    @property
+    def hop(self):
+        return self._hop
+
+    @property
+    def nfft(self):
+        return self._nfft
+
+    @property
+    def window(self):
+        return self._window
+
+    @property
+    def boundary(self):
+        return self._boundary
+
+    @property
+    def freqVector(self):
+        return self._freqVector
+
+    @property
+    def numFrames(self):
+        return self._numFrames
+
+    @property
+    def _padding(self):
+        return self.nperseg - self.hop if self.boundary else 0
+
+#%% STFTStream Methods
+
+    def reset(self):
+        self._numFrames = 0
+        self._tail = None
+
+    def frame_times(self, numFrames=None, firstFrame=0):
+        """
+        Time instant [s] of the center of numFrames frames, starting at
+        firstFrame. Defaults to all frames output so far.
+        """
+        if numFrames is None:
+            numFrames = self.numFrames - firstFrame
+        frameIdx = np.arange(firstFrame, firstFrame + numFrames)
+        return (frameIdx*self.hop + self.nperseg/2 - self._padding) \
+            / self.samplingRate
+
+    def process(self, block):
+        """
+        Adds a block of samples (SignalObj or (samples x channels) array) and
+        returns the (frames x freq x channels) spectra of the new frames.
+        """
+        block = _as_columns(block)
+        if self._tail is None:
+            # first block: the leading zeros are buffered as a tail
+            self._tail = np.zeros((self._padding, block.shape[1]),
+                                  dtype=block.dtype)
+        if self._tail.shape[0] > 0:
+            if self._tail.shape[1] != block.shape[1]:
+                raise ValueError("Number of channels changed between blocks")
+            block = np.concatenate((self._tail, block), axis=0)
+        return self._transform(block)
+
+    def flush(self):
+        """
+        Ends the stream: returns the (frames x freq x channels) spectra of
+        the frames over the remaining samples, zero padded to whole frames
+        (after nperseg - hop zeros, with boundary). The next block given to
+        process() starts a new stream.
+        """
+        if self._tail is None:
+            return np.zeros((0, self.freqVector.size, 0), dtype='complex128')
+        numSamples = self._tail.shape[0] + self._padding
+        extra = max(0, numSamples - self.nperseg)
+        numSamples = self.nperseg + -(-extra // self.hop)*self.hop
+        block = np.zeros((numSamples, self._tail.shape[1]),
+                         dtype=self._tail.dtype)
+        block[:self._tail.shape[0]] = self._tail
+        spectra = self._transform(block)
+        self._tail = None
+        return spectra
+
+    def _transform(self, block):
+        frames = _frames(block, self.nperseg, self.hop)
+        numFrames = frames.shape[0]
+        spectra = fft.rfft(frames*self._window[np.newaxis, :, np.newaxis],
+                           n=self.nfft, axis=1)
+        self._tail = block[numFrames*self.hop:].copy()
+        self._numFrames += numFrames
+        return spectra
+
+
+@profiling.instrument('spectral.stft')
+def stft(signalIn, samplingRate=None, nperseg=2048, hop=None, nfft=None,
+         window='hann', boundary=True):
+    """
+    Short-time Fourier transform of every channel of a SignalObj or of a
+    (samples x channels) array, all frames calculated in a single batched
+    rfft call.
+
+    >>> freq, time, S = pytta.spectral.stft(signalObj, nperseg=4096)
+
+    With boundary, the signal is padded with nperseg - hop zeros at both
+    ends, and at the end to a whole number of frames, so every sample is
+    covered by the same number of frames.
+
+    Returns the one sided frequency vector, the frame center times and the
+    (frames x freq x channels) complex spectra. The spectra are not scaled,
+    so istft() with the same parameters gives back the signal, followed by
+    less than hop padding zeros unless its length is given.
+    """
+    if samplingRate is None:
+        samplingRate = getattr(signalIn, 'samplingRate', None)
+    squeeze = np.ndim(getattr(signalIn, 'timeSignal', signalIn)) == 1
+    stream = STFTStream(samplingRate, nperseg, hop, nfft, window, boundary)
+    S = np.concatenate((stream.process(signalIn), stream.flush()), axis=0)
+    if squeeze:
+        S = S[:, :, 0]
+    return stream.freqVector, stream.frame_times(), S
+
+
+@profiling.instrument('spectral.istft')
+def istft(S, samplingRate=None, nperseg=2048, hop=None, nfft=None,
+          window='hann', length=None, boundary=True):
+    """
+    Inverse short-time Fourier transform by weighted overlap-add. The
+    parameters must be the ones used for the stft() call, and the window
+    and hop must satisfy the nonzero overlap-add condition,
+    scipy.signal.check_NOLA(), otherwise a ValueError is raised.
+
+    >>> signalObj = pytta.spectral.istft(S, samplingRate, length=numSamples)
+
+    With boundary, the nperseg - hop padding zeros are removed from both
+    ends. Returns a time domain SignalObj, cut to length samples if given,
+    the original number of samples of the stft() call; otherwise it ends
+    with the zeros that completed the last frame, less than hop.
+    """
+    from pytta.classes import SignalObj
+    if samplingRate is None:
+        samplingRate = default.samplingRate
+    if hop is None:
+        hop = nperseg // 4
+    if nfft is None:
+        nfft = nperseg
+    S = np.asarray(S)
+    squeeze = S.ndim == 2
+    if squeeze:
+        S = S[:, :, np.newaxis]
+    numFrames, numChannels = S.shape[0], S.shape[2]
+    win = ss.get_window(window, nperseg)
+    if not ss.check_NOLA(win, nperseg, nperseg - hop):
+        raise ValueError("The window and hop do not satisfy the nonzero "
+                         + "overlap-add (NOLA) condition, some samples are "
+                         + "lost and the signal can not be recovered")
+    frames = fft.irfft(S, n=nfft, axis=1)[:, :nperseg, :]
+    frames *= win[np.newaxis, :, np.newaxis]
+    # overlap-add by hop sized segments: one vectorized sum per segment
+    # index inside the frame, instead of one per frame
+    numSegs = -(-nperseg // hop)
+    padded = np.zeros((numFrames, numSegs*hop, numChannels))
+    padded[:, :nperseg, :] = frames
+    padded = padded.reshape(numFrames, numSegs, hop, numChannels)
+    winSquared = np.zeros(numSegs*hop)
+    winSquared[:nperseg] = win**2
+    winSquared = winSquared.reshape(numSegs, hop)
+    output = np.zeros((numFrames + numSegs - 1, hop, numChannels))
+    norm = np.zeros((numFrames + numSegs - 1, hop))
+    for seg in range(numSegs):
+        output[seg:seg + numFrames] += padded[:, seg]
+        norm[seg:seg + numFrames] += winSquared[seg]
+    output = output.reshape(-1, numChannels)
+    norm = norm.reshape(-1)
+    nonZero = norm > 1e-10
+    output[nonZero] /= norm[nonZero, np.newaxis]
+    if boundary:
+        padding = nperseg - hop
+        output = output[padding:max(padding, output.shape[0] - padding)]
+    if length is not None:
+        output = output[:length]
+    if squeeze:
+        output = output[:, 0]
+    return SignalObj(output, 'time', samplingRate)
+
+
+@profiling.instrument('spectral.spectrogram')
+def spectrogram(source, samplingRate=None, nperseg=2048, hop=None,
+                nfft=None, window='hann', fileName=None, dtype='float32'):
+    """
+    Magnitude spectrogram in dB, normalized so a full scale sine reads 0 dB.
+    The source can be a SignalObj, a (samples x channels) array, or any
+    iterable of blocks (e.g. pytta.read_wav_blocks()), which are transformed
+    one at a time, so the complex STFT matrix is never fully in memory.
+
+    >>> freq, time, dB = pytta.spectral.spectrogram(signalObj)
+    >>> freq, time, dB = pytta.spectral.spectrogram(
+    >>>         pytta.read_wav_blocks('long.wav'), 48000, fileName='long.dat')
+
+    If fileName is given, the dB frames are written to it as raw binary
+    data, as they are calculated, and a read only numpy.memmap with
+    (frames x freq x channels) shape is returned instead of an array.
+    """
+    if samplingRate is None:
+        samplingRate = getattr(source, 'samplingRate', None)
+    if hasattr(source, 'timeSignal') or isinstance(source, np.ndarray):
+        source = [source]
+    stream = STFTStream(samplingRate, nperseg, hop, nfft, window)
+    scale = 2 / np.sum(stream.window)
+    numChannels = None
+    dBFrames = []
+    outFile = None if fileName is None else open(fileName, 'wb')
+    try:
+        for block in source:
+            S = stream.process(block)
+            numChannels = S.shape[2]
+            dB = (20*np.log10(np.abs(S)*scale + 1e-20)).astype(dtype)
+            if outFile is None:
+                dBFrames.append(dB)
+            else:
+                outFile.write(dB.tobytes())
+    finally:
+        if outFile is not None:
+            outFile.close()
+    if numChannels is None:
+        raise ValueError("The source has no samples")
+    shape = (stream.numFrames, stream.freqVector.size, numChannels)
+    if fileName is None:
+        dB = np.concatenate(dBFrames, axis=0)
+    else:
+        dB = np.memmap(fileName, dtype=dtype, mode='r', shape=shape)
+    return stream.freqVector, stream.frame_times(), dB
+
+
+@profiling.instrument('spectral.goertzel')
+def goertzel(signalIn, frequencies, samplingRate=None):
+    """
+    Complex amplitudes of the sinusoids at the given frequencies in every
+    channel of a SignalObj or (samples x channels) array, by the Goertzel
+    algorithm: a second order recursion per frequency, O(samples) each,
+    instead of a whole FFT when only a few bins are wanted.
+
+    >>> amplitudes = pytta.spectral.goertzel(recording, [1000, 2000, 3000])
+
+    Returns a (frequencies x channels) array of A*exp(j*phi), for the
+    components A*cos(2*pi*f*t + phi). The frequencies need not be FFT bins,
+    but leak into each other unless the signal has a whole number of their
+    periods. Frequencies above the Nyquist frequency give nan.
+    """
+    if samplingRate is None:
+        samplingRate = getattr(signalIn, 'samplingRate', None) \
+            or default.samplingRate
+    timeSignal = _as_columns(signalIn).astype('float64', copy=False)
+    numSamples = timeSignal.shape[0]
+    frequencies = np.atleast_1d(np.asarray(frequencies, dtype='float64'))
+    amplitudes = np.full((frequencies.size, timeSignal.shape[1]), np.nan,
+                         dtype='complex128')
+    if numSamples < 2:
+        return amplitudes
+    for idx, frequency in enumerate(frequencies):
+        if not 0 <= frequency <= samplingRate/2:
+            continue
+        omega = 2*np.pi*frequency/samplingRate
+        state = ss.lfilter([1], [1, -2*np.cos(omega), 1], timeSignal,
+                           axis=0)[-2:]
+        # sum of x[n]*exp(-j*omega*n), from the last two recursion states
+        dft = np.exp(-1j*omega*(numSamples - 1)) \
+            * (state[1] - np.exp(-1j*omega)*state[0])
+        edge = np.isclose(frequency, 0) \
+            or np.isclose(frequency, samplingRate/2)
+        amplitudes[idx] = dft * (1 if edge else 2) / numSamples
+    return amplitudes
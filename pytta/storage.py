@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+Storage
+========
+
+@Autores:
+- João Vitor Gutkoski Paes, joao.paes@eac.ufsm.br
+
+    This submodule saves and loads SignalObjs and measurement objects to a
+    compact binary container, keeping all their metadata (samplingRate,
+    freqMin/freqMax, comment, calibration, channel mapping, ...).
+
+        >>> pytta.save('measurement.pytta', frfObj)
+        >>> frfObj = pytta.load('measurement.pytta')
+
+    Only the signal's source domain is stored (timeSignal for time domain
+    signals, freqSignal for frequency domain ones), the time and frequency
+    vectors and the other domain are calculated again when loading.
+
+    The container is a zip file, readable by numpy.load(), with a
+    'metadata.json' member and one '.npy' member per channel, or per chunk
+    of each channel if chunkSize is given, plus one member per array held
+    by the measurement, as the FRFMeasure coherence. So single channels and
+    time ranges can be read without touching the rest of the file:
+
+        >>> sig = pytta.load('long.pytta', channels=[0, 3],
+        >>>                  sampleRange=(48000, 96000))
+
+    and, if the file is not compressed, the samples can be memory mapped:
+
+        >>> data = pytta.storage.load_array('long.pytta', mmap=True)
+
+    Available functions:
+    --------------------
+
+        >>> pytta.save( fileName, pyttaObject, compress, chunkSize )
+        >>> pytta.load( fileName, channels, sampleRange )
+        >>> pytta.storage.load_array( fileName, name, channels, sampleRange, mmap )
+
+    For further information, check the function specific documentation.
+"""
+
+import json
+import zipfile
+import numpy as np
+from pytta import classes
+from pytta import profiling
+
+
+_formatVersion = 1
+
+_signalAttributes = ['samplingRate', 'freqMin', 'freqMax', 'comment']
+""" SignalObj metadata stored besides its samples """
+
+_measurementAttributes = {
+    'RecMeasure': ['domain', 'fftDegree', 'timeLength'],
+    'PlayRecMeasure': [],
+    'FRFMeasure': ['estimator', 'nperseg'],
+    }
+""" Constructor arguments stored for each measurement class """
+
+_commonAttributes = ['samplingRate', 'freqMin', 'freqMax', 'comment',
+                     'device', 'inChannel', 'outChannel', 'calibration',
+                     'unit']
+""" Constructor arguments stored for every measurement class """
+
+_measurementSignals = ['excitation', 'recording', 'transferfunction']
+""" SignalObjs held by measurement objects """
+
+_measurementArrays = {'FRFMeasure': ['coherence']}
+""" Arrays held by measurement objects, stored as single members """
+
+
+def _jsonable(value):
+    """
+    Turns numpy types into plain python types for the JSON metadata.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(item) for item in value]
+    return value
+
+
+def _member_name(name, channel, chunk):
+    return name + '/ch' + str(channel).zfill(3) \
+        + '_' + str(chunk).zfill(6) + '.npy'
+
+
+#%% Saving
+
+@profiling.instrument('storage.save')
+def save(fileName, pyttaObject, compress=False, chunkSize=None):
+    """
+    Saves a SignalObj, RecMeasure, PlayRecMeasure or FRFMeasure, with its
+    metadata, to fileName.
+
+    >>> pytta.save('sweep.pytta', sweepObj)
+    >>> pytta.save('frf.pytta', frfObj, compress=True, chunkSize=2**20)
+
+    Parameters:
+    -----------
+
+        - compress: False stores the samples as they are, allowing memory
+                    mapping; True, or a 1-9 zlib level, deflates them;
+        - chunkSize: number of samples of each stored chunk. None stores
+                    each channel in a single chunk.
+    """
+    if compress is True:
+        compression, level = zipfile.ZIP_DEFLATED, None
+    elif compress:
+        compression, level = zipfile.ZIP_DEFLATED, int(compress)
+    else:
+        compression, level = zipfile.ZIP_STORED, None
+    if isinstance(pyttaObject, classes.SignalObj):
+        className = 'SignalObj'
+    else:
+        className = type(pyttaObject).__name__
+        if className not in _measurementAttributes:
+            raise TypeError("Cannot save objects of type " + repr(className))
+    metadata = {'format': 'pytta',
+                'version': _formatVersion,
+                'class': className,
+                'attributes': {},
+                'signals': {},
+                'arrays': []}
+    arrays = {}
+    if className == 'SignalObj':
+        signals = {'signal': pyttaObject}
+    else:
+        for attr in _commonAttributes + _measurementAttributes[className]:
+            metadata['attributes'][attr] = \
+                _jsonable(getattr(pyttaObject, '_' + attr, None))
+        signals = {name: getattr(pyttaObject, name) for name
+                   in _measurementSignals
+                   if isinstance(getattr(pyttaObject, name, None),
+                                 classes.SignalObj)}
+        arrays = {name: np.asarray(getattr(pyttaObject, name)) for name
+                  in _measurementArrays.get(className, [])
+                  if getattr(pyttaObject, name, None) is not None}
+    with zipfile.ZipFile(fileName, 'w', compression=compression,
+                         allowZip64=True, compresslevel=level) as zipFile:
+        for name, signalObj in signals.items():
+            metadata['signals'][name] = _save_signal(zipFile, name,
+                                                     signalObj, chunkSize)
+        for name, array in arrays.items():
+            with zipFile.open(name + '.npy', 'w',
+                              force_zip64=True) as member:
+                np.lib.format.write_array(member, array, allow_pickle=False)
+            metadata['arrays'].append(name)
+        zipFile.writestr('metadata.json', json.dumps(metadata, indent=1))
+
+
+def _save_signal(zipFile, name, signalObj, chunkSize):
+    if signalObj.domain == 'freq':
+        data = signalObj.freqSignal
+    else:
+        data = signalObj.timeSignal
+    data = np.asarray(data)
+    ndim = data.ndim
+    if ndim == 1:
+        data = data[:, np.newaxis]
+    numSamples, numChannels = data.shape
+    if chunkSize is None or chunkSize <= 0:
+        chunkSize = max(numSamples, 1)
+    for channel in range(numChannels):
+        for chunk, start in enumerate(range(0, max(numSamples, 1),
+                                            chunkSize)):
+            with zipFile.open(_member_name(name, channel, chunk), 'w',
+                              force_zip64=True) as member:
+                np.lib.format.write_array(
+                    member,
+                    np.ascontiguousarray(data[start:start+chunkSize,
+                                              channel]),
+                    allow_pickle=False)
+    meta = {attr: _jsonable(getattr(signalObj, '_' + attr, None))
+            for attr in _signalAttributes}
+    meta.update({'domain': signalObj.domain,
+                 'numSamples': numSamples,
+                 'numChannels': numChannels,
+                 'ndim': ndim,
+                 'dtype': data.dtype.str,
+                 'chunkSize': chunkSize,
+                 'calibration': _jsonable(signalObj._calibration),
+                 'unit': signalObj.unit})
+    return meta
+
+
+#%% Loading
+
+def _read_metadata(zipFile):
+    metadata = json.loads(zipFile.read('metadata.json').decode('utf-8'))
+    if metadata.get('format') != 'pytta':
+        raise ValueError("Not a PyTTa storage file")
+    if metadata.get('version', 0) > _formatVersion:
+        raise ValueError("File saved by a newer PyTTa version")
+    return metadata
+
+
+def _member_memmap(fileName, zipFile, memberName):
+    """
+    Memory maps an uncompressed .npy member, straight from the zip file.
+    """
+    info = zipFile.getinfo(memberName)
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    with open(fileName, 'rb') as rawFile:
+        # zip local file header: 30 fixed bytes + name + extra field
+        rawFile.seek(info.header_offset + 26)
+        nameLength, extraLength = np.frombuffer(rawFile.read(4), '<u2')
+        rawFile.seek(info.header_offset + 30 + int(nameLength)
+                     + int(extraLength))
+        version = np.lib.format.read_magic(rawFile)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(rawFile)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(rawFile)
+        offset = rawFile.tell()
+    return np.memmap(fileName, dtype=dtype, mode='r', offset=offset,
+                     shape=shape, order='F' if fortran else 'C')
+
+
+def _read_member(fileName, zipFile, memberName, mmap):
+    if mmap:
+        data = _member_memmap(fileName, zipFile, memberName)
+        if data is not None:
+            return data
+    with zipFile.open(memberName) as member:
+        return np.lib.format.read_array(member, allow_pickle=False)
+
+
+def _read_signal_data(fileName, zipFile, name, meta, channels, sampleRange,
+                      mmap):
+    numSamples = meta['numSamples']
+    chunkSize = meta['chunkSize']
+    if channels is None:
+        channels = range(meta['numChannels'])
+    start, stop = (0, numSamples) if sampleRange is None else sampleRange
+    start, stop = max(0, int(start)), min(numSamples, int(stop))
+    firstChunk, lastChunk = start // chunkSize, (max(stop, 1) - 1) // chunkSize
+    columns = []
+    for channel in channels:
+        pieces = []
+        for chunk in range(firstChunk, lastChunk + 1):
+            data = _read_member(fileName, zipFile,
+                                _member_name(name, channel, chunk), mmap)
+            chunkStart = chunk * chunkSize
+            pieces.append(data[max(start - chunkStart, 0):
+                               stop - chunkStart])
+        columns.append(pieces[0] if len(pieces) == 1
+                       else np.concatenate(pieces))
+    if len(columns) == 1:
+        # a single column keeps the memory map, if any
+        return columns[0] if meta['ndim'] == 1 else columns[0][:, np.newaxis]
+    return np.stack(columns, axis=1)
+
+
+def load_array(fileName, name=None, channels=None, sampleRange=None,
+               mmap=True):
+    """
+    Reads the stored samples of a SignalObj as a (samples x channels) array,
+    without building a SignalObj (so no FFT is calculated).
+
+    >>> data = pytta.storage.load_array('rec.pytta', channels=[1],
+    >>>                                 sampleRange=(0, 44100))
+
+    Parameters:
+    -----------
+
+        - name: which signal of a measurement file, e.g. 'recording'.
+                Defaults to the only, or the first, stored signal;
+        - channels: list of channel indexes (0 based), defaults to all;
+        - sampleRange: (start, stop) samples, defaults to the whole signal;
+        - mmap: if the file is not compressed and a single channel chunk
+                holds the requested range, returns a read only memory map.
+    """
+    with zipfile.ZipFile(fileName, 'r') as zipFile:
+        metadata = _read_metadata(zipFile)
+        if name is None:
+            name = list(metadata['signals'])[0]
+        return _read_signal_data(fileName, zipFile, name,
+                                 metadata['signals'][name], channels,
+                                 sampleRange, mmap)
+
+
+def _build_signal(data, meta, channels):
+    if data.ndim == 2 and data.shape[1] == 1:
+        data = data[:, 0] # single channels are kept as 1D, like recordings
+    signalObj = classes.SignalObj(data, meta['domain'],
+                                  meta['samplingRate'],
+                                  freqMin=meta['freqMin'],
+                                  freqMax=meta['freqMax'],
+                                  comment=meta['comment'])
+    calibration, unit = meta['calibration'], meta['unit']
+    if channels is not None:
+        unit = [unit[channel] for channel in channels]
+        if calibration is not None:
+            calibration = [calibration[channel] for channel in channels]
+    signalObj.calibration = calibration
+    signalObj.unit = unit
+    return signalObj
+
+
+@profiling.instrument('storage.load')
+def load(fileName, channels=None, sampleRange=None):
+    """
+    Loads a SignalObj or measurement object saved with pytta.save().
+
+    >>> signalObj = pytta.load('sweep.pytta')
+    >>> frfObj = pytta.load('frf.pytta')
+
+    For SignalObj files, a subset of the channels (0 based indexes) and of
+    the samples, as a (start, stop) range, can be given, so only these are
+    read. Time ranges can only be read from time domain signals.
+    """
+    with zipfile.ZipFile(fileName, 'r') as zipFile:
+        metadata = _read_metadata(zipFile)
+        if metadata['class'] == 'SignalObj':
+            meta = metadata['signals']['signal']
+            if sampleRange is not None and meta['domain'] != 'time':
+                raise ValueError("Sample ranges can only be read from time "
+                                 + "domain signals")
+            data = _read_signal_data(fileName, zipFile, 'signal', meta,
+                                     channels, sampleRange, False)
+            return _build_signal(data, meta, channels)
+        if channels is not None or sampleRange is not None:
+            raise ValueError("Channels and sample ranges can only be "
+                             + "selected for SignalObj files, see "
+                             + "pytta.storage.load_array()")
+        signals = {}
+        for name, meta in metadata['signals'].items():
+            data = _read_signal_data(fileName, zipFile, name, meta, None,
+                                     None, False)
+            signals[name] = _build_signal(data, meta, None)
+        arrays = {name: _read_member(fileName, zipFile, name + '.npy',
+                                     False)
+                  for name in metadata.get('arrays', [])}
+    attributes = metadata['attributes']
+    measurementClass = getattr(classes, metadata['class'])
+    kwargs = {attr: attributes[attr] for attr in _commonAttributes
+              + _measurementAttributes[metadata['class']]
+              if attr in attributes and attr not in ['samplingRate',
+                                                     'domain', 'fftDegree',
+                                                     'timeLength']}
+    if metadata['class'] == 'RecMeasure':
+        measurementObj = measurementClass(attributes['domain'],
+                                          samplingRate=attributes['samplingRate'],
+                                          **kwargs)
+        if attributes['domain'] == 'time':
+            measurementObj.timeLength = attributes['timeLength']
+        elif attributes['fftDegree'] is not None:
+            measurementObj.fftDegree = attributes['fftDegree']
+    else:
+        measurementObj = measurementClass(excitation=signals.get('excitation'),
+                                          **kwargs)
+    for name in ['recording', 'transferfunction']:
+        if name in signals:
+            setattr(measurementObj, name, signals[name])
+    for name, array in arrays.items():
+        setattr(measurementObj, name, array)
+    return measurementObj